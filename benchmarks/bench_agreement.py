@@ -0,0 +1,120 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Agreement engine benchmark
+# Michele Danilo Pierri MD PhD
+# Purpose: Check that RatingPanel reproduces scikit-learn's weighted kappa
+#          (and pingouin's Friedman W and ICC, when installed) on random
+#          reviewer panels, and time the batched kappa against one
+#          cohen_kappa_score call per reviewer pair; check the sparse
+#          Kendall's W against the dense one and time it on a large
+#          panel where most ratings are missing
+#          Run from the repository root: python benchmarks/bench_agreement.py
+# ------------------------------------------------------------
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import cohen_kappa_score
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from llm_eval.agreement import RatingPanel, sparse_kendall_w
+
+try:
+    import pingouin as pg
+except ImportError:
+    pg = None
+
+
+rng = np.random.default_rng(0)
+n_tests = 200
+
+
+def random_panel(n_subjects, n_reviewers):
+    # reviewers agree with a shared "true" score up to +-1
+    truth = rng.integers(1, 6, size=n_subjects)
+    noise = rng.integers(-1, 2, size=(n_subjects, n_reviewers)) * (rng.random((n_subjects, n_reviewers)) < 0.5)
+    return np.clip(truth[:, None] + noise, 1, 5).astype(float)
+
+
+def classical_w(matrix):
+    # Kendall's W as in the original reliability script (no tie correction)
+    ranks = pd.DataFrame(matrix).rank(axis=0)
+    R = ranks.sum(axis=1)
+    m, n = matrix.shape
+    return 12 * ((R - R.mean()) ** 2).sum() / (n ** 2 * (m ** 3 - m))
+
+
+# --- agreement with the reference implementations ---
+
+for _ in range(n_tests):
+    scores = random_panel(rng.integers(5, 80), rng.integers(2, 7))
+    panel = RatingPanel(scores)
+    for weights in ('quadratic', 'linear', None):
+        ref = [cohen_kappa_score(scores[:, i], scores[:, j], weights=weights) for i, j in panel.pairs]
+        assert np.allclose(panel.kappa(weights)[0], ref, equal_nan=True)
+    assert np.isclose(panel.kendall_w(tie_correction=False)[0], classical_w(scores))
+    long = pd.DataFrame(scores).rename_axis('Subject').reset_index().melt(
+        id_vars='Subject', var_name='Reviewer', value_name='Score')
+    for tie_correction in (True, False):
+        assert np.isclose(sparse_kendall_w(long, tie_correction=tie_correction),
+                          panel.kendall_w(tie_correction=tie_correction)[0])
+
+    # multinomial subject weights must equal physically repeating the rows
+    counts = rng.multinomial(len(scores), np.full(len(scores), 1 / len(scores)))
+    repeated = RatingPanel(np.repeat(scores, counts, axis=0), levels=panel.levels)
+    weighted, direct = panel.metrics(counts[None]), repeated.metrics()
+    for name in weighted:
+        assert np.allclose(weighted[name], direct[name], equal_nan=True), name
+
+    if pg is not None:
+        long = pd.DataFrame(scores).reset_index().melt(id_vars='index', var_name='Reviewer', value_name='Score')
+        friedman = pg.friedman(data=long, dv='Score', within='Reviewer', subject='index')
+        assert np.isclose(panel.friedman()[2][0], friedman['W'].values[0])
+        icc = pg.intraclass_corr(data=long, targets='index', raters='Reviewer', ratings='Score')
+        icc = icc.set_index('Type')['ICC']
+        for name, value in panel.icc().items():
+            assert np.isclose(value[0], icc[name]), name
+
+checked = "kappa and W" + (", Friedman W and ICC" if pg is not None else "")
+print(f"{n_tests} random panels: {checked} match the reference.")
+
+
+# --- timing ---
+
+for n_reviewers in (3, 10, 20):
+    scores = random_panel(210, n_reviewers)
+    panel = RatingPanel(scores)
+
+    start = time.perf_counter()
+    for i, j in panel.pairs:
+        cohen_kappa_score(scores[:, i], scores[:, j], weights='quadratic')
+    reference = time.perf_counter() - start
+
+    start = time.perf_counter()
+    panel.kappa('quadratic')
+    batched = time.perf_counter() - start
+
+    start = time.perf_counter()
+    panel.bootstrap(n_boot=2000, seed=0)
+    boot = time.perf_counter() - start
+
+    print(f"{n_reviewers:>2} reviewers ({len(panel.pairs):>3} pairs): "
+          f"cohen_kappa_score {1e3 * reference:8.2f} ms, batched {1e3 * batched:6.2f} ms, "
+          f"all metrics + 2000 bootstrap CIs {boot:5.2f} s")
+
+
+# --- sparse Kendall's W: 20 000 subjects, 20 reviewers, 20% of ratings observed ---
+
+scores = random_panel(20000, 20)
+long = pd.DataFrame(scores).rename_axis('Subject').reset_index().melt(
+    id_vars='Subject', var_name='Reviewer', value_name='Score')
+sparse_long = long[rng.random(len(long)) < 0.2]
+complete = (sparse_long.groupby('Subject').size() == 20).sum()
+
+start = time.perf_counter()
+w_sparse = sparse_kendall_w(sparse_long)
+elapsed = time.perf_counter() - start
+print(f"sparse W {w_sparse:.4f} vs complete-data W {sparse_kendall_w(long):.4f} "
+      f"({len(sparse_long)} ratings, {complete} complete subjects) in {1e3 * elapsed:.1f} ms")
@@ -0,0 +1,53 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Bootstrap benchmark
+# Michele Danilo Pierri MD PhD
+# Purpose: Compare speed and confidence intervals of the vectorized
+#          bootstrap engine against the original loop-based bootstrap_ci
+#          Run from the repository root: python benchmarks/bench_bootstrap.py
+# ------------------------------------------------------------
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from llm_eval.bootstrap import bootstrap_ci, METHODS
+
+
+# original implementation from 3_Statistical_Analysis.py, kept as reference
+
+def legacy_bootstrap_ci(data1, data2, n_boot=10000, ci=95):
+    diffs = []
+    for _ in range(n_boot):
+        s1 = np.random.choice(data1, size=len(data1), replace=True)
+        s2 = np.random.choice(data2, size=len(data2), replace=True)
+        diffs.append(np.mean(s1) - np.mean(s2))
+    lower = np.percentile(diffs, (100 - ci) / 2)
+    upper = np.percentile(diffs, 100 - (100 - ci) / 2)
+    return np.mean(diffs), lower, upper
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+# Likert-like groups at the size of one Model x Criterion cell of 2_Data.xlsx
+# (70 requests x 3 reviewers) and of a larger production panel
+
+rng = np.random.default_rng(0)
+probs_a = [0.02, 0.08, 0.25, 0.45, 0.20]
+probs_b = [0.04, 0.12, 0.30, 0.40, 0.14]
+
+print(f"{'n per group':>12} {'method':>12} {'legacy s':>10} {'engine s':>10} {'speed-up':>9}  CI legacy -> CI engine")
+for n in (210, 2100, 21000):
+    data1 = rng.choice(np.arange(1, 6), size=n, p=probs_a).astype(float)
+    data2 = rng.choice(np.arange(1, 6), size=n, p=probs_b).astype(float)
+    t_legacy, (_, lo_l, hi_l) = timed(legacy_bootstrap_ci, data1, data2)
+    for method in METHODS:
+        t_new, (_, lo_n, hi_n) = timed(bootstrap_ci, data1, data2, method=method, seed=1)
+        print(f"{n:>12} {method:>12} {t_legacy:>10.3f} {t_new:>10.3f} {t_legacy / t_new:>8.1f}x"
+              f"  [{lo_l:.3f}, {hi_l:.3f}] -> [{lo_n:.3f}, {hi_n:.3f}]")
@@ -0,0 +1,121 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Reviewer calibration benchmark
+# Michele Danilo Pierri MD PhD
+# Purpose: Feed the study ratings to the incremental reviewer calibration
+#          in batches and check its pairwise kappa and exact agreement
+#          against RatingPanel on the reliability pivot, and its offsets
+#          against the mean difference to the co-raters computed from the
+#          pivot, and that every reviewer is charted also when the workbook
+#          comes in one chunk, as from the command line. Then stream a synthetic campaign (8 reviewers, 3 per
+#          response, 6000 prompts) in which one reviewer turns harsher
+#          half way, and report when the drift is flagged, the cost of a
+#          batch update as the campaign grows, and the cost of rebuilding
+#          the pivot table and kappas from all ratings at each batch
+#          Run from the repository root: python benchmarks/bench_calibration.py
+# ------------------------------------------------------------
+
+import os
+import sys
+import time
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from llm_eval.agreement import RatingPanel
+from llm_eval.calibration import ReviewerCalibration
+from llm_eval.data import load_ratings
+from llm_eval.stages import criteria, reviewers
+from llm_eval.synthetic import generate, to_long
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+# --- study data: same agreement as the reliability analysis ---
+
+df_long = load_ratings(os.path.join(root, 'data', '2_Data.xlsx'), sheets=criteria, use_cache=False)
+calibration = ReviewerCalibration()
+shuffled = df_long.sample(frac=1, random_state=0)
+for rows in np.array_split(np.arange(len(shuffled)), 7):
+    calibration.update(shuffled.iloc[rows])
+assert calibration.update(df_long) == 0  # ratings already counted are skipped
+
+pairs = calibration.pairs_table().set_index(['Criterion', 'Reviewer A', 'Reviewer B'])
+offsets = calibration.reviewers_table().set_index(['Criterion', 'Reviewer'])
+for crit in criteria:
+    pivot = (df_long[df_long['Criterion'] == crit]
+             .pivot_table(index=['Request', 'Model'], columns='Reviewer', values='Score').dropna())
+    panel = RatingPanel(pivot[reviewers], levels=range(1, 6))
+    for (a, b), kappa in zip(combinations(reviewers, 2), panel.kappa('quadratic')[0]):
+        row = pairs.loc[(crit, a, b)]
+        assert np.isclose(row['Weighted Kappa'], round(kappa, 3))
+        assert np.isclose(row['Exact Agreement'], round((pivot[a] == pivot[b]).mean(), 3))
+    for r in reviewers:
+        others = [o for o in reviewers if o != r]
+        expected = np.mean([(pivot[r] - pivot[o]).mean() for o in others])
+        assert np.isclose(offsets.loc[(crit, r), 'Offset vs Co-raters'], round(expected, 3))
+# the whole workbook in one chunk, as the command line reads it, and in
+# chunks of 100 in sheet order (Reviewer1 always rates first): every reviewer is charted
+for size in (len(df_long), 100):
+    whole = ReviewerCalibration()
+    for start in range(0, len(df_long), size):
+        whole.update(df_long.iloc[start:start + size])
+    charted = whole.reviewers_table().query("Criterion == 'All'").set_index('Reviewer')['Charted']
+    assert (charted > whole.baseline).all(), charted.to_dict()
+print("Study: pairwise kappa, exact agreement and offsets match the reliability pivot.")
+print(calibration.reviewers_table().query("Criterion == 'All'").to_string(index=False))
+
+
+# --- synthetic campaign with one drifting reviewer ---
+
+rng = np.random.default_rng(0)
+n_prompts, panel_size = 6000, 3
+book = generate(n_prompts=n_prompts, n_reviewers=8, seed=1)
+stream = to_long(book).astype({'Request': str})
+names = sorted(stream['Reviewer'].unique())
+# each response is rated by 3 of the 8 reviewers, assigned per prompt
+assigned = {(request, name) for request in stream['Request'].unique()
+            for name in rng.choice(names, panel_size, replace=False)}
+stream = stream[[key in assigned for key in zip(stream['Request'], stream['Reviewer'])]]
+# ratings arrive prompt by prompt
+order = pd.Index(stream['Request'].unique())
+stream = stream.iloc[np.argsort(order.get_indexer(stream['Request']), kind='stable')].reset_index(drop=True)
+# Reviewer5 scores one point lower on 60% of the ratings of the second half
+half = len(stream) // 2
+harsh = (stream.index >= half) & (stream['Reviewer'] == 'Reviewer5') & (rng.random(len(stream)) < 0.6)
+stream.loc[harsh, 'Score'] = np.maximum(1, stream.loc[harsh, 'Score'] - 1)
+
+calibration = ReviewerCalibration()
+batch = 6000
+update_times, rebuild_times = [], []
+for start in range(0, len(stream), batch):
+    chunk = stream.iloc[start:start + batch]
+    begin = time.perf_counter()
+    calibration.update(chunk)
+    update_times.append(time.perf_counter() - begin)
+    if start // batch % 6 == 5:
+        # what the reliability analysis would redo on everything received so far
+        begin = time.perf_counter()
+        seen = stream.iloc[:start + batch].assign(Subject=lambda d: d['Request'] + "_" + d['Model'])
+        for crit in criteria:
+            pivot = seen[seen['Criterion'] == crit].pivot_table(index='Subject', columns='Reviewer', values='Score')
+            for a, b in combinations(pivot.columns, 2):
+                both = pivot[[a, b]].dropna()
+                if len(both):
+                    RatingPanel(both, levels=range(1, 6)).kappa('quadratic')
+        rebuild_times.append((start + batch, time.perf_counter() - begin))
+
+alarms = calibration.alarms_table()
+drift = alarms[(alarms['Reviewer'] == 'Reviewer5') & (alarms['Alarm Row'] > half)]
+first = drift.iloc[0]
+assert first['Direction'] == 'harsher' and abs(first['Change Row'] - half) < first['Alarm Row'] - half
+others = alarms.drop(first.name)
+print(f"\nSynthetic campaign: {len(stream)} ratings, {len(names)} reviewers; Reviewer5 turns harsher at row {half + 1}: "
+      f"flagged at row {first['Alarm Row']} ({first['Alarm Row'] - half} ratings later), "
+      f"estimated change at row {first['Change Row']}, shift {first['Shift']:+.2f} points; "
+      f"other alarms: {len(others)}")
+print(calibration.reviewers_table().query("Criterion == 'All'").to_string(index=False))
+print(f"Update of {batch} ratings: {np.mean(update_times[:3]) * 1e3:.0f} ms at the start, "
+      f"{np.mean(update_times[-3:]) * 1e3:.0f} ms at the end; rebuilding pivot and kappas from all ratings: "
+      + ", ".join(f"{seconds * 1e3:.0f} ms at {rows} ratings" for rows, seconds in rebuild_times))
@@ -0,0 +1,58 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Aggregation cube benchmark
+# Michele Danilo Pierri MD PhD
+# Purpose: Check the cube summaries against pandas groupby on the study
+#          data, and time every Model x Criterion x Origin x Diagnosis x
+#          Reviewer roll-up on the data replicated to ~2.5 M ratings
+#          against masking the long table once per subgroup
+#          Run from the repository root: python benchmarks/bench_cube.py
+# ------------------------------------------------------------
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from llm_eval.cube import ScoreCube, cube_dims
+from llm_eval.data import criteria, load_ratings
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+df_long = load_ratings(os.path.join(root, 'data', '2_Data.xlsx'), sheets=criteria, use_cache=False)
+
+
+# --- agreement with pandas ---
+
+cube = ScoreCube(df_long)
+for by in cube.groupings():
+    if not by:
+        continue
+    ref = df_long.groupby(by, sort=False)['Score'].agg(['count', 'mean', 'median', 'std'])
+    table = cube.summary(by).set_index(by).loc[ref.index]
+    assert np.allclose(table[['N', 'Mean', 'Median', 'SD']].to_numpy(dtype=float),
+                       ref.to_numpy(dtype=float), equal_nan=True), by
+print("cube summaries match pandas groupby for all 31 groupings.")
+
+
+# --- timing on replicated data ---
+
+big = pd.concat([df_long] * 1000, ignore_index=True)
+for dim in cube_dims:
+    big[dim] = big[dim].astype('category')
+print(f"{len(big)} ratings")
+
+start = time.perf_counter()
+for by in cube.groupings():
+    if by:
+        for _, group in big.groupby(by, observed=True)['Score']:
+            group.mean(), group.median(), group.std()
+print(f"pandas groupby, every grouping     {time.perf_counter() - start:6.2f} s")
+
+start = time.perf_counter()
+big_cube = ScoreCube(big)
+built = time.perf_counter() - start
+big_cube.rollup()
+big_cube.kruskal_rollup()
+print(f"cube build {built:.2f} s + roll-ups and tests {time.perf_counter() - start - built:6.2f} s")
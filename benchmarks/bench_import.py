@@ -0,0 +1,82 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Import time benchmark
+# Michele Danilo Pierri MD PhD
+# Purpose: Time the import of the library modules and the start of the
+#          command line (python -m llm_eval --help) in fresh interpreters,
+#          and check that they do not load the heavy statistics and
+#          plotting packages (scipy.stats, statsmodels, scikit-learn,
+#          pingouin, scikit-posthocs, matplotlib, seaborn): those are only
+#          imported by the functions that need them. bench_suite.py
+#          records the same timings with every run.
+#          Run from the repository root: python benchmarks/bench_import.py
+# ------------------------------------------------------------
+
+import json
+import os
+import subprocess
+import sys
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+scripts_dir = os.path.join(root, 'scripts')
+
+HEAVY = ['scipy.stats', 'scipy.optimize', 'statsmodels', 'sklearn', 'pingouin', 'scikit_posthocs',
+         'matplotlib', 'seaborn']
+# what is imported -> heavy packages it is allowed to load
+TARGETS = {
+    'llm_eval.data': [],
+    'llm_eval.stages': [],
+    'llm_eval.rankstats': [],
+    'llm_eval.agreement': [],
+    'llm_eval.pipeline': [],
+    'llm_eval.service': [],
+    'llm_eval.longitudinal': [],
+    'llm_eval.calibration': [],
+    'llm_eval.streaming': [],
+    'llm_eval.ordinal': ['scipy.optimize'],
+    'llm_eval.figures': HEAVY,
+    'python -m llm_eval --help': [],
+}
+
+PROBE = """
+import sys, time, json, runpy, io, contextlib
+start = time.perf_counter()
+target = sys.argv[1]
+if target.startswith('python -m '):
+    module, *args = target.split()[2:]
+    sys.argv = [module] + args
+    with contextlib.redirect_stdout(io.StringIO()):
+        runpy.run_module(module, run_name='__main__')
+else:
+    __import__(target)
+elapsed = time.perf_counter() - start
+print(json.dumps({'seconds': elapsed, 'modules': [m for m in sys.argv[2:] if m in sys.modules]}))
+"""
+
+
+def import_time(target, repeat=3):
+    """Best-of-`repeat` seconds to import `target` in a fresh interpreter, and the heavy packages it loaded."""
+    env = {**os.environ, 'PYTHONPATH': scripts_dir}
+    env.pop('LLM_EVAL_PROFILE', None)
+    best, loaded = None, None
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', PROBE, target, *HEAVY], env=env, cwd=scripts_dir,
+                             capture_output=True, text=True, check=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        if best is None or result['seconds'] < best:
+            best, loaded = result['seconds'], result['modules']
+    return best, loaded
+
+
+def import_times(targets=TARGETS, repeat=3):
+    return {target: import_time(target, repeat) for target in targets}
+
+
+if __name__ == '__main__':
+    times = import_times()
+    width = max(len(target) for target in times)
+    for target, (seconds, loaded) in times.items():
+        print(f"{target:<{width}}  {seconds * 1e3:7.0f} ms  {', '.join(loaded) or '-'}")
+    unexpected = {target: [m for m in loaded if m not in TARGETS[target]] for target, (_, loaded) in times.items()}
+    unexpected = {target: modules for target, modules in unexpected.items() if modules}
+    assert not unexpected, f"heavy packages imported at module level: {unexpected}"
+    print("No heavy package is imported before it is needed.")
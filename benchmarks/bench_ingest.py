@@ -0,0 +1,90 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Multi-workbook ingestion benchmark
+# Michele Danilo Pierri MD PhD
+# Purpose: Ingest 12 synthetic rounds in the 2_Data.xlsx schema plus the
+#          study and pilot workbooks, and time a cold serial parse, a cold
+#          parse with the default worker count (one per CPU) and with two
+#          workers, a warm run served from the per-workbook cache,
+#          and a run after one round changed (only that workbook is parsed
+#          again). Also checks that every round equals data.load_ratings
+#          of its workbook, that the pilot rows keep their scores and that
+#          a changed workbook does not evict the caches of other workbooks
+#          or of other sheet sets
+#          Run from the repository root: python benchmarks/bench_ingest.py
+# ------------------------------------------------------------
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from llm_eval.data import CACHE_DIR, criteria, load_ratings
+from llm_eval.ingest import ingest
+from llm_eval.synthetic import generate, write_workbook
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+rounds_dir = tempfile.mkdtemp(prefix='llm_eval_rounds_')
+for name in ['1_Pilot.xlsx', '2_Data.xlsx']:
+    shutil.copy(os.path.join(root, 'data', name), rounds_dir)
+for i in range(12):
+    write_workbook(generate(n_prompts=300, seed=i), os.path.join(rounds_dir, f'round_{i:02d}.xlsx'))
+# at least two, so the process pool is exercised on single-CPU machines too
+workers = max(2, os.cpu_count() or 1)
+
+
+def timed(**kwargs):
+    start = time.perf_counter()
+    df = ingest(rounds_dir, **kwargs)
+    return df, time.perf_counter() - start
+
+
+serial, serial_time = timed(workers=1, use_cache=False)
+default, default_time = timed(use_cache=False)
+pd.testing.assert_frame_equal(serial, default)
+shutil.rmtree(os.path.join(rounds_dir, CACHE_DIR), ignore_errors=True)
+parallel, parallel_time = timed(workers=workers)
+pd.testing.assert_frame_equal(serial, parallel)
+warm, warm_time = timed(workers=workers)
+pd.testing.assert_frame_equal(parallel, warm)
+
+for name, group in parallel.groupby('Round', sort=False):
+    if name == '1_Pilot':
+        pilot = pd.read_excel(os.path.join(rounds_dir, '1_Pilot.xlsx'))
+        assert len(group) == 4 * len(pilot) and group['Score'].sum() == pilot[group['Criterion'].unique()].sum().sum()
+        continue
+    expected = load_ratings(os.path.join(rounds_dir, name + '.xlsx'), use_cache=False)
+    pd.testing.assert_frame_equal(group.drop(columns=['Round', 'Source']).reset_index(drop=True), expected,
+                                  check_dtype=False)
+
+write_workbook(generate(n_prompts=300, seed=99), os.path.join(rounds_dir, 'round_05.xlsx'))
+changed, changed_time = timed(workers=workers)
+assert not changed[changed['Round'] == 'round_05'].reset_index(drop=True).equals(
+    parallel[parallel['Round'] == 'round_05'].reset_index(drop=True))
+assert len(os.listdir(os.path.join(rounds_dir, CACHE_DIR, 'ingest'))) == 14
+
+print(f"{parallel['Round'].nunique()} workbooks, {len(parallel)} ratings: cold serial {serial_time:.2f} s, "
+      f"cold on the default {min(os.cpu_count() or 1, 14)} worker(s) {default_time:.2f} s, "
+      f"cold on {workers} workers {parallel_time:.2f} s, warm cache {warm_time:.2f} s, "
+      f"one round changed {changed_time:.2f} s; every round matches load_ratings.")
+
+# a workbook whose name extends another's keeps its cache when the other changes
+write_workbook(generate(n_prompts=300, seed=7), os.path.join(rounds_dir, 'round_05-2.xlsx'))
+timed(workers=workers)
+write_workbook(generate(n_prompts=300, seed=98), os.path.join(rounds_dir, 'round_05.xlsx'))
+timed(workers=workers)
+cached = os.listdir(os.path.join(rounds_dir, CACHE_DIR, 'ingest'))
+assert len(cached) == 15 and sum(name.startswith('round_05-2-') for name in cached) == 1, cached
+
+# same for the load_ratings cache, which also keeps one file per sheet set
+for name in ['round_05-2.xlsx', 'round_05.xlsx']:
+    for sheets in [None, criteria]:
+        load_ratings(os.path.join(rounds_dir, name), sheets=sheets)
+write_workbook(generate(n_prompts=300, seed=97), os.path.join(rounds_dir, 'round_05.xlsx'))
+load_ratings(os.path.join(rounds_dir, 'round_05.xlsx'))
+cached = [name for name in os.listdir(os.path.join(rounds_dir, CACHE_DIR)) if name.endswith('.parquet')]
+assert len(cached) == 4 and sum(name.startswith('round_05-2-') for name in cached) == 2, cached
+shutil.rmtree(rounds_dir, ignore_errors=True)
@@ -0,0 +1,79 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Longitudinal comparison benchmark
+# Michele Danilo Pierri MD PhD
+# Purpose: Summarize 20 synthetic rounds of 700 prompts (the Model gap
+#          widening from round to round) and check that round-over-round
+#          deltas, trend tests and reviewer calibration computed from the
+#          saved histograms equal the same analyses on the raw ratings
+#          (scipy.stats.mannwhitneyu, bootstrap_ci, scipy.stats.kendalltau,
+#          pandas groupby). Times both, and the size of the summaries
+#          against the raw long tables
+#          Run from the repository root: python benchmarks/bench_longitudinal.py
+# ------------------------------------------------------------
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.stats import kendalltau, mannwhitneyu
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from llm_eval.bootstrap import bootstrap_ci
+from llm_eval.longitudinal import RoundHistory
+from llm_eval.synthetic import generate, to_long
+
+n_boot = 2000
+rounds = []
+for i in range(20):
+    df = to_long(generate(n_prompts=700, seed=i, model_spread=0.1 + 0.03 * i))
+    for col in ["Request", "Model", "Origin", "Diagnosis", "Criterion", "Reviewer"]:
+        df[col] = df[col].astype(str)
+    rounds.append(df.assign(Round=f"round_{i:02d}"))
+raw = pd.concat(rounds, ignore_index=True)
+
+start = time.perf_counter()
+history = RoundHistory.from_long(raw)
+build = time.perf_counter() - start
+path = history.save(os.path.join(tempfile.mkdtemp(prefix='llm_eval_rounds_'), 'rounds.parquet'))
+
+start = time.perf_counter()
+history = RoundHistory.load(path)
+deltas = history.deltas(n_boot=n_boot, seed=0)
+trend = history.trend()
+calibration = history.calibration()
+fast = time.perf_counter() - start
+
+# the same analyses on the raw ratings
+start = time.perf_counter()
+rng = np.random.default_rng(0)
+groups = {key: group['Score'].to_numpy() for key, group in raw.groupby(['Round', 'Model', 'Criterion'])}
+names = history.rounds
+expected = []
+for first, second in zip(names[:-1], names[1:]):
+    for model in pd.unique(raw['Model']):
+        for crit in pd.unique(raw['Criterion']):
+            x, y = groups[(first, model, crit)], groups[(second, model, crit)]
+            _, lower, upper = bootstrap_ci(y, x, n_boot=n_boot, seed=rng)
+            expected.append((lower, upper, mannwhitneyu(x, y).pvalue))
+trend_p = {key: kendalltau(group['Round'].map(names.index), group['Score']).pvalue
+           for key, group in raw.groupby(['Model', 'Criterion'])}
+raw_calibration = raw.groupby(['Round', 'Criterion', 'Reviewer'], sort=False)['Score'].mean()
+slow = time.perf_counter() - start
+
+expected = np.array(expected)
+assert np.allclose(deltas[['95% CI Lower', '95% CI Upper', 'p-value']].to_numpy(), expected)
+assert np.allclose(trend['p-value'], [trend_p[key] for key in zip(trend['Model'], trend['Criterion'])],
+                   rtol=1e-6, atol=0)
+assert np.allclose(calibration.set_index(['Round', 'Criterion', 'Reviewer'])['Mean']
+                   .loc[raw_calibration.index], raw_calibration)
+assert (trend['z'] > 0).sum() >= 3  # the leading model improves over the rounds
+
+print(f"{len(names)} rounds, {len(raw)} ratings ({raw.memory_usage(deep=True).sum() / 2 ** 20:.1f} MiB) "
+      f"summarized in {build:.2f} s to {len(history.cells)} histogram cells "
+      f"({os.path.getsize(path) / 2 ** 10:.0f} KiB on disk)")
+print(f"{len(deltas)} deltas with {n_boot} bootstrap resamples, {len(trend)} trend tests and "
+      f"{len(calibration)} reviewer calibrations: {fast * 1e3:.0f} ms from the summaries, "
+      f"{slow * 1e3:.0f} ms from the raw ratings; same results")
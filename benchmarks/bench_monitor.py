@@ -0,0 +1,92 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Sequential monitoring benchmark
+# Michele Danilo Pierri MD PhD
+# Purpose: Stream the study ratings into the sequential monitor in batches
+#          of requests, check that the final differences match the
+#          differences in mean score computed from the ratings, and compare the cost of a look
+#          with rerunning the statistics of script 3. Then simulate rating
+#          collections with no Model effect, looking after every batch,
+#          and compare the false positive rate of repeated fixed-sample
+#          tests with the anytime-valid p-values
+#          Run from the repository root: python benchmarks/bench_monitor.py
+# ------------------------------------------------------------
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from llm_eval.data import load_ratings
+from llm_eval.monitor import SequentialMonitor
+from llm_eval.stages import criteria, statistics
+from llm_eval.synthetic import generate, to_long
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+df_long = load_ratings(os.path.join(root, 'data', '2_Data.xlsx'), sheets=criteria, use_cache=False)
+batch = 10  # requests per look
+
+
+def batches(df, size, seed=0):
+    requests = pd.unique(df['Request'])
+    order = np.random.default_rng(seed).permutation(requests)
+    for k in range(0, len(order), size):
+        yield df[df['Request'].isin(order[k:k + size])]
+
+
+# --- study data, arriving in batches of requests ---
+
+monitor = SequentialMonitor()
+look_times = []
+for chunk in batches(df_long, batch):
+    start = time.perf_counter()
+    monitor.update(chunk)
+    look_times.append(time.perf_counter() - start)
+assert monitor.update(df_long) == 0  # a file passed again adds nothing
+table = monitor.report()
+print(table.to_string(index=False))
+
+means = df_long.groupby(['Criterion', 'Model'])['Score'].mean()
+expected = [means[crit, a] - means[crit, b] for crit, a, b in zip(table['Criterion'], table['Model A'], table['Model B'])]
+assert np.allclose(table['Δ Mean'], expected, atol=5e-4)
+
+with tempfile.TemporaryDirectory() as cache_dir:
+    start = time.perf_counter()
+    statistics(df_long, cache_dir=cache_dir)
+    rerun = time.perf_counter() - start
+print(f"\n{len(look_times)} looks of {batch} requests: {np.mean(look_times) * 1e3:.1f} ms per look, "
+      f"rerunning the script 3 statistics {rerun:.1f} s")
+
+
+# --- false positives with a look after every batch (no Model effect) ---
+
+def naive_p(monitor):
+    """Fixed-sample two-sided z-test p-values (Bonferroni) at the current look."""
+    p = []
+    for c in range(len(monitor.criteria)):
+        _, _, diff, se, _ = monitor._pair_stats(c)
+        p.append(np.minimum(1, 2 * norm.sf(np.abs(diff / se)) * len(monitor.pairs)))
+    return np.array(p)
+
+
+n_streams = 200
+naive_hits = anytime_hits = 0
+for seed in range(n_streams):
+    book = generate(n_prompts=70, n_criteria=1, model_spread=0.0, seed=seed)
+    stream = to_long(book)
+    stream['Request'] = stream['Request'].astype(str)
+    sim = SequentialMonitor(criteria=list(book))
+    rejected = False
+    for chunk in batches(stream, 5, seed):
+        sim.update(chunk)
+        rejected |= bool((naive_p(sim) < 0.05).any())
+    naive_hits += rejected
+    anytime_hits += bool(sim.report()['Significant'].any())
+print(f"{n_streams} simulated collections without Model effect, {sim.looks} looks each: "
+      f"false positive rate {naive_hits / n_streams:.3f} with repeated fixed-sample tests, "
+      f"{anytime_hits / n_streams:.3f} with the anytime-valid p-values (alpha 0.05)")
+assert anytime_hits / n_streams <= 0.05 + 2 * np.sqrt(0.05 * 0.95 / n_streams)
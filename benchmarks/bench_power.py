@@ -0,0 +1,48 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Simulated power benchmark
+# Michele Danilo Pierri MD PhD
+# Purpose: Check the batched Friedman and Kruskal-Wallis statistics against
+#          SciPy on simulated studies, and time a full power grid from the
+#          pilot study with 1 worker and with every CPU
+#          Run from the repository root: python benchmarks/bench_power.py
+# ------------------------------------------------------------
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from llm_eval.power import PilotModel, friedman_batch, kruskal_batch, power_grid
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+model = PilotModel(pd.read_excel(os.path.join(root, 'data', '1_Pilot.xlsx'), sheet_name='Sheet1'))
+print(model.summary())
+
+
+# --- agreement with SciPy ---
+
+rng = np.random.default_rng(0)
+ratings = model.simulate(rng, 200, 20, effect=1.0)
+q, p_friedman = friedman_batch(ratings.mean(axis=3))
+counts = np.stack([(ratings == level).sum(axis=(1, 3)) for level in model.levels], axis=-1)
+h, p_kruskal = kruskal_batch(counts)
+for i in range(len(ratings)):
+    ref = stats.friedmanchisquare(*ratings[i].mean(axis=2).T)
+    assert np.isclose(q[i], ref.statistic) and np.isclose(p_friedman[i], ref.pvalue)
+    ref = stats.kruskal(*[ratings[i][:, m].ravel() for m in range(ratings.shape[2])])
+    assert np.isclose(h[i], ref.statistic) and np.isclose(p_kruskal[i], ref.pvalue)
+print(f"{len(ratings)} simulated studies: Friedman and Kruskal-Wallis match SciPy.")
+
+
+# --- timing: 10 sample sizes x 5 effect sizes x 2000 studies ---
+
+for workers in sorted({1, os.cpu_count() or 1}):
+    start = time.perf_counter()
+    grid = power_grid(model, seed=1, workers=workers)
+    print(f"power grid ({len(grid)} cells, {grid['Simulations'].sum()} studies), "
+          f"{workers} worker(s): {time.perf_counter() - start:.2f} s")
+print(grid[grid["Effect scale"].isin([0.0, 1.0])].to_string(index=False))
@@ -0,0 +1,79 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Rank statistics benchmark
+# Michele Danilo Pierri MD PhD
+# Purpose: Check that the count-table rank statistics reproduce SciPy and
+#          scikit-posthocs on random Likert subgroups, and time both
+#          Run from the repository root: python benchmarks/bench_rankstats.py
+# ------------------------------------------------------------
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import scikit_posthocs as sp
+from scipy import stats
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from llm_eval import rankstats
+
+
+rng = np.random.default_rng(0)
+n_tests = 500
+
+
+def random_groups(n_groups):
+    sizes = rng.integers(5, 400, size=n_groups)
+    probs = rng.dirichlet(np.ones(5), size=n_groups)
+    return [rng.choice(np.arange(1, 6), size=n, p=p).astype(float) for n, p in zip(sizes, probs)]
+
+
+# --- agreement with the reference implementations ---
+
+for _ in range(n_tests):
+    groups = random_groups(3)
+
+    h_ref, p_ref = stats.kruskal(*groups)
+    h, p = rankstats.kruskal(*groups)
+    assert np.isclose(h, h_ref) and np.isclose(p, p_ref), (h, h_ref, p, p_ref)
+
+    u_ref, p_ref = stats.mannwhitneyu(groups[0], groups[1], alternative='two-sided', method='asymptotic')
+    u, p = rankstats.mannwhitneyu(groups[0], groups[1])
+    assert np.isclose(u, u_ref) and np.isclose(p, p_ref), (u, u_ref, p, p_ref)
+
+    data = pd.DataFrame({
+        'Score': np.concatenate(groups),
+        'Model': np.repeat(['A', 'B', 'C'], [len(g) for g in groups]),
+    })
+    for adjust in ('bonferroni', 'holm', None):
+        ref = sp.posthoc_dunn(data, val_col='Score', group_col='Model', p_adjust=adjust)
+        new = rankstats.posthoc_dunn(data, val_col='Score', group_col='Model', p_adjust=adjust)
+        assert np.allclose(new.loc[ref.index, ref.columns].values, ref.values)
+
+print(f"{n_tests} random subgroups: Kruskal-Wallis, Mann-Whitney and Dunn match the reference.")
+
+
+# --- timing ---
+
+samples = [random_groups(3) for _ in range(n_tests)]
+frames = [pd.DataFrame({'Score': np.concatenate(g),
+                        'Model': np.repeat(['A', 'B', 'C'], [len(x) for x in g])}) for g in samples]
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    for i in range(n_tests):
+        func(i)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {1e3 * elapsed / n_tests:8.3f} ms/test")
+
+
+timed("scipy.stats.kruskal", lambda i: stats.kruskal(*samples[i]))
+timed("rankstats.kruskal", lambda i: rankstats.kruskal(*samples[i]))
+counts = [rankstats.counts_of(*g)[0] for g in samples]
+timed("rankstats.kruskal_counts", lambda i: rankstats.kruskal_counts(counts[i]))
+timed("scipy.stats.mannwhitneyu", lambda i: stats.mannwhitneyu(samples[i][0], samples[i][1]))
+timed("rankstats.mannwhitney_counts", lambda i: rankstats.mannwhitney_counts(counts[i][0], counts[i][1]))
+timed("scikit_posthocs.posthoc_dunn", lambda i: sp.posthoc_dunn(frames[i], val_col='Score', group_col='Model'))
+timed("rankstats.dunn_counts", lambda i: rankstats.dunn_counts(counts[i]))
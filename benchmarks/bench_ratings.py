@@ -0,0 +1,67 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Compact ratings table benchmark
+# Michele Danilo Pierri MD PhD
+# Purpose: Compare the memory of the long ratings DataFrame with the
+#          compact RatingTable, and the time to get the scores of every
+#          Criterion x Model group by string filters against group views,
+#          on the study data and on a synthetic set of 7000 prompts.
+#          Also checks the round trip back to the pandas long table
+#          Run from the repository root: python benchmarks/bench_ratings.py
+# ------------------------------------------------------------
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from llm_eval.data import load_ratings
+from llm_eval.ratings import RatingTable
+from llm_eval.stages import criteria, models
+from llm_eval.synthetic import generate, to_long
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def best_of(func, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench(label, df_long):
+    order = {"Criterion": list(pd.unique(df_long['Criterion'])), "Model": list(pd.unique(df_long['Model']))}
+    build = best_of(lambda: RatingTable.from_long(df_long, order), repeat=1)
+    table = RatingTable.from_long(df_long, order)
+    pd.testing.assert_frame_equal(table.to_pandas(), df_long.reset_index(drop=True))
+    assert np.shares_memory(table.group_scores(criteria[0], models[0]), table.scores)
+
+    def filters():
+        for crit in order["Criterion"]:
+            data = df_long[df_long['Criterion'] == crit]
+            for model in order["Model"]:
+                data[data['Model'] == model]['Score']
+
+    def views():
+        for crit in order["Criterion"]:
+            for model in order["Model"]:
+                table.values(crit, model)
+
+    frame_bytes = df_long.memory_usage(deep=True).sum()
+    print(f"{label}: {len(df_long)} ratings, DataFrame {frame_bytes / 2 ** 20:.2f} MiB, "
+          f"RatingTable {table.nbytes / 2 ** 20:.2f} MiB ({frame_bytes / table.nbytes:.0f}x smaller, "
+          f"built in {build * 1e3:.0f} ms); Criterion x Model groups: "
+          f"filters {best_of(filters) * 1e3:.1f} ms, "
+          f"views {best_of(views) * 1e3:.1f} ms")
+
+
+bench("Study", load_ratings(os.path.join(root, 'data', '2_Data.xlsx'), sheets=criteria, use_cache=False))
+synthetic = to_long(generate(n_prompts=7000, seed=0))
+for col in ["Request", "Model", "Origin", "Diagnosis", "Criterion", "Reviewer"]:
+    synthetic[col] = synthetic[col].astype(str)
+bench("Synthetic, 7000 prompts", synthetic)
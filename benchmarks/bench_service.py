@@ -0,0 +1,102 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Local query service benchmark
+# Michele Danilo Pierri MD PhD
+# Purpose: Start the query service on the study data, check its answers
+#          (descriptive statistics against the descriptive stage,
+#          Kruskal-Wallis against scipy.stats.kruskal, kappa against
+#          sklearn's cohen_kappa_score, Figure 1 as a PNG), and time the
+#          first request of every query against dashboard refreshes served
+#          from the LRU cache, with 50 clients at a time
+#          Run from the repository root: python benchmarks/bench_service.py
+# ------------------------------------------------------------
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from itertools import combinations
+
+import numpy as np
+from scipy.stats import kruskal
+from sklearn.metrics import cohen_kappa_score
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from llm_eval.data import load_ratings
+from llm_eval.service import AnalysisService, serve
+from llm_eval.stages import criteria, descriptive, models, reviewers
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+df_long = load_ratings(os.path.join(root, 'data', '2_Data.xlsx'), sheets=criteria, use_cache=False)
+
+
+async def get(port, target):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, body = response.split(b"\r\n\r\n", 1)
+    status = int(head.split()[1])
+    return status, body if b"image/png" in head else json.loads(body)
+
+
+async def run():
+    service = AnalysisService(df_long)
+    server = await serve(service, port=0)
+    port = server.sockets[0].getsockname()[1]
+
+    queries = ([f"/describe?model={m}&criterion={c}" for c in criteria for m in models]
+               + [f"/describe?criterion={c}&origin={o}" for c in criteria for o in ["Patient", "Doctor"]]
+               + [f"/kruskal?criterion={c}" for c in criteria]
+               + [f"/kappa?criterion={c}&a={a}&b={b}" for c in criteria for a, b in combinations(reviewers, 2)]
+               + ["/figure_1.png", "/figure_1.png?origin=Doctor"])
+
+    start = time.perf_counter()
+    cold = [await get(port, query) for query in queries]
+    cold_time = time.perf_counter() - start
+    assert all(status == 200 for status, _ in cold)
+    answers = dict(zip(queries, (body for _, body in cold)))
+
+    # the same answers as the analysis code
+    table = descriptive(df_long, cache_dir=tempfile.mkdtemp(prefix="llm_eval_store_"))["stat_analysis_descriptive"]
+    for row in table.to_dict("records"):
+        answer = answers[f"/describe?model={row['Model']}&criterion={row['Criterion']}"]
+        assert all(np.isclose(answer[key], row[key]) for key in ["N", "Mean", "Median", "SD", "IQR"])
+    for crit in criteria:
+        data = df_long[df_long['Criterion'] == crit]
+        h, p = kruskal(*[data.loc[data['Model'] == m, 'Score'] for m in models])
+        assert np.isclose(answers[f"/kruskal?criterion={crit}"]["H-statistic"], h)
+        assert np.isclose(answers[f"/kruskal?criterion={crit}"]["p-value"], p)
+        wide = data.pivot_table(index=["Request", "Model"], columns="Reviewer", values="Score").dropna()
+        for a, b in combinations(reviewers, 2):
+            kappa = answers[f"/kappa?criterion={crit}&a={a}&b={b}"]["Weighted Kappa"]
+            assert np.isclose(kappa, cohen_kappa_score(wide[a], wide[b], weights="quadratic"))
+    assert answers["/figure_1.png"].startswith(b"\x89PNG")
+    assert (await get(port, "/describe?model=GPT-5"))[0] == 400
+    assert (await get(port, "/nothing"))[0] == 404
+
+    # identical requests arriving together share one computation
+    misses = service.cache.misses
+    await asyncio.gather(*(get(port, "/figure_1.png?diagnosis=Pre") for _ in range(20)))
+    assert service.cache.misses == misses + 1
+
+    # dashboard refreshes: every query again, 50 clients at a time
+    refreshes = 10
+    start = time.perf_counter()
+    for _ in range(refreshes):
+        for i in range(0, len(queries), 50):
+            batch = await asyncio.gather(*(get(port, query) for query in queries[i:i + 50]))
+            assert all(status == 200 for status, _ in batch)
+    warm_time = (time.perf_counter() - start) / refreshes
+    stats = (await get(port, "/cache"))[1]
+    server.close()
+    await server.wait_closed()
+
+    print(f"{len(queries)} queries answered like the analysis code; first requests {cold_time * 1e3:.0f} ms, "
+          f"a cached refresh of all of them {warm_time * 1e3:.0f} ms "
+          f"(cache: {stats['hits']} hits, {stats['misses']} misses)")
+
+
+asyncio.run(run())
@@ -0,0 +1,78 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Streaming ingestion benchmark
+# Michele Danilo Pierri MD PhD
+# Purpose: Write the study ratings as CSV, Parquet and JSONL, stream each
+#          file in small chunks and check that the descriptive table
+#          equals stat_analysis_descriptive from the in-memory analysis and
+#          that the figure inputs equal those of Figures 1, 3 and 4. Then
+#          compare time and peak memory of streaming the ratings replicated
+#          to ~2.5 M rows with loading the whole file
+#          Run from the repository root: python benchmarks/bench_streaming.py
+# ------------------------------------------------------------
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from llm_eval.data import load_ratings
+from llm_eval.figures import row_summary, summary_data
+from llm_eval.stages import criteria, descriptive, models
+from llm_eval.streaming import accumulate
+
+
+def measured(func):
+    """(result, seconds, peak traced memory in bytes) of func()."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+df_long = load_ratings(os.path.join(root, 'data', '2_Data.xlsx'), sheets=criteria, use_cache=False)
+
+with tempfile.TemporaryDirectory() as tmp:
+    expected = descriptive(df_long, cache_dir=os.path.join(tmp, 'store'))['stat_analysis_descriptive']
+    summary = row_summary(df_long)
+    writers = {
+        'ratings.csv': lambda path: df_long.to_csv(path, index=False),
+        'ratings.parquet': lambda path: df_long.to_parquet(path, index=False),
+        'ratings.jsonl': lambda path: df_long.to_json(path, orient='records', lines=True),
+    }
+    for name, write in writers.items():
+        path = os.path.join(tmp, name)
+        write(path)
+        acc = accumulate(path, chunksize=500)
+        assert acc.rows == len(df_long)
+        pd.testing.assert_frame_equal(acc.descriptive(models, criteria), expected, check_dtype=False)
+        inputs = acc.figure_inputs()
+        for figure, key in [('figure_1', 'figure1'), ('figure_3', 'diagnosis'), ('figure_4', 'origin')]:
+            direct = summary_data(figure, summary)
+            by = list(direct.columns[:2]) if key != 'figure1' else ['Criterion', 'Model']
+            streamed = inputs[key].sort_values(by).reset_index(drop=True)
+            direct = direct.sort_values(by).reset_index(drop=True)[streamed.columns]
+            pd.testing.assert_frame_equal(streamed, direct, check_dtype=False)
+    print("CSV, Parquet and JSONL: streamed descriptive table and figure inputs match the in-memory analysis.")
+
+    # --- ~2.5 M ratings ---
+    big = pd.concat([df_long.assign(Request=df_long['Request'].astype(str) + f"_{i}") for i in range(1000)],
+                    ignore_index=True)
+    path = os.path.join(tmp, 'big.parquet')
+    big.to_parquet(path, index=False)
+    del big
+    acc, stream_time, stream_peak = measured(lambda: accumulate(path))
+    means, memory_time, memory_peak = measured(
+        lambda: pd.read_parquet(path).groupby(['Criterion', 'Model'])['Score'].mean())
+    streamed = acc.descriptive(models, criteria).set_index(['Criterion', 'Model'])['Mean']
+    assert np.allclose(streamed, means.reindex(streamed.index).round(3))
+    print(f"{acc.rows} ratings: streamed in chunks {stream_time:.1f} s, peak {stream_peak / 2 ** 20:.0f} MiB; "
+          f"whole table loaded {memory_time:.1f} s, peak {memory_peak / 2 ** 20:.0f} MiB")
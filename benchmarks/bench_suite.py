@@ -0,0 +1,145 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Pipeline benchmark suite
+# Michele Danilo Pierri MD PhD
+# Purpose: Time every analysis stage of the pipeline (scripts 2-8) on
+#          synthetic rating sets of increasing size, written as workbooks
+#          in the 2_Data.xlsx schema (see scripts/llm_eval/synthetic.py).
+#          Each stage runs alone in this process on a cold result cache.
+#          Timings are appended to benchmarks/results/bench_suite.csv with
+#          the git commit, so trends can be followed across commits.
+#          The import time of the library modules and of the command line
+#          (see bench_import.py) is recorded with every run.
+#          Run from the repository root: python benchmarks/bench_suite.py
+#          e.g.  --prompts 70 700 7000 --reviewers 3 --missing 0.05
+#                --trend   (stage timings per commit from the results file)
+# ------------------------------------------------------------
+
+import argparse
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(root, 'scripts'))
+from bench_import import import_times
+from llm_eval import pipeline
+from llm_eval.synthetic import generate, write_columnar, write_workbook
+
+RESULTS = os.path.join(root, 'benchmarks', 'results', 'bench_suite.csv')
+# the power simulation depends only on the pilot, not on the size of the rating set
+DEFAULT_STAGES = ['reliability', 'descriptive', 'statistics', 'subgroups', 'sensitivity', 'ordinal',
+                  'figure_1', 'figure_2', 'figure_3', 'figure_4']
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                               capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+
+def bench_size(n_prompts, args, work_dir):
+    data_dir = os.path.join(work_dir, 'data')
+    book = generate(n_prompts, args.models, args.reviewers, args.criteria, args.missing, seed=args.seed)
+    write_workbook(book, os.path.join(data_dir, '2_Data.xlsx'))
+    write_columnar(book, os.path.join(data_dir, '2_Data.parquet'))
+    shutil.copy(os.path.join(root, 'data', '1_Pilot.xlsx'), data_dir)
+    n_ratings = sum(sheet.filter(like='Reviewer').notna().sum().sum() for sheet in book.values())
+
+    timings = {}
+    start = time.perf_counter()
+    pd.read_parquet(os.path.join(data_dir, '2_Data.parquet'))
+    timings['load_columnar'] = time.perf_counter() - start
+
+    # workers=0: one stage at a time in this process, so stages do not compete for CPUs
+    stage_list = pipeline.build_stages(data_dir, os.path.join(work_dir, 'figures'), os.path.join(work_dir, 'cache'))
+    stage_list = pipeline.select(stage_list, args.stages)
+    _, stage_timings = pipeline.run(stage_list, os.path.join(work_dir, 'tables'), workers=0)
+    timings.update(stage_timings)
+    return n_ratings, timings
+
+
+def run_suite(args):
+    stamp = time.strftime('%Y-%m-%d %H:%M:%S')
+    commit = git_commit()
+    rows = []
+    for n_prompts in args.prompts:
+        work_dir = tempfile.mkdtemp(prefix='llm_eval_bench_')
+        try:
+            n_ratings, timings = bench_size(n_prompts, args, work_dir)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        for stage, seconds in timings.items():
+            rows.append({
+                'Timestamp': stamp, 'Commit': commit, 'Prompts': n_prompts, 'Models': args.models,
+                'Reviewers': args.reviewers, 'Criteria': args.criteria, 'Missing': args.missing,
+                'Ratings': n_ratings, 'Stage': stage, 'Seconds': round(seconds, 4),
+                'Python': platform.python_version(), 'CPUs': os.cpu_count(),
+            })
+
+    if args.imports:
+        # size independent: recorded once per run, with Prompts and Ratings 0
+        for target, (seconds, _) in import_times().items():
+            rows.append({
+                'Timestamp': stamp, 'Commit': commit, 'Prompts': 0, 'Models': args.models,
+                'Reviewers': args.reviewers, 'Criteria': args.criteria, 'Missing': args.missing,
+                'Ratings': 0, 'Stage': f'import {target}', 'Seconds': round(seconds, 4),
+                'Python': platform.python_version(), 'CPUs': os.cpu_count(),
+            })
+
+    results = pd.DataFrame(rows)
+    print(results.pivot(index='Stage', columns='Ratings', values='Seconds').round(2).to_string())
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        results.to_csv(args.out, mode='a', index=False, header=not os.path.exists(args.out))
+        print(f"Results appended to {args.out}")
+
+
+def trend(path):
+    """Seconds per stage and run (commit) for every rating-set configuration in the results file."""
+    results = pd.read_csv(path)
+    results['Run'] = results['Timestamp'].str[:16] + ' ' + results['Commit']
+    config = ['Prompts', 'Models', 'Reviewers', 'Criteria', 'Missing']
+    for key, runs in results.groupby(config):
+        print("\n" + ", ".join(f"{name} {value}" for name, value in zip(config, key)))
+        print(runs.pivot_table(index='Stage', columns='Run', values='Seconds', sort=False).round(2).to_string())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the analysis stages on synthetic rating sets.")
+    parser.add_argument('--prompts', type=int, nargs='+', default=[70, 700, 3500],
+                        help="rating-set sizes, in prompts per model (the study has 70)")
+    parser.add_argument('--models', type=int, default=3)
+    parser.add_argument('--reviewers', type=int, default=3)
+    parser.add_argument('--criteria', type=int, default=4)
+    parser.add_argument('--missing', type=float, default=0.0, help="fraction of ratings left empty")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stages', nargs='+', default=DEFAULT_STAGES,
+                        help="stages to time (their inputs, e.g. load, are timed too)")
+    parser.add_argument('--no-imports', dest='imports', action='store_false',
+                        help="do not time the imports of the library modules")
+    parser.add_argument('--out', default=RESULTS, help="CSV the timings are appended to ('' to skip)")
+    parser.add_argument('--trend', action='store_true', help="print the timings recorded in --out and exit")
+    args = parser.parse_args(argv)
+    if args.models > 3 and 'figure_1' in args.stages:
+        # Figure 1 places the study's three models at fixed offsets
+        print("Skipping figure_1: it draws only ChatGPT, Claude and Gemini.")
+        args.stages = [stage for stage in args.stages if stage != 'figure_1']
+    if args.trend:
+        trend(args.out)
+    else:
+        run_suite(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,59 +2,40 @@
 # LLMs Evaluation - Sensitivity Analysis
 # Michele Danilo Pierri MD PhD
 # 30/03/2024
-# Purpose: Perform leave-one-reviewer-out sensitivity analysis
+# Purpose: Perform leave-k-reviewers-out and leave-one-request-out
+#          (jackknife) sensitivity analysis, also for the ordinal mixed model
 # ------------------------------------------------------------
 
 # Import necessary libraries
 
-import pandas as pd
-from scipy.stats import kruskal
+from llm_eval.data import load_ratings
+from llm_eval.stages import criteria, ordinal, save_tables, sensitivity
+from llm_eval.tensor import load_tensor
 
-# setting di file path and lists for criteria and reviewers
+# setting di file path
 
 file_path = "2_Data.xlsx"
-criteria = ['Accuracy', 'Completeness', 'Clarity', 'Coherence']
-reviewers = ['Reviewer1', 'Reviewer2', 'Reviewer3']
 
-# Concatenate all sheets into a single long dataframe
+# Load all sheets as a single long dataframe (shared cached loader)
 
-dfs = []
-for crit in criteria:
-    df = pd.read_excel(file_path, sheet_name=crit)
-    df['Criterion'] = crit
-    dfs.append(df)
+df_long = load_ratings(file_path, sheets=criteria)
 
-df_all = pd.concat(dfs, ignore_index=True)
+# Leave-k-reviewers-out and jackknife over requests (see llm_eval/stages.py);
+# the scores come from the memory-mapped score tensor, which the parallel
+# workers attach to instead of receiving copies (see llm_eval/tensor.py)
 
-# Melt to long format for scoring fields
+tensor = load_tensor(file_path, sheets=criteria)
+tables = sensitivity(df_long, tensor=tensor)
 
-df_long = df_all.melt(
-    id_vars=["Request", "Model", "Origin", "Diagnosis", "Criterion"],
-    value_vars=reviewers,
-    var_name="Reviewer", value_name="Score"
-)
-df_long['Score'] = pd.to_numeric(df_long['Score'], errors='coerce')
+# Ordinal mixed model refitted leaving out each reviewer and each request
+# (warm-started fits, see llm_eval/ordinal.py); the full-data fit,
+# stat_analysis_ordinal.csv, is written by script 3
+tables["sensitivity_ordinal"] = ordinal(df_long)["sensitivity_ordinal"]
 
-# Perform sensitivity analysis by removing one reviewer at a time
-
-sensitivity_results = []
-
-for reviewer_out in reviewers:
-    df_reduced = df_long[df_long['Reviewer'] != reviewer_out]
-    df_mean = df_reduced.groupby(['Request', 'Model', 'Criterion'])['Score'].mean().reset_index()
-
-    for crit in criteria:
-        subset = df_mean[df_mean['Criterion'] == crit]
-        groups = [subset[subset['Model'] == model]['Score'] for model in subset['Model'].unique()]
-        stat, p = kruskal(*groups)
-        sensitivity_results.append({
-            'Excluded Reviewer': reviewer_out,
-            'Criterion': crit,
-            'Kruskal-Wallis H': round(stat, 3),
-            'p-value': round(p, 4),
-            'Significant (p < 0.05)': p < 0.05
-        })
+# The reruns repeat the tests of script 3 on subsets of the data: their
+# p-values are reported unadjusted (see llm_eval/multiplicity.py)
 
 # Export the results to CSV
-pd.DataFrame(sensitivity_results).to_csv("sensitivity_analysis.csv", index=False)
-print("Sensitivity analysis completed and saved to 'sensitivity_analysis.csv'")
+save_tables(tables)
+print("Sensitivity analysis completed and saved to 'sensitivity_analysis.csv', 'sensitivity_jackknife.csv' "
+      "and 'sensitivity_ordinal.csv'")
@@ -0,0 +1,5 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Shared analysis library
+# Michele Danilo Pierri MD PhD
+# Purpose: Reusable building blocks imported by the numbered scripts
+# ------------------------------------------------------------
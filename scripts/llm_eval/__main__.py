@@ -0,0 +1,52 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Command line
+# Michele Danilo Pierri MD PhD
+# Purpose: One entry point for the library's tools. A subcommand's module
+#          is imported only when that subcommand runs, so listing the
+#          commands or asking one for --help does not load the statistics
+#          and plotting stack.
+# Usage:   python -m llm_eval COMMAND [ARGS ...]   (from scripts/)
+#          python -m llm_eval COMMAND --help
+# ------------------------------------------------------------
+
+import importlib
+import sys
+
+# command -> (module with a main(argv) function, description)
+commands = {
+    "run": ("llm_eval.pipeline", "run the analysis pipeline (scripts 1-8) as a graph of stages"),
+    "monitor": ("llm_eval.monitor", "update the sequential model comparisons with new ratings"),
+    "ingest": ("llm_eval.ingest", "merge the ratings of many evaluation rounds into one table"),
+    "stream": ("llm_eval.streaming", "descriptive statistics of a long ratings file read in chunks"),
+    "longitudinal": ("llm_eval.longitudinal", "compare rounds from their saved score histograms"),
+    "calibration": ("llm_eval.calibration", "update reviewer agreement, severity and drift charts"),
+    "serve": ("llm_eval.service", "serve statistics, tests, kappa and figures over local HTTP"),
+    "synthetic": ("llm_eval.synthetic", "write a synthetic workbook in the 2_Data.xlsx schema"),
+    "profile": ("llm_eval.profiling", "compare the span timings of two profiling traces"),
+}
+
+
+def usage():
+    width = max(len(name) for name in commands)
+    lines = ["usage: python -m llm_eval COMMAND [ARGS ...]", "", "commands:"]
+    lines += [f"  {name:<{width}}  {description}" for name, (_, description) in commands.items()]
+    lines += ["", "python -m llm_eval COMMAND --help shows the arguments of a command."]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return
+    name, args = argv[0], argv[1:]
+    if name not in commands:
+        sys.exit(f"unknown command {name!r}\n\n{usage()}")
+    module = importlib.import_module(commands[name][0])
+    # argparse reports the command as the program name
+    sys.argv[0] = f"python -m llm_eval {name}"
+    module.main(args)
+
+
+if __name__ == "__main__":
+    main()
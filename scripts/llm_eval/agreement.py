@@ -0,0 +1,322 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Inter-rater agreement engine
+# Michele Danilo Pierri MD PhD
+# Purpose: Weighted kappa for every reviewer pair, Kendall's W (classical
+#          and tie corrected), Friedman-based W and ICC variants from one
+#          subjects x reviewers score matrix. All pairwise confusion
+#          matrices are built in a single tensor product of one-hot scores,
+#          so a panel of R reviewers costs one operation instead of
+#          R(R-1)/2 calls to cohen_kappa_score. Bootstrap CIs resample
+#          subjects through multinomial weights on the same arrays.
+# ------------------------------------------------------------
+
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from llm_eval.bootstrap import DEFAULT_CHUNK_SIZE
+from llm_eval.distributions import chi2_sf
+from llm_eval.profiling import profiled
+from llm_eval.ratings import MISSING
+
+KAPPA_WEIGHTS = {"linear": 1, "quadratic": 2}
+ICC_TYPES = ["ICC(1,1)", "ICC(A,1)", "ICC(C,1)", "ICC(1,k)", "ICC(A,k)", "ICC(C,k)"]
+
+
+class RatingPanel:
+    """Complete subjects x reviewers matrix of ordinal scores, with its derived arrays.
+
+    `matrix` is a DataFrame (one column per reviewer, e.g. the pivot used in
+    the reliability analysis) or an array, such as an int8 ScoreTensor
+    slice; rows with missing scores must be dropped beforehand
+    (tensor.complete_rows).
+    """
+
+    def __init__(self, matrix, levels=None):
+        if isinstance(matrix, pd.DataFrame):
+            self.reviewers = [str(col) for col in matrix.columns]
+            scores = matrix.to_numpy(dtype=float)
+        else:
+            scores = np.asarray(matrix)
+            if scores.dtype == np.int8:
+                scores = np.where(scores == MISSING, np.nan, scores)
+            scores = scores.astype(float)
+            self.reviewers = [f"Reviewer{i + 1}" for i in range(scores.shape[1])]
+        if np.isnan(scores).any():
+            raise ValueError("RatingPanel needs a complete matrix; drop rows with missing scores first")
+        self.scores = scores
+        self.levels = np.unique(scores) if levels is None else np.asarray(levels, dtype=float)
+        self.n_subjects, self.n_reviewers = scores.shape
+        self.level_idx = np.searchsorted(self.levels, scores)
+        # one-hot scores [subject, reviewer, level]
+        self.onehot = (self.level_idx[:, :, None] == np.arange(len(self.levels))).astype(float)
+        self.pairs = list(combinations(range(self.n_reviewers), 2))
+        self._first = np.array([i for i, _ in self.pairs], dtype=int)
+        self._second = np.array([j for _, j in self.pairs], dtype=int)
+
+    # ------------------------------
+    # Subject weights
+    # ------------------------------
+    # Every statistic takes optional subject weights w[B, n]: None is the
+    # observed sample, multinomial counts are bootstrap resamples.
+
+    def _weights(self, weights):
+        if weights is None:
+            return np.ones((1, self.n_subjects))
+        return np.atleast_2d(np.asarray(weights, dtype=float))
+
+    # ------------------------------
+    # Weighted kappa
+    # ------------------------------
+
+    def confusion(self, weights=None):
+        """Confusion matrices of every reviewer pair -> [B, pairs, L, L]."""
+        w = self._weights(weights)
+        # [B, R, R, L, L] in one contraction, then the upper-triangle pairs
+        full = np.einsum('bn,nil,njm->bijlm', w, self.onehot, self.onehot, optimize=True)
+        return full[:, self._first, self._second]
+
+    def kappa(self, weights="quadratic", subject_weights=None):
+        """Weighted (or unweighted with weights=None) Cohen's kappa for every pair -> [B, pairs].
+
+        As in sklearn.metrics.cohen_kappa_score, the weight of a disagreement
+        is the distance between category indices among the levels used by the
+        pair (a level neither reviewer used is skipped).
+        """
+        return kappa_from_confusion(self.confusion(subject_weights), weights)
+
+    # ------------------------------
+    # Kendall's W (reviewers rank the subjects)
+    # ------------------------------
+
+    def kendall_w(self, subject_weights=None, tie_correction=True):
+        """Kendall's coefficient of concordance -> [B].
+
+        Subjects are ranked within each reviewer through the level midranks,
+        which makes weighted (resampled) subjects exact: a subject drawn
+        twice counts twice in the ranking.
+        """
+        w = self._weights(subject_weights)
+        m = self.n_reviewers
+        n = w.sum(axis=1)
+        # per reviewer, weighted count of each level -> midrank of each level
+        level_counts = np.einsum('bn,nrl->brl', w, self.onehot)
+        before = np.cumsum(level_counts, axis=-1) - level_counts
+        level_ranks = before + (level_counts + 1) / 2
+        # rank sum of each subject over reviewers
+        rank_sums = np.einsum('brl,nrl->bn', level_ranks, self.onehot)
+        mean = (w * rank_sums).sum(axis=1) / n
+        s = (w * (rank_sums - mean[:, None]) ** 2).sum(axis=1)
+        denominator = m ** 2 * (n ** 3 - n)
+        if tie_correction:
+            denominator = denominator - m * (level_counts ** 3 - level_counts).sum(axis=(1, 2))
+        return 12 * s / denominator
+
+    # ------------------------------
+    # Friedman test (subjects rank the reviewers)
+    # ------------------------------
+
+    def friedman(self, subject_weights=None):
+        """Tie-corrected Friedman Q, p-value and W = Q / (n (k - 1)) -> three [B] arrays.
+
+        Same statistic as pingouin.friedman(method='chisq') with the reviewers
+        as within factor.
+        """
+        w = self._weights(subject_weights)
+        k = self.n_reviewers
+        n = w.sum(axis=1)
+        ranks = pd.DataFrame(self.scores).rank(axis=1).to_numpy()
+        rank_sums = w @ ranks
+        q = 12 / (n * k * (k + 1)) * (rank_sums ** 2).sum(axis=1) - 3 * n * (k + 1)
+        ties = np.array([
+            sum(t ** 3 - t for t in np.unique(row, return_counts=True)[1]) for row in self.scores
+        ], dtype=float)
+        correction = 1 - (w @ ties) / (n * k * (k ** 2 - 1))
+        q = q / correction
+        return q, chi2_sf(q, k - 1), q / (n * (k - 1))
+
+    # ------------------------------
+    # Intraclass correlation (two-way ANOVA on the raw scores)
+    # ------------------------------
+
+    def icc(self, subject_weights=None):
+        """ICC variants -> dict {ICC type: [B]}, named and computed as in pingouin.intraclass_corr.
+
+        ICC(1, .): one-way random; ICC(A, .): two-way absolute agreement;
+        ICC(C, .): two-way consistency; ", k" is the reliability of the mean
+        of the k reviewers.
+        """
+        w = self._weights(subject_weights)
+        k = self.n_reviewers
+        x = self.scores
+        n = w.sum(axis=1)
+        grand = (w @ x.sum(axis=1)) / (n * k)
+        row_means = x.mean(axis=1)
+        col_means = (w @ x) / n[:, None]
+        ss_total = (w * ((x[None] - grand[:, None, None]) ** 2).sum(axis=2)).sum(axis=1)
+        ss_rows = k * (w * (row_means[None] - grand[:, None]) ** 2).sum(axis=1)
+        ss_cols = n * ((col_means - grand[:, None]) ** 2).sum(axis=1)
+        ss_error = ss_total - ss_rows - ss_cols
+        msr = ss_rows / (n - 1)
+        msc = ss_cols / (k - 1)
+        mse = ss_error / ((n - 1) * (k - 1))
+        msw = (ss_total - ss_rows) / (n * (k - 1))
+        return {
+            "ICC(1,1)": (msr - msw) / (msr + (k - 1) * msw),
+            "ICC(A,1)": (msr - mse) / (msr + (k - 1) * mse + k * (msc - mse) / n),
+            "ICC(C,1)": (msr - mse) / (msr + (k - 1) * mse),
+            "ICC(1,k)": (msr - msw) / msr,
+            "ICC(A,k)": (msr - mse) / (msr + (msc - mse) / n),
+            "ICC(C,k)": (msr - mse) / msr,
+        }
+
+    # ------------------------------
+    # All metrics at once
+    # ------------------------------
+
+    def pair_labels(self):
+        return [f"{self.reviewers[i]} vs {self.reviewers[j]}" for i, j in self.pairs]
+
+    def metrics(self, subject_weights=None):
+        """Every agreement metric -> dict {metric name: [B] array}."""
+        q, _, friedman_w = self.friedman(subject_weights)
+        result = {
+            "Kendall's W (classical)": self.kendall_w(subject_weights, tie_correction=False),
+            "Kendall's W (tie-corrected)": self.kendall_w(subject_weights),
+            "Kendall's W (friedman)": friedman_w,
+            **self.icc(subject_weights),
+        }
+        for name, weights in [("Quadratic Kappa", "quadratic"), ("Linear Kappa", "linear")]:
+            values = self.kappa(weights, subject_weights)
+            for p, label in enumerate(self.pair_labels()):
+                result[f"{name}: {label}"] = values[:, p]
+        return result
+
+    @profiled("agreement_bootstrap")
+    def bootstrap(self, n_boot=2000, ci=95, seed=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Percentile bootstrap CIs (subjects resampled) for every metric.
+
+        Returns a DataFrame with Metric, Estimate, CI Lower, CI Upper.
+        """
+        rng = np.random.default_rng(seed)
+        n = self.n_subjects
+        # the kappa contraction holds B x R x R x L x L values at a time
+        per_draw = max(n, self.n_reviewers ** 2 * len(self.levels) ** 2)
+        step = max(1, chunk_size // per_draw)
+        draws = {}
+        for start in range(0, n_boot, step):
+            weights = rng.multinomial(n, np.full(n, 1 / n), size=min(step, n_boot - start))
+            for name, values in self.metrics(weights).items():
+                draws.setdefault(name, []).append(values)
+        alpha = (100 - ci) / 2
+        rows = []
+        for name, estimate in self.metrics().items():
+            values = np.concatenate(draws[name])
+            values = values[np.isfinite(values)]
+            lower, upper = np.percentile(values, [alpha, 100 - alpha]) if len(values) else (np.nan, np.nan)
+            rows.append({"Metric": name, "Estimate": estimate[0], "CI Lower": lower, "CI Upper": upper})
+        return pd.DataFrame(rows)
+
+
+def kappa_from_confusion(observed, weights="quadratic"):
+    """Cohen's kappa of confusion matrices [..., L, L] (see RatingPanel.kappa for the weights)."""
+    observed = np.asarray(observed, dtype=float)
+    n = observed.sum(axis=(-2, -1), keepdims=True)
+    rows = observed.sum(axis=-1)
+    cols = observed.sum(axis=-2)
+    expected = rows[..., :, None] * cols[..., None, :] / n
+    if weights is None:
+        disagreement = 1 - np.eye(observed.shape[-1])
+    else:
+        used = (rows + cols) > 0
+        idx = np.cumsum(used, axis=-1)
+        disagreement = np.abs(idx[..., :, None] - idx[..., None, :]) ** KAPPA_WEIGHTS[weights]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return 1 - (disagreement * observed).sum(axis=(-2, -1)) / (disagreement * expected).sum(axis=(-2, -1))
+
+
+def weighted_kappa(rater1, rater2, weights="quadratic"):
+    """Weighted kappa of two reviewers (drop-in for cohen_kappa_score(..., weights=...))."""
+    return RatingPanel(np.column_stack([rater1, rater2])).kappa(weights)[0, 0]
+
+
+# ------------------------------
+# Kendall's W on sparse panels
+# ------------------------------
+# With complete data the tie-corrected W equals
+#     (sum_j V_j + sum_{j != k} C_jk) / (m sum_j V0_j)
+# where V_j is the variance of reviewer j's midranks, C_jk the covariance of
+# two reviewers' midranks and V0_j the variance without ties (V0_j = V_j for
+# the tie-corrected W). On a sparse panel each reviewer ranks only the
+# subjects they scored (ranks are scaled by n_j + 1 so that reviewers with
+# different workloads are comparable) and C_jk is estimated from the
+# correlation of the two reviewers on the subjects they share. Nothing
+# subject x reviewer is ever materialised densely: the pair sums are
+# products of sparse matrices.
+
+@profiled()
+def sparse_kendall_w(df, subject_col="Subject", reviewer_col="Reviewer", val_col="Score",
+                     tie_correction=True, min_overlap=2):
+    """Kendall's W of long-format ratings where reviewers may skip subjects.
+
+    `df` may also be a subjects x reviewers array (an int8 ScoreTensor
+    slice, or floats with NaN for missing scores).
+    NaN scores are ignored instead of dropping the whole subject. Pairs of
+    reviewers sharing fewer than `min_overlap` subjects (or with constant
+    scores on them) do not contribute to the covariance term, whose mean is
+    weighted by the number of shared subjects. On a complete panel the
+    result equals RatingPanel.kendall_w.
+    """
+    from scipy import sparse
+
+    if not isinstance(df, pd.DataFrame):
+        scores = np.asarray(df)
+        if scores.dtype == np.int8:
+            scores = np.where(scores == MISSING, np.nan, scores)
+        subject, reviewer = np.indices(scores.shape)
+        df = pd.DataFrame({subject_col: subject.ravel(), reviewer_col: reviewer.ravel(),
+                           val_col: scores.ravel().astype(float)})
+    df = df[[subject_col, reviewer_col, val_col]].dropna()
+    if df.duplicated([subject_col, reviewer_col]).any():
+        raise ValueError("each reviewer must score each subject at most once")
+    subject_idx, subjects = pd.factorize(df[subject_col])
+    reviewer_idx, reviewers = pd.factorize(df[reviewer_col])
+    m = len(reviewers)
+    if m < 2:
+        return np.nan
+
+    # midranks of each reviewer over their own subjects, on a 0-1 scale
+    ranks = df.groupby(reviewer_idx)[val_col].rank(method="average").to_numpy()
+    n_j = np.bincount(reviewer_idx, minlength=m).astype(float)
+    u = ranks / (n_j[reviewer_idx] + 1)
+
+    # per-subject variance of each reviewer's scaled ranks, with and without ties
+    mean_j = np.bincount(reviewer_idx, weights=u, minlength=m) / n_j
+    var_j = np.bincount(reviewer_idx, weights=(u - mean_j[reviewer_idx]) ** 2, minlength=m) / n_j
+    if tie_correction:
+        var0_j = var_j
+    else:
+        var0_j = (n_j ** 2 - 1) / 12 / (n_j + 1) ** 2
+
+    # overlap sums for every reviewer pair from sparse products
+    shape = (len(subjects), m)
+    scored = sparse.csr_matrix((np.ones(len(u)), (subject_idx, reviewer_idx)), shape=shape)
+    values = sparse.csr_matrix((u, (subject_idx, reviewer_idx)), shape=shape)
+    squares = sparse.csr_matrix((u ** 2, (subject_idx, reviewer_idx)), shape=shape)
+    n_shared = (scored.T @ scored).toarray()
+    sum_x = (values.T @ scored).toarray()        # [j, k]: sum of u_j over shared subjects
+    sum_xx = (squares.T @ scored).toarray()
+    sum_xy = (values.T @ values).toarray()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = sum_xy / n_shared - sum_x * sum_x.T / n_shared ** 2
+        var_x = sum_xx / n_shared - (sum_x / n_shared) ** 2
+        rho = cov / np.sqrt(var_x * var_x.T)
+
+    off_diagonal = ~np.eye(m, dtype=bool)
+    valid = off_diagonal & (n_shared >= min_overlap) & np.isfinite(rho)
+    if not valid.any():
+        return np.nan
+    cross = rho * np.sqrt(np.outer(var_j, var_j))
+    mean_cross = np.average(cross[valid], weights=n_shared[valid])
+    return (var_j.sum() + m * (m - 1) * mean_cross) / (m * var0_j.sum())
@@ -0,0 +1,369 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Reviewer calibration and drift
+# Michele Danilo Pierri MD PhD
+# Purpose: Follow every reviewer while a rating campaign is running,
+#          whatever the number of reviewers. Each new rating updates, in
+#          O(reviewers of that response):
+#          - the reviewer's 1-5 score histogram per criterion,
+#          - a 5 x 5 confusion matrix with every reviewer who rated the
+#            same response, from which exact agreement, weighted kappa and
+#            the severity offset (mean score difference to the co-raters,
+#            i.e. to the consensus) follow,
+#          - two-sided CUSUM charts of how far each reviewer's scores are
+#            from the pair's usual difference to the co-raters on that
+#            criterion (one value per reviewer and response), standardized
+#            by the reviewer's own baseline, which flag drift and estimate
+#            when it started.
+#          Nothing is recomputed from the full reviewer pivot table.
+# Usage:   python -m llm_eval.calibration STATE RATINGS_FILE [RATINGS_FILE ...]
+#          (the 2_Data.xlsx workbook, or long CSV, Parquet or JSONL files)
+# ------------------------------------------------------------
+
+import os
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+
+from llm_eval.agreement import kappa_from_confusion
+from llm_eval.data import criteria, load_ratings
+from llm_eval.distributions import norm_ppf
+from llm_eval.streaming import iter_chunks, levels
+
+# charted ratings that form a reviewer's baseline
+BASELINE = 100
+# CUSUM reference value and decision interval, in baseline SDs: a shift of
+# one SD is flagged after about 16 comparisons, and in control there are
+# about 10,000 comparisons between false alarms (both directions)
+CUSUM_K = 0.5
+CUSUM_H = 8.0
+# scores are integers: a baseline without any disagreement counts as SD 0.5
+MIN_SD = 0.5
+# comparisons a pair needs on a criterion before its usual difference is
+# trusted and new scores are charted against it
+MIN_PAIR = 20
+# smallest offset (in score points) reported as harsh or lenient
+MIN_OFFSET = 0.25
+
+
+def cusum(start, increments, h):
+    """One-sided CUSUM S_t = max(0, S_t-1 + x_t) from S_0 = start, restarted at 0 after each alarm.
+
+    Returns (final S, alarms, starts, current): alarms are the positions
+    where S exceeded h, starts[k] the first position of the excursion
+    above 0 that ended in alarm k (-1 when it began before these
+    increments), and current the start of the excursion still open at
+    the end (None when S ended at 0).
+    """
+    alarms, starts = [], []
+    pos, began = 0, (-1 if start > 0 else 0)
+    while pos < len(increments):
+        walk = np.cumsum(increments[pos:])
+        # closed form of the recursion: S_t = X_t - min(-S_0, min_{s <= t} X_s)
+        s = walk - np.minimum.accumulate(np.minimum(walk, -start))
+        over = np.flatnonzero(s > h)
+        stop = over[0] if len(over) else len(s)
+        at_zero = np.flatnonzero(s[:stop] == 0)
+        if len(at_zero):
+            began = pos + at_zero[-1] + 1
+        if not len(over):
+            return s[-1], alarms, starts, (began if s[-1] > 0 else None)
+        alarms.append(pos + stop)
+        starts.append(began)
+        start, pos = 0.0, pos + stop + 1
+        began = pos
+    return 0.0, alarms, starts, None
+
+
+class ReviewerCalibration:
+    """Incremental per-reviewer histograms, pairwise agreement and drift charts.
+
+    Reviewers are added as they appear. Ratings already counted (same
+    Criterion, Request, Model and Reviewer) are skipped, so the whole of a
+    growing file can be passed again. Every call to update() is a look.
+    """
+
+    def __init__(self, criteria=criteria, baseline=BASELINE, k=CUSUM_K, h=CUSUM_H, alpha=0.05):
+        self.criteria = list(criteria)
+        self.baseline = baseline
+        self.k = k
+        self.h = h
+        self.alpha = alpha
+        self.reviewers = []
+        self._reviewer_index = {}
+        self.counts = np.zeros((0, len(self.criteria), len(levels)), dtype=np.int64)
+        # confusion[a, b, c, i, j]: responses of criterion c scored level i by a and level j by b
+        self.confusion = np.zeros((0, 0, len(self.criteria), len(levels), len(levels)), dtype=np.int64)
+        # (criterion, Request, Model) -> [(reviewer, level index)]
+        self._responses = {}
+        # (a, b, criterion) with a < b -> [comparisons, sum of score a - score b]
+        self._pair_stats = {}
+        # drift charts, per reviewer: baseline sums, CUSUM sums and alarms
+        self._baseline = []
+        self._charts = []
+        self._charted = []
+        self.alarms = []
+        self.rows = 0
+        self.looks = 0
+
+    def _add_reviewer(self, name):
+        r = len(self.reviewers)
+        self.reviewers.append(name)
+        self._reviewer_index[name] = r
+        self.counts = np.concatenate([self.counts, np.zeros((1,) + self.counts.shape[1:], dtype=np.int64)])
+        grown = np.zeros((r + 1, r + 1) + self.confusion.shape[2:], dtype=np.int64)
+        grown[:r, :r] = self.confusion
+        self.confusion = grown
+        self._baseline.append([0, 0.0, 0.0])
+        self._charts.append(self._new_chart())
+        self._charted.append(0)
+        return r
+
+    # ------------------------------
+    # Updates
+    # ------------------------------
+
+    def update(self, chunk):
+        """Add a batch of long-format ratings (in arrival order); returns the number of new ratings."""
+        scores = pd.to_numeric(chunk["Score"], errors='coerce')
+        chunk = chunk.assign(Score=scores, Request=chunk["Request"].astype(str))[scores.notna()]
+        bad = ~chunk["Score"].isin(levels)
+        if bad.any():
+            raise ValueError(f"non-Likert scores in chunk: {chunk.loc[bad, 'Score'].unique()[:5]}")
+        crit_idx = pd.Index(self.criteria).get_indexer(chunk["Criterion"])
+        if (crit_idx < 0).any():
+            raise ValueError(f"ratings for unknown criteria: {chunk.loc[crit_idx < 0, 'Criterion'].unique()[:5]}")
+        for name in pd.unique(chunk["Reviewer"].astype(str)):
+            if name not in self._reviewer_index:
+                self._add_reviewer(name)
+        reviewer_idx = pd.Index(self.reviewers).get_indexer(chunk["Reviewer"].astype(str))
+        level_idx = np.searchsorted(levels, chunk["Score"].to_numpy())
+
+        new_rows = []
+        pairs = []       # (a, b, criterion, level a, level b), both orientations
+        residuals = [[] for _ in self.reviewers]
+        for c, request, model, r, lvl in zip(crit_idx, chunk["Request"], chunk["Model"].astype(str),
+                                             reviewer_idx, level_idx):
+            raters = self._responses.setdefault((c, request, model), [])
+            if any(other == r for other, _ in raters):
+                continue
+            row = self.rows + len(new_rows) + 1  # 1-based arrival number of the rating
+            charted = []
+            for other, other_lvl in raters:
+                pairs.append((r, other, c, lvl, other_lvl))
+                pairs.append((other, r, c, other_lvl, lvl))
+                gap = levels[lvl] - levels[other_lvl]
+                # usual difference of the pair on this criterion, up to this rating
+                sign = 1 if r < other else -1
+                stats = self._pair_stats.setdefault((min(r, other), max(r, other), c), [0, 0.0])
+                if stats[0] >= MIN_PAIR:
+                    residual = gap - sign * stats[1] / stats[0]
+                    charted.append(residual)
+                    if len(raters) == 1:
+                        # the first rater of the response is charted on the second rating
+                        residuals[other].append((row, -residual))
+                stats[0] += 1
+                stats[1] += sign * gap
+            if charted:
+                # one value per reviewer and response: its comparisons share the reviewer's score
+                residuals[r].append((row, np.mean(charted)))
+            raters.append((r, lvl))
+            new_rows.append((r, c, lvl))
+
+        if new_rows:
+            np.add.at(self.counts, tuple(np.array(new_rows).T), 1)
+        if pairs:
+            np.add.at(self.confusion, tuple(np.array(pairs).T), 1)
+        for r, values in enumerate(residuals):
+            if values:
+                self._charted[r] += len(values)
+                self._chart(r, np.array(values, dtype=float))
+        self.rows += len(new_rows)
+        self.looks += 1
+        return len(new_rows)
+
+    def _chart(self, r, diffs):
+        """Feed a reviewer's new (row, residual) pairs to the baseline, then to the CUSUM charts.
+
+        A residual is a score difference to a co-rater less the pair's usual
+        difference: a new rating gets its residuals averaged over the
+        co-raters, and the first rater of a response its residual to the
+        second.
+
+        After an alarm the reviewer's baseline is collected again from the
+        following comparisons, so a lasting change is reported once and
+        the charts then watch for changes from the new level.
+        """
+        while len(diffs):
+            base = self._baseline[r]
+            take = min(self.baseline - base[0], len(diffs))
+            if take > 0:
+                base[0] += take
+                base[1] += diffs[:take, 1].sum()
+                base[2] += (diffs[:take, 1] ** 2).sum()
+                diffs = diffs[take:]
+            if not len(diffs):
+                return
+            mean = base[1] / base[0]
+            sd = max(np.sqrt(max(base[2] - base[0] * mean ** 2, 0) / (base[0] - 1)), MIN_SD)
+            rows, delta = diffs[:, 0].astype(int), diffs[:, 1]
+            z = (delta - mean) / sd
+            total = np.concatenate([[0.0], np.cumsum(delta)])
+            chart = self._charts[r]
+            charted = {side: cusum(chart[side], increments, self.h)
+                       for side, increments in (("upper", z - self.k), ("lower", -z - self.k))}
+            first = min(((alarms[0], side) for side, (_, alarms, _, _) in charted.items() if alarms), default=None)
+            if first is None:
+                for side, (final, _, _, current) in charted.items():
+                    excursion = chart[side + " excursion"]
+                    if current is None:
+                        excursion = (None, 0, 0.0)
+                    elif current < 0:
+                        excursion = (excursion[0], excursion[1] + len(delta), excursion[2] + total[-1])
+                    else:
+                        excursion = (rows[current], len(delta) - current, total[-1] - total[current])
+                    chart[side], chart[side + " excursion"] = final, excursion
+                chart["n"] += len(delta)
+                return
+            alarm, side = first
+            began = charted[side][2][0]
+            if began < 0:
+                # the excursion began in an earlier batch
+                excursion = chart[side + " excursion"]
+                change, n, shift = excursion[0], excursion[1] + alarm + 1, excursion[2] + total[alarm + 1]
+            else:
+                change, n, shift = rows[began], alarm + 1 - began, total[alarm + 1] - total[began]
+            self.alarms.append({
+                "Reviewer": self.reviewers[r],
+                "Direction": "more lenient" if side == "upper" else "harsher",
+                "Change Row": int(change),
+                "Alarm Row": int(rows[alarm]),
+                "Ratings Charted": chart["n"] + int(alarm) + 1,
+                "Baseline SD": round(sd, 3),
+                "Shift": round((shift / n) - mean, 3),
+            })
+            self._baseline[r] = [0, 0.0, 0.0]
+            self._charts[r] = self._new_chart(chart["n"] + alarm + 1)
+            diffs = diffs[alarm + 1:]
+
+    @staticmethod
+    def _new_chart(n=0):
+        # CUSUM sums, comparisons charted, and the open excursion of each
+        # sum above 0: (first row, ratings, sum of residuals)
+        return {"upper": 0.0, "lower": 0.0, "n": n,
+                "upper excursion": (None, 0, 0.0), "lower excursion": (None, 0, 0.0)}
+
+    # ------------------------------
+    # Reports
+    # ------------------------------
+
+    def _offsets(self, confusion):
+        # score differences to co-raters summarized from confusion[a, b, i, j] (b summed)
+        gap = levels[:, None] - levels[None, :]
+        n = confusion.sum(axis=(1, 2, 3))
+        total = (confusion * gap).sum(axis=(1, 2, 3))
+        squares = (confusion * gap ** 2).sum(axis=(1, 2, 3))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = total / n
+            sd = np.sqrt((squares - n * mean ** 2) / (n - 1))
+        return n, mean, sd / np.sqrt(n)
+
+    def reviewers_table(self):
+        """Per reviewer and criterion (and over all criteria): scores, offset vs co-raters, severity, drift."""
+        z_crit = norm_ppf(1 - self.alpha / 2 / max(len(self.reviewers), 1))
+        # the latest change detected for each reviewer
+        drifting = {alarm["Reviewer"]: alarm for alarm in self.alarms}
+        results = []
+        for c, crit in enumerate(self.criteria + ["All"]):
+            counts = self.counts.sum(axis=1) if crit == "All" else self.counts[:, c]
+            confusion = self.confusion.sum(axis=2) if crit == "All" else self.confusion[:, :, c]
+            n_pairs, offset, se = self._offsets(confusion)
+            for r, name in enumerate(self.reviewers):
+                n = counts[r].sum()
+                mean = counts[r] @ levels / n if n else np.nan
+                severity = ""
+                if n_pairs[r] > 1 and abs(offset[r]) >= MIN_OFFSET and abs(offset[r]) > z_crit * se[r]:
+                    severity = "Harsh" if offset[r] < 0 else "Lenient"
+                alarm = drifting.get(name)
+                results.append({
+                    "Reviewer": name,
+                    "Criterion": crit,
+                    "N": int(n),
+                    "Mean": round(mean, 3),
+                    "Comparisons": int(n_pairs[r]),
+                    "Offset vs Co-raters": round(offset[r], 3),
+                    "SE": round(se[r], 3),
+                    "Severity": severity,
+                    "Charted": self._charted[r],
+                    "Drift": f"{alarm['Direction']} since row {alarm['Change Row']}" if alarm else "",
+                })
+        return pd.DataFrame(results)
+
+    def pairs_table(self):
+        """Running agreement of every reviewer pair that shares responses, per criterion."""
+        results = []
+        by_name = sorted(range(len(self.reviewers)), key=lambda r: self.reviewers[r])
+        for i, a in enumerate(by_name):
+            for b in by_name[i + 1:]:
+                for c, crit in enumerate(self.criteria):
+                    observed = self.confusion[a, b, c]
+                    n = observed.sum()
+                    if not n:
+                        continue
+                    results.append({
+                        "Criterion": crit,
+                        "Reviewer A": self.reviewers[a],
+                        "Reviewer B": self.reviewers[b],
+                        "N": int(n),
+                        "Exact Agreement": round(np.trace(observed) / n, 3),
+                        "Weighted Kappa": round(kappa_from_confusion(observed, "quadratic"), 3),
+                        "Linear Weighted Kappa": round(kappa_from_confusion(observed, "linear"), 3),
+                    })
+        return pd.DataFrame(results)
+
+    def alarms_table(self):
+        columns = ["Reviewer", "Direction", "Change Row", "Alarm Row", "Ratings Charted", "Baseline SD", "Shift"]
+        return pd.DataFrame(self.alarms, columns=columns)
+
+    def report(self):
+        return {
+            "calibration_reviewers": self.reviewers_table(),
+            "calibration_pairs": self.pairs_table(),
+            "calibration_alarms": self.alarms_table(),
+        }
+
+    def save(self, path):
+        with open(path, 'wb') as fh:
+            pickle.dump(self, fh)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as fh:
+            return pickle.load(fh)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 2:
+        sys.exit("usage: python -m llm_eval.calibration STATE RATINGS_FILE [RATINGS_FILE ...]")
+    state, paths = argv[0], argv[1:]
+    calibration = ReviewerCalibration.load(state) if os.path.exists(state) else ReviewerCalibration()
+    added = 0
+    for path in paths:
+        chunks = [load_ratings(path)] if path.endswith(".xlsx") else iter_chunks(path)
+        for chunk in chunks:
+            added += calibration.update(chunk)
+    calibration.save(state)
+    tables = calibration.report()
+    for name, table in tables.items():
+        table.to_csv(f"{name}.csv", index=False)
+    flagged = tables["calibration_reviewers"]
+    flagged = flagged[(flagged["Criterion"] == "All") & ((flagged["Severity"] != "") | (flagged["Drift"] != ""))]
+    print(flagged.to_string(index=False) if len(flagged) else "No reviewer flagged.")
+    print(f"{added} new ratings ({calibration.rows} in total, {len(calibration.reviewers)} reviewers, "
+          f"{len(calibration.alarms)} drift alarms); calibration tables saved to CSV.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Subgroup aggregation cube
+# Michele Danilo Pierri MD PhD
+# Purpose: One pass over the long ratings builds a 1-5 score histogram for
+#          every Model x Criterion x Origin x Diagnosis x Reviewer cell
+#          (dimensions are encoded as categorical codes). Any slice or
+#          roll-up - N, Mean, Median, SD, IQR, Kruskal-Wallis and
+#          Mann-Whitney between subgroups - is then answered by summing
+#          histograms, without going back to the raw rows.
+# ------------------------------------------------------------
+
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from llm_eval.profiling import span
+from llm_eval.rankstats import kruskal_counts, mannwhitney_counts
+from llm_eval.streaming import hist_summary, levels
+
+cube_dims = ["Model", "Criterion", "Origin", "Diagnosis", "Reviewer"]
+ALL = "All"
+
+
+class ScoreCube:
+    """Score histograms over every combination of the dimension levels.
+
+    counts has one axis per dimension (in `dims` order) plus a last axis
+    over the score levels 1-5. With `count_col`, each row stands for that
+    many ratings (e.g. the cells of saved histograms).
+    """
+
+    def __init__(self, df_long, dims=cube_dims, val_col="Score", count_col=None):
+        with span("ScoreCube", rows=len(df_long)):
+            self._build(df_long, dims, val_col, count_col)
+
+    def _build(self, df_long, dims, val_col, count_col=None):
+        self.dims = list(dims)
+        scores = df_long[val_col].to_numpy(dtype=float)
+        keep = ~np.isnan(scores)
+        level_idx = np.searchsorted(levels, scores[keep])
+        if (levels[np.minimum(level_idx, len(levels) - 1)] != scores[keep]).any():
+            raise ValueError(f"scores must be integers in {levels[0]}-{levels[-1]}")
+        codes = []
+        self.labels = {}
+        for dim in self.dims:
+            column = df_long[dim]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                cats = column.cat.categories
+                code = column.cat.codes.to_numpy()
+            else:
+                code, cats = pd.factorize(column, sort=False)
+            self.labels[dim] = list(cats)
+            codes.append(code[keep])
+        shape = [len(self.labels[dim]) for dim in self.dims] + [len(levels)]
+        flat = np.ravel_multi_index(codes + [level_idx], shape)
+        weights = None if count_col is None else df_long[count_col].to_numpy(dtype=float)[keep]
+        counts = np.bincount(flat, weights=weights, minlength=int(np.prod(shape)))
+        self.counts = counts.astype(np.int64).reshape(shape)
+
+    # ------------------------------
+    # Slices and roll-ups
+    # ------------------------------
+
+    def _axis(self, dim):
+        return self.dims.index(dim)
+
+    def select(self, **where):
+        """Histogram array restricted to the given levels (a value or a list per dimension).
+
+        Selected dimensions keep their axis, so a list selection can still be
+        grouped over afterwards.
+        """
+        counts = self.counts
+        for dim, value in where.items():
+            values = value if isinstance(value, (list, tuple)) else [value]
+            idx = [self.labels[dim].index(v) for v in values]
+            counts = np.take(counts, idx, axis=self._axis(dim))
+        return counts
+
+    def histogram(self, by=(), **where):
+        """Histograms rolled up to the `by` dimensions -> (counts[*by, levels], labels per by dim)."""
+        by = list(by)
+        counts = self.select(**where)
+        other = tuple(self._axis(dim) for dim in self.dims if dim not in by)
+        counts = counts.sum(axis=other)
+        # summed axes are gone; reorder the remaining ones to follow `by`
+        remaining = [dim for dim in self.dims if dim in by]
+        counts = np.moveaxis(counts, [remaining.index(dim) for dim in by], range(len(by)))
+        labels = []
+        for dim in by:
+            chosen = where.get(dim, self.labels[dim])
+            labels.append(list(chosen) if isinstance(chosen, (list, tuple)) else [chosen])
+        return counts, labels
+
+    def values(self, **where):
+        """The scores of a slice as a Series (sorted; the histogram is exact for 1-5 data)."""
+        counts = self.select(**where).reshape(-1, len(levels)).sum(axis=0)
+        return pd.Series(np.repeat(levels, counts), name="Score")
+
+    def summary(self, by=(), **where):
+        """N, Mean, Median, SD and IQR for every combination of the `by` dimensions."""
+        counts, labels = self.histogram(by, **where)
+        rows = []
+        for index in np.ndindex(*counts.shape[:-1]):
+            key = {dim: labels[i][j] for i, (dim, j) in enumerate(zip(by, index))}
+            rows.append({**key, **hist_summary(counts[index])})
+        return pd.DataFrame(rows, columns=list(by) + ["N", "Mean", "Median", "SD", "IQR"])
+
+    # ------------------------------
+    # Tests between the levels of one dimension
+    # ------------------------------
+
+    def kruskal(self, between, by=(), **where):
+        """Kruskal-Wallis across the levels of `between`, for every combination of `by`."""
+        counts, labels = self.histogram(list(by) + [between], **where)
+        rows = []
+        for index in np.ndindex(*counts.shape[:-2]):
+            table = counts[index]
+            key = {dim: labels[i][j] for i, (dim, j) in enumerate(zip(by, index))}
+            h, p = kruskal_counts(table) if (table.sum(axis=1) > 0).sum() > 1 else (np.nan, np.nan)
+            rows.append({**key, "Groups": int((table.sum(axis=1) > 0).sum()), "N": int(table.sum()),
+                         "H-statistic": h, "p-value": p})
+        return pd.DataFrame(rows, columns=list(by) + ["Groups", "N", "H-statistic", "p-value"])
+
+    def mannwhitney(self, between, first, second, by=(), **where):
+        """Mann-Whitney U of `first` vs `second` level of `between`, for every combination of `by`."""
+        counts, labels = self.histogram(list(by) + [between], **{between: [first, second], **where})
+        rows = []
+        for index in np.ndindex(*counts.shape[:-2]):
+            c1, c2 = counts[index]
+            key = {dim: labels[i][j] for i, (dim, j) in enumerate(zip(by, index))}
+            u, p = mannwhitney_counts(c1, c2) if c1.sum() and c2.sum() else (np.nan, np.nan)
+            rows.append({**key, f"Mean {first}": hist_summary(c1)["Mean"],
+                         f"Mean {second}": hist_summary(c2)["Mean"], "U statistic": u, "p-value": p})
+        return pd.DataFrame(rows)
+
+    # ------------------------------
+    # Every grouping at once (drill-down tables)
+    # ------------------------------
+
+    def groupings(self, dims=None):
+        dims = self.dims if dims is None else list(dims)
+        for size in range(len(dims) + 1):
+            yield from (list(by) for by in combinations(dims, size))
+
+    def rollup(self):
+        """Summary for every subset of dimensions; rolled-up dimensions are labelled 'All'."""
+        tables = []
+        for by in self.groupings():
+            table = self.summary(by)
+            for dim in self.dims:
+                if dim not in by:
+                    table[dim] = ALL
+            tables.append(table[self.dims + ["N", "Mean", "Median", "SD", "IQR"]])
+        return pd.concat(tables, ignore_index=True)
+
+    def kruskal_rollup(self, between="Model"):
+        """Kruskal-Wallis across `between` for every subset of the other dimensions."""
+        others = [dim for dim in self.dims if dim != between]
+        tables = []
+        for by in self.groupings(others):
+            table = self.kruskal(between, by)
+            for dim in others:
+                if dim not in by:
+                    table[dim] = ALL
+            tables.append(table[others + ["Groups", "N", "H-statistic", "p-value"]])
+        return pd.concat(tables, ignore_index=True)
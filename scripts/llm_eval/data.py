@@ -0,0 +1,150 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Shared data loader
+# Michele Danilo Pierri MD PhD
+# Purpose: Read every criterion sheet of the ratings workbook in one pass,
+#          validate the schema and melt it to the long
+#          Request/Model/Origin/Diagnosis/Criterion/Reviewer/Score table.
+#          The long table is cached as Parquet next to the workbook, one
+#          file per sheet set, invalidated by the workbook's content hash.
+# ------------------------------------------------------------
+
+import hashlib
+import os
+import re
+import shutil
+
+import pandas as pd
+
+from llm_eval.profiling import profiled, span
+
+criteria = ['Accuracy', 'Completeness', 'Clarity', 'Coherence']
+study_models = ['ChatGPT', 'Claude', 'Gemini']
+id_columns = ["Request", "Model", "Origin", "Diagnosis"]
+long_columns = id_columns + ["Criterion", "Reviewer", "Score"]
+score_range = (1, 5)
+
+CACHE_DIR = ".cache"
+
+
+def file_hash(file_path, block_size=1 << 20):
+    """SHA-256 of the file content."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as fh:
+        for block in iter(lambda: fh.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def reviewer_columns(df):
+    return [col for col in df.columns if str(col).startswith("Reviewer")]
+
+
+def validate_sheet(df, sheet):
+    """Raise ValueError if a criterion sheet does not match the expected layout."""
+    missing = [col for col in id_columns if col not in df.columns]
+    if missing:
+        raise ValueError(f"sheet {sheet!r} is missing columns {missing}")
+    if not reviewer_columns(df):
+        raise ValueError(f"sheet {sheet!r} has no Reviewer columns")
+    duplicated = df.duplicated(subset=["Request", "Model"])
+    if duplicated.any():
+        rows = df.loc[duplicated, ["Request", "Model"]].values.tolist()
+        raise ValueError(f"sheet {sheet!r} has duplicated Request/Model rows: {rows[:5]}")
+
+
+def melt_sheet(df, crit):
+    """Long rows of one criterion sheet (validated)."""
+    validate_sheet(df, crit)
+    return df.assign(Criterion=crit).melt(
+        id_vars=id_columns + ["Criterion"],
+        value_vars=reviewer_columns(df),
+        var_name="Reviewer", value_name="Score"
+    )
+
+
+def normalize(df_long, file_path):
+    """Cast the id columns to str and the scores to numbers, checking the score range."""
+    # Request ids mix integers and strings such as '1_12' across sheets
+    df_long['Request'] = df_long['Request'].astype(str)
+    for col in ["Model", "Origin", "Diagnosis", "Criterion", "Reviewer"]:
+        df_long[col] = df_long[col].astype(str)
+    df_long['Score'] = pd.to_numeric(df_long['Score'], errors='coerce')
+
+    low, high = score_range
+    out_of_range = df_long['Score'].notna() & ~df_long['Score'].between(low, high)
+    if out_of_range.any():
+        raise ValueError(
+            f"{file_path}: {out_of_range.sum()} scores outside {low}-{high}, e.g. "
+            f"{df_long.loc[out_of_range, long_columns].head(3).to_dict('records')}"
+        )
+    return df_long[long_columns]
+
+
+def parse_workbook(file_path, sheets=None):
+    """Parse the workbook once (all sheets) and return the long table."""
+    sheets = criteria if sheets is None else sheets
+    with span("read_excel"):
+        book = pd.read_excel(file_path, sheet_name=sheets)
+
+    with span("melt") as melt_span:
+        df_long = pd.concat([melt_sheet(book[crit], crit) for crit in sheets], ignore_index=True)
+        melt_span.set(rows=len(df_long))
+    return normalize(df_long, file_path)
+
+
+def cache_path(file_path, digest, sheets=None, ext="parquet"):
+    """Cache file for a workbook's content digest, named after the workbook and the sheet set."""
+    folder, name = os.path.split(os.path.abspath(file_path))
+    stem = os.path.splitext(name)[0]
+    tag = "all" if sheets is None else "s" + hashlib.sha256(",".join(sheets).encode()).hexdigest()[:8]
+    return os.path.join(folder, CACHE_DIR, f"{stem}-{tag}-{digest[:16]}.{ext}")
+
+
+def remove_stale(path):
+    """Delete caches of earlier versions of the same workbook and sheet set as `path`."""
+    folder, name = os.path.split(path)
+    prefix, ext = name.rsplit("-", 1)[0], os.path.splitext(name)[1]
+    # exact match: the caches of 2_Data-round2.xlsx are not those of 2_Data.xlsx
+    earlier = re.compile(rf"^{re.escape(prefix)}-[0-9a-f]{{16}}{re.escape(ext)}$")
+    for old in os.listdir(folder):
+        if old != name and earlier.match(old):
+            old = os.path.join(folder, old)
+            if os.path.isdir(old):
+                shutil.rmtree(old, ignore_errors=True)
+            else:
+                os.remove(old)
+
+
+@profiled()
+def load_ratings(file_path="2_Data.xlsx", sheets=None, use_cache=True):
+    """Long ratings table for the workbook, served from the Parquet cache when fresh."""
+    if not use_cache:
+        return parse_workbook(file_path, sheets)
+
+    path = cache_path(file_path, file_hash(file_path), sheets)
+    if os.path.exists(path):
+        with span("read_parquet") as cache_span:
+            df_long = pd.read_parquet(path)
+            cache_span.set(rows=len(df_long))
+        return df_long
+
+    df_long = parse_workbook(file_path, sheets)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        remove_stale(path)
+        df_long.to_parquet(path, index=False)
+    except (ImportError, OSError) as exc:
+        print(f"Ratings cache not written ({exc}); continuing without it.")
+    return df_long
+
+
+def to_wide(df_long):
+    """One row per rated response with one column per reviewer (sheet layout)."""
+    wide = (df_long
+            .set_index(id_columns + ["Criterion", "Reviewer"])['Score']
+            .unstack("Reviewer")
+            .reset_index())
+    wide.columns.name = None
+    order = {crit: i for i, crit in enumerate(pd.unique(df_long['Criterion']))}
+    return (wide.sort_values("Criterion", key=lambda c: c.map(order), kind="stable")
+                .reset_index(drop=True))
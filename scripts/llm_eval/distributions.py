@@ -0,0 +1,29 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Normal and chi-square tail functions
+# Michele Danilo Pierri MD PhD
+# Purpose: The few distribution functions the tests need, straight from
+#          scipy.special (the same routines scipy.stats.norm and
+#          scipy.stats.chi2 call, so results are identical). Importing
+#          scipy.stats costs about a second at startup; scipy.special is
+#          a fraction of that.
+# ------------------------------------------------------------
+
+import numpy as np
+from scipy.special import chdtrc, ndtr, ndtri
+
+
+def norm_cdf(x):
+    return ndtr(x)
+
+
+def norm_sf(x):
+    return ndtr(-np.asarray(x, dtype=float))
+
+
+def norm_ppf(q):
+    return ndtri(q)
+
+
+def chi2_sf(x, df):
+    """Upper tail of the chi-square distribution (1 for x <= 0, like scipy.stats.chi2.sf)."""
+    return chdtrc(df, np.maximum(x, 0))
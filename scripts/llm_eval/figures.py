@@ -0,0 +1,246 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Figures
+# Michele Danilo Pierri MD PhD
+# Purpose: Figures 1-4 as functions drawing from in-memory data:
+#          the long ratings table (Figures 1, 3, 4) and the Dunn post-hoc
+#          table produced by the statistical analysis (Figure 2).
+#          The per-response reviewer Mean/SD summary (row_summary) is
+#          shared by Figures 1, 3 and 4; the pipeline computes it once and
+#          draws each figure with render_figure in its own stage.
+#          Figures are drawn in parallel only as pipeline stages
+#          (run_pipeline.py); render_figure and the figure_N functions
+#          draw one figure in the calling process.
+# ------------------------------------------------------------
+
+import os
+
+import matplotlib
+matplotlib.use("Agg")  # non-interactive: figures are only written to files
+import matplotlib.pyplot as plt
+from matplotlib import image as mpl_image
+import pandas as pd
+import seaborn as sns
+
+from llm_eval.data import criteria, to_wide
+from llm_eval.profiling import span
+from llm_eval.store import ResultStore, STORE_DIR
+
+formats = ("png", "pdf", "tiff")
+RASTER_DPI = 600
+
+
+def save_figure(out_dir, stem):
+    # Save the figure in all required formats: the PDF is vector, PNG and
+    # TIFF are encoded from a single 600 dpi rasterization (savefig would
+    # redraw the whole figure for each of them)
+    fig = plt.gcf()
+    with span("save_pdf"):
+        fig.savefig(os.path.join(out_dir, f"{stem}.pdf"), format='pdf')
+    with span("rasterize"):
+        fig.set_dpi(RASTER_DPI)
+        fig.canvas.draw()
+        pixels = fig.canvas.buffer_rgba()
+    for ext in ("png", "tiff"):
+        with span(f"encode_{ext}"):
+            mpl_image.imsave(os.path.join(out_dir, f"{stem}.{ext}"), pixels, format=ext,
+                             origin="upper", dpi=RASTER_DPI)
+    plt.close(fig)
+
+
+def draw_and_save(draw, data, out_dir, stem):
+    # rcParams changed by a figure (seaborn style, Figure 2's dpi and sizes)
+    # are restored afterwards, so figures drawn in the same process do not
+    # affect each other
+    with plt.rc_context():
+        with span("draw"):
+            draw(data)
+        save_figure(out_dir, stem)
+
+
+def _render_cached(name, stem, data, draw, out_dir, cache_dir):
+    # Redraw only when the plotted summary changed (see llm_eval/store.py)
+    os.makedirs(out_dir, exist_ok=True)
+    store = ResultStore(cache_dir)
+    outputs = [os.path.join(out_dir, f"{stem}.{ext}") for ext in formats]
+    store.render(name, data, outputs, lambda: draw_and_save(draw, data, out_dir, stem))
+    store.report()
+    return outputs
+
+
+def row_summary(df_long):
+    """Per-response reviewer Mean and SD, in the layout of the criterion sheets."""
+    plot_data = to_wide(df_long)
+    reviewer_cols = [col for col in plot_data.columns if str(col).startswith("Reviewer")]
+    plot_data['Mean'] = plot_data[reviewer_cols].mean(axis=1)
+    plot_data['SD'] = plot_data[reviewer_cols].std(axis=1)
+    return plot_data
+
+
+# ------------------------------
+# Figure 1 - mean score per model with error bars for each criterion
+# ------------------------------
+
+def figure_1_data(summary):
+    grouped = summary.groupby(['Criterion', 'Model'], sort=False).agg({'Mean': 'mean', 'SD': 'mean'}).reset_index()
+    return grouped[['Model', 'Mean', 'SD', 'Criterion']]
+
+
+def draw_figure_1(df_plot):
+    plt.figure(figsize=(8, 6))
+    sns.set(style="whitegrid", font_scale=1.2)
+    sns.barplot(data=df_plot, x='Criterion', y='Mean', hue='Model',
+                errorbar=None, palette=['#000000', '#555555', '#AAAAAA'], edgecolor='black')
+
+    # Add error bars manually
+    model_offsets = {'ChatGPT': -0.25, 'Claude': 0.0, 'Gemini': 0.25}
+
+    for i, row in df_plot.iterrows():
+        x_base = criteria.index(row['Criterion'])
+        x = x_base + model_offsets[row['Model']]
+        plt.errorbar(x, row['Mean'], yerr=row['SD'], fmt='none',
+                     ecolor='black', capsize=3, linewidth=1)
+
+    plt.ylim(0.5, 5.2)
+    plt.ylabel("Mean Score (± SD)")
+    plt.legend(title="Model")
+    plt.tight_layout()
+
+
+def figure_1(df_long, out_dir=".", cache_dir=STORE_DIR):
+    return render_figure("figure_1", figure_1_data(row_summary(df_long)), out_dir, cache_dir)
+
+
+# ------------------------------
+# Figure 2 - Dunn's test p-values heatmap
+# ------------------------------
+
+def figure_2_data(dunn_df):
+    dunn_df = dunn_df.assign(Comparison=dunn_df['Model A'] + " vs " + dunn_df['Model B'])
+    heatmap_data = dunn_df.pivot(index='Criterion', columns='Comparison',
+                                values='p-Bonferroni (within criterion)')
+    order = [c for c in criteria if c in heatmap_data.index]
+    return heatmap_data.loc[order, pd.unique(dunn_df['Comparison'])].astype(float)
+
+
+def draw_figure_2(heatmap_data):
+    # Set plotting style
+    sns.set(style="whitegrid", font_scale=1.2)
+    plt.rcParams.update({
+        "figure.dpi": 300,
+        "savefig.dpi": 600,
+        "axes.titlesize": "large",
+        "axes.labelsize": "medium",
+        "xtick.labelsize": "small",
+        "ytick.labelsize": "small",
+        "legend.fontsize": "small",
+        "figure.figsize": (8, 4),
+        "axes.prop_cycle": plt.cycler(color=["#000000", "#555555", "#AAAAAA"])
+    })
+
+    plt.figure(figsize=(8, 4))
+    sns.heatmap(heatmap_data, annot=True, fmt=".4f", cmap="Greys", cbar_kws={'label': 'p-value'},
+                linewidths=0.5, linecolor='black')
+
+    plt.xlabel("Model Pair")
+    plt.ylabel("Evaluation Criterion")
+    plt.tight_layout()
+
+
+def figure_2(dunn_df, out_dir=".", cache_dir=STORE_DIR):
+    return render_figure("figure_2", figure_2_data(dunn_df), out_dir, cache_dir)
+
+
+# ------------------------------
+# Figures 3 and 4 - differences in diagnostic phase and in user profile
+# ------------------------------
+
+def subgroup_data(summary, by):
+    # Compute means and SD of the per-response means per (subgroup, Criterion)
+    summary = summary.groupby([by, 'Criterion'])['Mean'].agg(['mean', 'std']).reset_index()
+    summary.columns = [by, 'Criterion', 'Mean', 'SD']
+    return summary
+
+
+def draw_figure_3(summary):
+    plt.figure(figsize=(10, 6))
+    sns.set(style="whitegrid", font_scale=1.2)
+
+    ax = sns.barplot(
+        data=summary,
+        x='Criterion',
+        y='Mean',
+        hue='Diagnosis',
+        palette='Greys',
+        errorbar=None,
+        edgecolor='black'
+    )
+
+    # Add error bars
+    for bar, (_, row) in zip(ax.patches, summary.iterrows()):
+        x = bar.get_x() + bar.get_width() / 2
+        y = row['Mean']
+        err = row['SD']
+        if pd.notnull(err):
+            plt.errorbar(x, y, yerr=err, fmt='none', ecolor='black', capsize=3, linewidth=1)
+
+    plt.ylim(0.5, 5.2)
+    plt.ylabel("Mean Score (± SD)")
+    plt.xlabel("Evaluation Criterion")
+    plt.legend(title="Diagnostic Phase")
+    plt.tight_layout()
+
+
+def figure_3(df_long, out_dir=".", cache_dir=STORE_DIR):
+    return render_figure("figure_3", subgroup_data(row_summary(df_long), 'Diagnosis'), out_dir, cache_dir)
+
+
+def draw_figure_4(summary):
+    plt.figure(figsize=(10, 6))
+    sns.set(style="whitegrid", font_scale=1.2)
+
+    ax = sns.barplot(data=summary, x='Criterion', y='Mean', hue='Origin',
+                     palette='Greys', errorbar=None, edgecolor='black')
+
+    # Add error bars
+    for i, row in summary.iterrows():
+        x = i % 4 + (-0.2 if row['Origin'] == 'Patient' else 0.2)
+        plt.errorbar(x, row['Mean'], yerr=row['SD'], fmt='none',
+                     ecolor='black', capsize=3, linewidth=1)
+
+    plt.ylim(0.5, 5.2)
+    plt.ylabel("Mean Score (± SD)")
+    plt.xlabel("Evaluation Criterion")
+    plt.legend(title="User Type")
+    plt.tight_layout()
+
+
+def figure_4(df_long, out_dir=".", cache_dir=STORE_DIR):
+    return render_figure("figure_4", subgroup_data(row_summary(df_long), 'Origin'), out_dir, cache_dir)
+
+
+# ------------------------------
+# All figures from one shared summary
+# ------------------------------
+
+# figure -> (store name, file stem, draw function)
+FIGURES = {
+    "figure_1": ("Figure1", "Figure1", draw_figure_1),
+    "figure_2": ("Figure2", "Figure2", draw_figure_2),
+    "figure_3": ("Figure3", "Figure_DiagnosticPhase_wErrorBars", draw_figure_3),
+    "figure_4": ("Figure4", "Figure_UserType", draw_figure_4),
+}
+
+
+def render_figure(name, data, out_dir=".", cache_dir=STORE_DIR):
+    """Draw one of FIGURES from its prepared plot data."""
+    store_name, stem, draw = FIGURES[name]
+    with span(store_name):
+        return _render_cached(store_name, stem, data, draw, out_dir, cache_dir)
+
+
+def summary_data(name, summary):
+    """Plot data of a ratings figure (1, 3 or 4) from the shared row summary."""
+    if name == "figure_1":
+        return figure_1_data(summary)
+    by = {"figure_3": 'Diagnosis', "figure_4": 'Origin'}[name]
+    return subgroup_data(summary, by)
@@ -0,0 +1,183 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Multi-workbook ingestion
+# Michele Danilo Pierri MD PhD
+# Purpose: Read many evaluation rounds at once. Workbooks are found from
+#          directories or glob patterns; ratings workbooks (one sheet per
+#          criterion, like 2_Data.xlsx) and pilot workbooks (one row per
+#          question, reviewer and model, like 1_Pilot.xlsx) are both
+#          accepted. Workbooks are parsed in parallel worker processes, each
+#          workbook's long table is cached as Parquet under its content
+#          hash (so only new or changed files are parsed again), and the
+#          rows are tagged with their Round (file name) and Source (kind
+#          of workbook) before being merged into one long table.
+# Usage:   python -m llm_eval.ingest SOURCE [SOURCE ...] [--out rounds.parquet]
+#          (SOURCE is a directory or a glob pattern such as 'rounds/*.xlsx')
+# ------------------------------------------------------------
+
+import glob
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from llm_eval.data import CACHE_DIR, criteria, file_hash, id_columns, long_columns, melt_sheet, normalize
+from llm_eval.profiling import profiled, span
+
+INGEST_CACHE = "ingest"
+round_columns = ["Round", "Source"] + long_columns
+
+# pilot sheet column -> long table column
+pilot_columns = {"Question": "Request", "Valutatore": "Reviewer"}
+
+
+def find_workbooks(sources):
+    """Sorted .xlsx paths of the given directories, glob patterns or files (Excel lock files skipped)."""
+    if isinstance(sources, str):
+        sources = [sources]
+    paths = set()
+    for source in sources:
+        if os.path.isdir(source):
+            matches = glob.glob(os.path.join(source, "*.xlsx"))
+        else:
+            matches = glob.glob(source)
+            if not matches and not glob.has_magic(source):
+                raise FileNotFoundError(source)
+        paths.update(os.path.abspath(path) for path in matches if not os.path.basename(path).startswith("~$"))
+    return sorted(paths)
+
+
+def melt_pilot(df, sheet):
+    """Long rows of a pilot sheet (one row per question, reviewer and model, one column per criterion)."""
+    missing = [col for col in list(pilot_columns) + ["Model", "Origin", "Diagnosis"] if col not in df.columns]
+    if missing:
+        raise ValueError(f"sheet {sheet!r} is missing columns {missing}")
+    df = df.rename(columns=pilot_columns)
+    return df.melt(id_vars=id_columns + ["Reviewer"], value_vars=criteria,
+                   var_name="Criterion", value_name="Score")
+
+
+def read_workbook(file_path):
+    """('ratings' or 'pilot', long table) of a workbook, told apart by its sheet names and columns.
+
+    The workbook is opened once and all the sheets needed are read from
+    it (each read_excel call on a path would parse the whole file again).
+    """
+    with pd.ExcelFile(file_path) as book:
+        if all(crit in book.sheet_names for crit in criteria):
+            sheets = pd.read_excel(book, sheet_name=list(criteria))
+            return "ratings", pd.concat([melt_sheet(sheets[crit], crit) for crit in criteria], ignore_index=True)
+        for name, df in pd.read_excel(book, sheet_name=None).items():
+            if set(pilot_columns).issubset(df.columns) and all(crit in df.columns for crit in criteria):
+                return "pilot", melt_pilot(df, name)
+    raise ValueError(f"{file_path}: neither criterion sheets {criteria} nor a pilot sheet "
+                     f"with columns {list(pilot_columns)} and the criteria")
+
+
+def _parse_workbook(file_path):
+    kind, df = read_workbook(file_path)
+    df_long = normalize(df, file_path)
+    df_long["Source"] = kind
+    return df_long
+
+
+def _map(func, tasks, workers):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(tasks) <= 1:
+        return list(map(func, tasks))
+    with ProcessPoolExecutor(min(workers, len(tasks))) as pool:
+        return list(pool.map(func, tasks))
+
+
+def ingest_cache_path(file_path, digest):
+    folder, name = os.path.split(os.path.abspath(file_path))
+    stem = os.path.splitext(name)[0]
+    return os.path.join(folder, CACHE_DIR, INGEST_CACHE, f"{stem}-{digest[:16]}.parquet")
+
+
+def _write_cache(path, df_long):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        stem = os.path.basename(path).rsplit("-", 1)[0]
+        # drop caches of earlier versions of the same workbook (and not of
+        # round-2.xlsx when caching round.xlsx)
+        earlier = re.compile(rf"^{re.escape(stem)}-[0-9a-f]{{16}}\.parquet$")
+        for old in os.listdir(os.path.dirname(path)):
+            if earlier.match(old):
+                os.remove(os.path.join(os.path.dirname(path), old))
+        df_long.to_parquet(path, index=False)
+    except (ImportError, OSError) as exc:
+        print(f"Ingestion cache not written for {path} ({exc}); continuing without it.")
+
+
+@profiled()
+def ingest(sources, workers=None, use_cache=True):
+    """Long ratings table of every workbook in `sources`, with Round and Source columns.
+
+    Workbooks whose content hash has a cached table are read from the
+    cache; all the others are parsed in one pool of `workers` processes,
+    one workbook per task (serial with workers=1). A workbook takes about
+    half a second to parse and the pool costs little next to that (see
+    benchmarks/bench_ingest.py), so by default there is one process per
+    CPU, up to the number of workbooks to parse.
+    """
+    paths = find_workbooks(sources)
+    if not paths:
+        raise FileNotFoundError(f"no .xlsx workbooks found in {sources}")
+
+    parsed, pending = {}, {}
+    with span("cache", workbooks=len(paths)) as cache_span:
+        for path in paths:
+            cache = ingest_cache_path(path, file_hash(path))
+            if use_cache and os.path.exists(cache):
+                parsed[path] = pd.read_parquet(cache)
+            else:
+                pending[path] = cache
+        cache_span.set(hits=len(parsed))
+
+    # one task per workbook: its sheets are read from a single parse of the file
+    with span("parse", workbooks=len(pending)):
+        frames = _map(_parse_workbook, list(pending), workers)
+    for (path, cache), df_long in zip(pending.items(), frames):
+        if use_cache:
+            _write_cache(cache, df_long)
+        parsed[path] = df_long
+
+    with span("merge") as merge_span:
+        merged = pd.concat(
+            [parsed[path].assign(Round=os.path.splitext(os.path.basename(path))[0]) for path in paths],
+            ignore_index=True,
+        )[round_columns]
+        merge_span.set(rows=len(merged))
+    return merged
+
+
+def write_dataset(df, path):
+    """Write the merged table as Parquet (or CSV for a .csv path)."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if path.endswith(".csv"):
+        df.to_csv(path, index=False)
+    else:
+        df.to_parquet(path, index=False)
+    return path
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Merge the ratings of many evaluation rounds into one table.")
+    parser.add_argument("sources", nargs="+", help="directories or glob patterns of .xlsx workbooks")
+    parser.add_argument("--out", default="rounds.parquet", help="output .parquet (or .csv) path")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: all CPUs)")
+    args = parser.parse_args(argv)
+
+    df = ingest(args.sources, workers=args.workers)
+    write_dataset(df, args.out)
+    summary = df.groupby(["Round", "Source"], sort=False).size().rename("Ratings").reset_index()
+    print(summary.to_string(index=False))
+    print(f"{len(df)} ratings from {len(summary)} workbooks saved to {args.out}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Longitudinal comparison across rounds
+# Michele Danilo Pierri MD PhD
+# Purpose: Each evaluation round is reduced once to its sufficient
+#          statistics: the 1-5 score histogram of every Model x Criterion
+#          x Origin x Diagnosis x Reviewer cell (see llm_eval/cube.py),
+#          stored as a small Parquet table of non-empty cells. Round-over-
+#          round deltas (Mann-Whitney U and a bootstrap CI of the change
+#          in mean), Jonckheere-Terpstra trend tests across all rounds and
+#          reviewer calibration are then computed from the histograms,
+#          without reading the raw ratings again.
+# Usage:   python -m llm_eval.longitudinal SUMMARIES [--add SOURCE ...]
+#          (SOURCE is a workbook, directory or glob, see llm_eval/ingest.py)
+# ------------------------------------------------------------
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from llm_eval.bootstrap import bootstrap_ci
+from llm_eval.cube import ScoreCube, cube_dims
+from llm_eval.rankstats import jonckheere_counts, mannwhitney_counts
+from llm_eval.streaming import hist_summary, levels
+
+cell_columns = ["Round"] + cube_dims + ["Score", "Count"]
+
+
+def round_cells(df_long, name):
+    """Non-empty histogram cells of one round's long ratings table."""
+    cube = ScoreCube(df_long)
+    index = np.nonzero(cube.counts)
+    cells = pd.DataFrame({dim: np.asarray(cube.labels[dim], dtype=object)[index[i]]
+                          for i, dim in enumerate(cube.dims)})
+    cells.insert(0, "Round", name)
+    cells["Score"] = levels[index[-1]]
+    cells["Count"] = cube.counts[index]
+    return cells[cell_columns]
+
+
+class RoundHistory:
+    """Per-round score histograms, in chronological (insertion) order."""
+
+    def __init__(self, cells=None):
+        self.cells = pd.DataFrame(columns=cell_columns) if cells is None else cells[cell_columns]
+        self._cube = None
+
+    @property
+    def rounds(self):
+        return list(pd.unique(self.cells["Round"]))
+
+    def add(self, name, df_long):
+        """Summarize a round (replacing an earlier summary with the same name, which keeps its place)."""
+        cells = round_cells(df_long, name)
+        if name in self.rounds:
+            at = self.rounds.index(name)
+            before = self.cells[self.cells["Round"].isin(self.rounds[:at])]
+            after = self.cells[self.cells["Round"].isin(self.rounds[at + 1:])]
+            parts = [before, cells, after]
+        else:
+            parts = [self.cells, cells]
+        self.cells = pd.concat([part for part in parts if len(part)], ignore_index=True)
+        self._cube = None
+        return self
+
+    @classmethod
+    def from_long(cls, df_rounds):
+        """History of a merged table with a Round column (llm_eval.ingest), rounds in order of appearance."""
+        history = cls()
+        for name, df_long in df_rounds.groupby("Round", sort=False):
+            history.add(name, df_long)
+        return history
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.cells.to_parquet(path, index=False)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        return cls(pd.read_parquet(path))
+
+    @property
+    def cube(self):
+        """ScoreCube with a leading Round dimension, built from the saved cells."""
+        if self._cube is None:
+            cells = self.cells.astype({"Round": pd.CategoricalDtype(self.rounds)})
+            self._cube = ScoreCube(cells, dims=["Round"] + cube_dims, count_col="Count")
+        return self._cube
+
+    # ------------------------------
+    # Queries
+    # ------------------------------
+
+    def summary(self, by=("Round", "Model", "Criterion"), **where):
+        """N, Mean, Median, SD and IQR per round (and `by` cell)."""
+        return self.cube.summary(by, **where)
+
+    def deltas(self, by=("Model", "Criterion"), pairs=None, n_boot=10000, ci=95, seed=0, **where):
+        """Change from one round to another for every `by` cell.
+
+        pairs defaults to consecutive rounds. Mann-Whitney U compares the
+        score distributions, and the CI is a percentile bootstrap of the
+        change in mean (later minus earlier round).
+        """
+        rounds = self.rounds
+        pairs = list(zip(rounds[:-1], rounds[1:])) if pairs is None else list(pairs)
+        counts, labels = self.cube.histogram(list(by) + ["Round"], **where)
+        rng = np.random.default_rng(seed)
+        rows = []
+        for first, second in pairs:
+            i, j = rounds.index(first), rounds.index(second)
+            for index in np.ndindex(*counts.shape[:-2]):
+                c1, c2 = counts[index][i], counts[index][j]
+                key = {dim: labels[k][m] for k, (dim, m) in enumerate(zip(by, index))}
+                row = {"From": first, "To": second, **key, "N From": int(c1.sum()), "N To": int(c2.sum()),
+                       "Mean From": hist_summary(c1)["Mean"], "Mean To": hist_summary(c2)["Mean"]}
+                if c1.sum() and c2.sum():
+                    _, lower, upper = bootstrap_ci(np.repeat(levels, c2), np.repeat(levels, c1),
+                                                   n_boot=n_boot, ci=ci, seed=rng)
+                    u, p = mannwhitney_counts(c1, c2)
+                else:
+                    lower = upper = u = p = np.nan
+                rows.append({**row, "Δ Mean": row["Mean To"] - row["Mean From"],
+                             f"{ci}% CI Lower": lower, f"{ci}% CI Upper": upper,
+                             "U statistic": u, "p-value": p})
+        return pd.DataFrame(rows)
+
+    def trend(self, by=("Model", "Criterion"), **where):
+        """Jonckheere-Terpstra test of a monotonic trend in scores across the rounds, per `by` cell."""
+        counts, labels = self.cube.histogram(list(by) + ["Round"], **where)
+        rows = []
+        for index in np.ndindex(*counts.shape[:-2]):
+            table = counts[index]
+            rated = table.sum(axis=1) > 0
+            key = {dim: labels[k][m] for k, (dim, m) in enumerate(zip(by, index))}
+            means = [hist_summary(c)["Mean"] for c in table[rated]]
+            jt, z, p = jonckheere_counts(table[rated]) if rated.sum() > 1 else (np.nan, np.nan, np.nan)
+            rows.append({**key, "Rounds": int(rated.sum()), "N": int(table.sum()),
+                         "First Mean": means[0] if means else np.nan,
+                         "Last Mean": means[-1] if means else np.nan,
+                         "JT statistic": jt, "z": z, "p-value": p})
+        return pd.DataFrame(rows)
+
+    def calibration(self, **where):
+        """Per round and criterion, each reviewer's mean score and its offset from the round's mean."""
+        counts, labels = self.cube.histogram(["Round", "Criterion", "Reviewer"], **where)
+        rows = []
+        for r, c in np.ndindex(*counts.shape[:2]):
+            overall = hist_summary(counts[r, c].sum(axis=0))
+            for v, reviewer in enumerate(labels[2]):
+                stats = hist_summary(counts[r, c, v])
+                if not stats["N"]:
+                    continue
+                rows.append({"Round": labels[0][r], "Criterion": labels[1][c], "Reviewer": reviewer,
+                             "N": stats["N"], "Mean": stats["Mean"], "SD": stats["SD"],
+                             "Offset": stats["Mean"] - overall["Mean"]})
+        return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare the evaluation rounds from their saved score histograms.")
+    parser.add_argument("summaries", help="Parquet file of round histograms (created if missing)")
+    parser.add_argument("--add", nargs="+", default=[], metavar="SOURCE",
+                        help="workbooks, directories or globs to summarize (one round per workbook)")
+    parser.add_argument("--n-boot", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    history = RoundHistory.load(args.summaries) if os.path.exists(args.summaries) else RoundHistory()
+    if args.add:
+        from llm_eval.ingest import ingest
+
+        for name, df_long in ingest(args.add).groupby("Round", sort=False):
+            history.add(name, df_long)
+        history.save(args.summaries)
+    if len(history.rounds) < 2:
+        raise SystemExit(f"{args.summaries}: {len(history.rounds)} round(s); at least two are needed")
+
+    tables = {
+        "longitudinal_deltas": history.deltas(n_boot=args.n_boot).round(4),
+        "longitudinal_trend": history.trend().round(4),
+        "longitudinal_calibration": history.calibration().round(4),
+    }
+    for name, table in tables.items():
+        table.to_csv(f"{name}.csv", index=False)
+    print(tables["longitudinal_trend"].to_string(index=False))
+    print(f"{len(history.rounds)} rounds ({len(history.cells)} histogram cells); "
+          f"deltas, trends and reviewer calibration saved to CSV.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Sequential monitoring
+# Michele Danilo Pierri MD PhD
+# Purpose: Follow the Model comparisons while reviewer ratings are still
+#          being collected. New rating rows update a 1-5 score histogram
+#          per Criterion x Model (O(new rows)), and each batch is a look
+#          at the data: for every Model pair and Criterion the monitor
+#          reports an anytime-valid confidence sequence for the difference
+#          in mean scores and the matching anytime-valid p-value, so the
+#          data can be checked after every batch without inflating the
+#          false positive rate.
+# Usage:   python -m llm_eval.monitor STATE RATINGS_FILE [RATINGS_FILE ...]
+#          (the 2_Data.xlsx workbook, or long CSV, Parquet or JSONL files)
+# ------------------------------------------------------------
+
+import os
+import pickle
+import sys
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from llm_eval.data import criteria, load_ratings, study_models
+from llm_eval.streaming import iter_chunks, levels
+
+rating_keys = ["Criterion", "Request", "Model", "Reviewer"]
+
+# ratings per Model and Criterion of the study (70 requests x 3 reviewers):
+# the confidence sequences are tightest around this sample size
+PLANNED_RATINGS = 210
+
+
+def mixture_scale(alpha, planned):
+    """Prior scale r of the normal-mixture boundary, tuned to be tightest at `planned` information.
+
+    Waudby-Smith et al., Time-uniform central limit theory and asymptotic
+    confidence sequences (2024), with r = 1 / rho^2.
+    """
+    log_term = -2 * np.log(alpha)
+    return planned / (log_term + np.log(log_term + 1))
+
+
+def boundary(z_info, r, alpha):
+    """Half-width, in standard errors, of the two-sided normal-mixture confidence sequence."""
+    return np.sqrt((z_info + r) / z_info * np.log((z_info + r) / (r * alpha ** 2)))
+
+
+def anytime_p(z, z_info, r):
+    """Smallest alpha at which the confidence sequence excludes zero at this look."""
+    log_p = 0.5 * np.log((z_info + r) / r) - z ** 2 * z_info / (2 * (z_info + r))
+    return np.minimum(1.0, np.exp(log_p))
+
+
+class SequentialMonitor:
+    """Running score histograms and anytime-valid pairwise comparisons.
+
+    Every call to update() is a look. The confidence sequences are
+    intersected over looks and the p-values are the running minimum over
+    looks, both valid at arbitrary stopping times. Ratings already counted
+    (same Criterion, Request, Model and Reviewer) are skipped, so the
+    whole of a growing file can be passed again.
+    """
+
+    def __init__(self, models=study_models, criteria=criteria, alpha=0.05, planned=PLANNED_RATINGS):
+        self.models = list(models)
+        self.criteria = list(criteria)
+        self.alpha = alpha
+        self.pairs = list(combinations(range(len(self.models)), 2))
+        # Bonferroni over the pairs of a criterion, as for Dunn's test
+        self.level = alpha / len(self.pairs)
+        # information of a pair with `planned` ratings per model
+        self.r = mixture_scale(self.level, planned / 2)
+
+        self.counts = np.zeros((len(self.criteria), len(self.models), len(levels)), dtype=np.int64)
+        shape = (len(self.criteria), len(self.pairs))
+        self.lower = np.full(shape, -np.inf)
+        self.upper = np.full(shape, np.inf)
+        self.p_min = np.ones(shape)
+        self.looks = 0
+        self.rows = 0
+        # 64-bit hashes of the keys (rating_keys) of every rating counted so far
+        self._seen = set()
+
+    def update(self, chunk):
+        """Add a batch of long-format ratings and take a look; returns the number of new ratings."""
+        scores = pd.to_numeric(chunk["Score"], errors='coerce')
+        chunk = chunk.assign(Score=scores, Request=chunk["Request"].astype(str))[scores.notna()]
+        bad = ~chunk["Score"].isin(levels)
+        if bad.any():
+            raise ValueError(f"non-Likert scores in chunk: {chunk.loc[bad, 'Score'].unique()[:5]}")
+        crit_idx = pd.Index(self.criteria).get_indexer(chunk["Criterion"])
+        model_idx = pd.Index(self.models).get_indexer(chunk["Model"])
+        unknown = (crit_idx < 0) | (model_idx < 0)
+        if unknown.any():
+            rows = chunk.loc[unknown, ["Criterion", "Model"]].drop_duplicates().values.tolist()
+            raise ValueError(f"ratings for unmonitored Criterion/Model: {rows[:5]}")
+
+        keys = pd.util.hash_pandas_object(chunk[rating_keys].astype(str), index=False).to_numpy()
+        # set lookups: O(rows of the chunk), whatever the number of ratings seen
+        seen = np.fromiter((key in self._seen for key in keys.tolist()), dtype=bool, count=len(keys))
+        new = ~(seen | pd.Series(keys).duplicated().to_numpy())
+        self._seen.update(keys[new].tolist())
+        level_idx = np.searchsorted(levels, chunk["Score"].to_numpy()[new])
+        np.add.at(self.counts, (crit_idx[new], model_idx[new], level_idx), 1)
+        self.rows += int(new.sum())
+
+        self.looks += 1
+        self._look(np.unique(crit_idx[new]))
+        return int(new.sum())
+
+    def _pair_stats(self, crit):
+        counts = self.counts[crit].astype(float)
+        n = counts.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = counts @ levels / n
+            var = (counts @ levels ** 2 - n * mean ** 2) / (n - 1)
+            i, j = np.array(self.pairs).T
+            diff = mean[i] - mean[j]
+            se = np.sqrt(var[i] / n[i] + var[j] / n[j])
+            # information of the pair, in ratings (n/2 for two equal groups)
+            info = 1 / (1 / n[i] + 1 / n[j])
+        return n[i], n[j], diff, se, info
+
+    def _look(self, crit_indices):
+        for crit in crit_indices:
+            _, _, diff, se, info = self._pair_stats(crit)
+            ready = (info > 0) & (se > 0) & np.isfinite(se)
+            if not ready.any():
+                continue
+            half = se[ready] * boundary(info[ready], self.r, self.level)
+            self.lower[crit, ready] = np.maximum(self.lower[crit, ready], diff[ready] - half)
+            self.upper[crit, ready] = np.minimum(self.upper[crit, ready], diff[ready] + half)
+            p = anytime_p(diff[ready] / se[ready], info[ready], self.r)
+            self.p_min[crit, ready] = np.minimum(self.p_min[crit, ready], p)
+
+    def report(self):
+        """Model pairs per Criterion: current Δ Mean, confidence sequence and anytime p-values."""
+        results = []
+        for c, crit in enumerate(self.criteria):
+            n_a, n_b, diff, _, _ = self._pair_stats(c)
+            for k, (i, j) in enumerate(self.pairs):
+                p_adj = min(1.0, self.p_min[c, k] * len(self.pairs))
+                results.append({
+                    "Criterion": crit,
+                    "Model A": self.models[i],
+                    "Model B": self.models[j],
+                    "N A": int(n_a[k]),
+                    "N B": int(n_b[k]),
+                    "Δ Mean": round(diff[k], 3),
+                    "CS Lower": round(self.lower[c, k], 3),
+                    "CS Upper": round(self.upper[c, k], 3),
+                    "p-value (anytime)": round(self.p_min[c, k], 4),
+                    "p-adj": round(p_adj, 4),
+                    "Significant": p_adj < self.alpha,
+                })
+        return pd.DataFrame(results)
+
+    def save(self, path):
+        with open(path, 'wb') as fh:
+            pickle.dump(self, fh)
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as fh:
+            return pickle.load(fh)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 2:
+        sys.exit("usage: python -m llm_eval.monitor STATE RATINGS_FILE [RATINGS_FILE ...]")
+    state, paths = argv[0], argv[1:]
+    monitor = SequentialMonitor.load(state) if os.path.exists(state) else SequentialMonitor()
+    added = 0
+    for path in paths:
+        chunks = [load_ratings(path)] if path.endswith(".xlsx") else iter_chunks(path)
+        for chunk in chunks:
+            added += monitor.update(chunk)
+    monitor.save(state)
+    table = monitor.report()
+    table.to_csv("monitor_sequential.csv", index=False)
+    print(table.to_string(index=False))
+    print(f"{added} new ratings ({monitor.rows} in total, {monitor.looks} looks); "
+          f"sequential comparisons saved to CSV.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Multiple-comparison registry
+# Michele Danilo Pierri MD PhD
+# Purpose: Every analysis registers the raw (unrounded) p-values of the
+#          rows of its output table. Once all analyses have run, one
+#          correction - Bonferroni, Holm, Benjamini-Hochberg or
+#          Benjamini-Yekutieli - is applied within each test family
+#          defined in FAMILIES, and the adjusted p-values are added as a
+#          column next to the raw ones in each table. Every family is
+#          produced by a single stage, so the correction is the same from
+#          the pipeline (with or without --only) and from scripts 3 and 4.
+#          Like profiling spans, registrations made in a pipeline worker
+#          are shipped back to the parent with drain() / merge().
+# ------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+
+METHODS = {"bonferroni": "Bonferroni", "holm": "Holm", "fdr_bh": "BH-FDR", "fdr_by": "BY-FDR"}
+DEFAULT_METHOD = "holm"
+
+# table name -> (p-value column, raw p-values aligned with the table rows)
+_registry = {}
+
+
+def _family(label, per_criterion=True):
+    if per_criterion:
+        return lambda table: (label + ": " + table["Criterion"].astype(str)).to_numpy()
+    return lambda table: np.full(len(table), label, dtype=object)
+
+
+def _permutation_family(table):
+    # the whole-sample tests belong to the model comparison, the strata to their own family
+    crit = table["Criterion"].astype(str)
+    return np.where(table["Stratum"] == "All", "Model comparison: " + crit,
+                    "Permutation by stratum: " + crit)
+
+
+# table name -> function giving the family of each row. The confirmatory
+# family is the model comparison of each criterion (Kruskal-Wallis, Dunn
+# pairs and whole-sample permutation tests). None: the table repeats tests
+# above on subsets of the data (reviewers, requests left out), and its
+# replicates are reported unadjusted. Tables missing here form their own family.
+FAMILIES = {
+    "stat_analysis_kruskal": _family("Model comparison"),
+    "stat_analysis_posthoc_dunn": _family("Model comparison"),
+    "stat_analysis_permutation": _permutation_family,
+    "stat_analysis_diagnostic_phase": _family("Diagnostic phase and user type", per_criterion=False),
+    "stat_analysis_user_type": _family("Diagnostic phase and user type", per_criterion=False),
+    "stat_analysis_ordinal": _family("Ordinal model"),
+    "stat_analysis_subgroups_kruskal": _family("Subgroups", per_criterion=False),
+    "sensitivity_analysis": None,
+    "sensitivity_jackknife": None,
+    "sensitivity_ordinal": None,
+}
+
+
+def families(name, table):
+    """Family label of each row of a registered table (None when reported unadjusted)."""
+    family = FAMILIES.get(name, _family(name, per_criterion=False))
+    return None if family is None else family(table)
+
+
+def register(table, p_values, column="p-value"):
+    """Add the raw p-values of a table's rows to the test family (replacing earlier ones)."""
+    _registry[table] = (column, np.asarray(p_values, dtype=float))
+
+
+def registered():
+    return dict(_registry)
+
+
+def drain():
+    """Return and forget the registrations (used to ship worker registrations to the parent)."""
+    entries = dict(_registry)
+    _registry.clear()
+    return entries
+
+
+def merge(entries):
+    _registry.update(entries)
+
+
+def adjust(p_values, method=DEFAULT_METHOD):
+    """Adjusted p-values for one family; NaN p-values are left out and stay NaN.
+
+    Same results as statsmodels' multipletests with the same method name.
+    """
+    if method not in METHODS:
+        raise ValueError(f"unknown correction {method!r}; available: {sorted(METHODS)}")
+    p_values = np.asarray(p_values, dtype=float)
+    adjusted = np.full(p_values.shape, np.nan)
+    valid = ~np.isnan(p_values)
+    p = p_values[valid]
+    m = len(p)
+    if m == 0:
+        return adjusted
+
+    if method == "bonferroni":
+        adj = p * m
+    else:
+        order = np.argsort(p, kind="stable")
+        ranked = p[order]
+        if method == "holm":
+            adj_sorted = np.maximum.accumulate((m - np.arange(m)) * ranked)
+        else:
+            scale = m / np.arange(1, m + 1)
+            if method == "fdr_by":
+                scale = scale * np.sum(1.0 / np.arange(1, m + 1))
+            adj_sorted = np.minimum.accumulate((scale * ranked)[::-1])[::-1]
+        adj = np.empty(m)
+        adj[order] = adj_sorted
+    adjusted[valid] = np.minimum(adj, 1.0)
+    return adjusted
+
+
+def adjusted_column(method):
+    return f"p-adj ({METHODS[method]}, within family)"
+
+
+def adjust_tables(tables, method=DEFAULT_METHOD, entries=None, summary_name="stat_analysis_multiplicity"):
+    """Correct the registered p-values of `tables` within each family (see FAMILIES).
+
+    Returns a copy of `tables` in which each adjusted table has the
+    adjusted column inserted after its p-value column, plus a summary
+    table named summary_name: tests and significant results per family,
+    and whether any test of the family stays significant after correction.
+    """
+    entries = registered() if entries is None else entries
+    registered_tables = [(name, *entries[name]) for name in tables if name in entries]
+    if method in (None, "none") or not registered_tables:
+        return dict(tables)
+    for name, _, p in registered_tables:
+        if len(p) != len(tables[name]):
+            raise ValueError(f"{len(p)} p-values registered for {name!r}, which has {len(tables[name])} rows")
+
+    labels = {name: families(name, tables[name]) for name, _, _ in registered_tables}
+    adjusted = {name: np.full(len(p), np.nan) for name, _, p in registered_tables}
+    summary = []
+    for family in pd.unique(np.concatenate([lab for lab in labels.values() if lab is not None] or [[]])):
+        members = [(name, labels[name] == family) for name, _, _ in registered_tables
+                   if labels[name] is not None and (labels[name] == family).any()]
+        raw = np.concatenate([entries[name][1][rows] for name, rows in members])
+        adj = adjust(raw, method)
+        start = 0
+        for name, rows in members:
+            adjusted[name][rows] = adj[start:start + rows.sum()]
+            start += rows.sum()
+        summary.append({
+            "Family": family,
+            "Tables": ", ".join(name for name, _ in members),
+            "Tests": int((~np.isnan(raw)).sum()),
+            "Raw p < 0.05": int((raw < 0.05).sum()),
+            "Adjusted p < 0.05": int((adj < 0.05).sum()),
+            "Significant (adjusted p < 0.05)": bool((adj < 0.05).any()),
+        })
+
+    out = dict(tables)
+    for name, column, p in registered_tables:
+        if labels[name] is None:
+            summary.append({
+                "Family": "Not adjusted (replicates)",
+                "Tables": name,
+                "Tests": int((~np.isnan(p)).sum()),
+                "Raw p < 0.05": int((p < 0.05).sum()),
+                "Adjusted p < 0.05": None,
+                "Significant (adjusted p < 0.05)": None,
+            })
+            continue
+        table = tables[name].copy()
+        table.insert(table.columns.get_loc(column) + 1, adjusted_column(method), adjusted[name].round(4))
+        out[name] = table
+    out[summary_name] = pd.DataFrame(summary).astype({
+        "Adjusted p < 0.05": "Int64", "Significant (adjusted p < 0.05)": "boolean"
+    }).assign(Correction=METHODS[method])
+    return out
@@ -0,0 +1,463 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Ordinal mixed model
+# Michele Danilo Pierri MD PhD
+# Purpose: Cumulative-link (logit) mixed model for the 1-5 ratings with
+#          crossed random intercepts for Request and Reviewer,
+#              logit P(Score <= k) = theta_k - (x'beta + u_request + v_reviewer)
+#          fitted by Laplace approximation (as R's ordinal::clmm), so the
+#          three ratings of a response are no longer treated as
+#          independent. The design arrays are built once per criterion and
+#          leave-one-out subsets are fitted by zero-weighting rows; every
+#          fit is warm-started from the previous one (parameters,
+#          random-effect modes, and its Hessian as preconditioner), and
+#          chains of subsets run in a process pool.
+# ------------------------------------------------------------
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+from scipy.special import expit
+
+from llm_eval.distributions import chi2_sf, norm_sf
+from llm_eval.profiling import profiled
+
+# bounds of log SD of the random effects; a variance on the lower bound is
+# reported as (practically) zero, as lme4/ordinal do at the boundary
+LOG_SD_BOUNDS = (-7.0, 3.0)
+# bounds of the first threshold and of the log gaps between thresholds, so
+# a score level left empty by a subset cannot send the optimizer to infinity
+THRESHOLD_BOUNDS = [(-30.0, 30.0)] + [(-10.0, 4.0)]
+# Newton steps on the random-effect modes stop below this size
+MODE_TOL = 1e-10
+MAX_NEWTON = 50
+
+
+class OrdinalDesign:
+    """Arrays of one ratings table, shared by every fit and subset.
+
+    y holds 0-based score categories, X the treatment-coded fixed effects
+    (first level of each factor is the reference), group/rater the integer
+    codes of the two random-intercept factors.
+    """
+
+    def __init__(self, df, fixed=("Model",), group="Request", rater="Reviewer", val_col="Score"):
+        df = df.dropna(subset=[val_col])
+        self.levels = np.sort(df[val_col].unique())
+        self.y = np.searchsorted(self.levels, df[val_col].to_numpy())
+        columns, self.fixed_names = [], []
+        self.factors = {}
+        for factor in fixed:
+            code, cats = pd.factorize(df[factor])
+            self.factors[factor] = list(cats)
+            for j, cat in enumerate(cats[1:], start=1):
+                columns.append((code == j).astype(float))
+                self.fixed_names.append(f"{factor}[{cat}]")
+        self.X = np.column_stack(columns) if columns else np.zeros((len(df), 0))
+        self.group, group_levels = pd.factorize(df[group])
+        self.rater, rater_levels = pd.factorize(df[rater])
+        self.group_levels, self.rater_levels = list(group_levels), list(rater_levels)
+        self.n_group, self.n_rater = len(group_levels), len(rater_levels)
+        self.cell = self.group * self.n_rater + self.rater
+        self.n_thresholds = len(self.levels) - 1
+
+    def __len__(self):
+        return len(self.y)
+
+    def weights(self, exclude=None):
+        """Row weights dropping the rows whose group or rater is in `exclude` ({'group': [...], 'rater': [...]})."""
+        w = np.ones(len(self))
+        for kind, names in (exclude or {}).items():
+            labels = self.group_levels if kind == "group" else self.rater_levels
+            codes = self.group if kind == "group" else self.rater
+            w[np.isin(codes, [labels.index(name) for name in names])] = 0.0
+        return w
+
+    def start(self, weights=None):
+        """Cold-start parameters: marginal cumulative logits, no effects, SD 0.5."""
+        w = np.ones(len(self)) if weights is None else weights
+        counts = np.bincount(self.y, weights=w, minlength=len(self.levels)) + 0.5
+        cumulative = np.cumsum(counts)[:-1] / counts.sum()
+        theta = np.log(cumulative / (1 - cumulative))
+        return np.concatenate([[theta[0]], np.log(np.diff(theta)), np.zeros(self.X.shape[1]),
+                               np.log([0.5, 0.5])])
+
+
+# ------------------------------
+# Laplace approximation
+# ------------------------------
+
+def _unpack(params, n_thresholds, n_fixed):
+    theta = np.cumsum(np.concatenate([params[:1], np.exp(params[1:n_thresholds])]))
+    beta = params[n_thresholds:n_thresholds + n_fixed]
+    sd = np.exp(params[n_thresholds + n_fixed:])
+    return theta, beta, sd
+
+
+def _cut_terms(design, theta, eta, third=False):
+    """log P(y) and its partial derivatives in the upper and lower cut points.
+
+    With A = theta_y - eta and B = theta_(y-1) - eta, P(y) = F(A) - F(B);
+    returns log P, l_A, l_B, l_AA, l_AB, l_BB (and, with third=True,
+    l_AAA, l_AAB, l_ABB, l_BBB) per row. Derivatives in eta are
+    -(d/dA + d/dB), in a threshold d/dA or d/dB.
+    """
+    cuts = np.concatenate([[-np.inf], theta, [np.inf]])
+    upper = expit(cuts[design.y + 1] - eta)
+    lower = expit(cuts[design.y] - eta)
+    # floored so that absurd trial points of the optimizer stay finite
+    prob = np.maximum(upper - lower, 1e-15)
+    dens_u, dens_l = upper * (1 - upper), lower * (1 - lower)
+    la, lb = dens_u / prob, -dens_l / prob
+    # second and third derivatives of P over P (mixed ones vanish)
+    ra, rb = dens_u * (1 - 2 * upper) / prob, -dens_l * (1 - 2 * lower) / prob
+    terms = [np.log(prob), la, lb, ra - la ** 2, -la * lb, rb - lb ** 2]
+    if third:
+        sa = dens_u * (1 - 6 * upper + 6 * upper ** 2) / prob
+        sb = -dens_l * (1 - 6 * lower + 6 * lower ** 2) / prob
+        terms += [sa - 3 * ra * la + 2 * la ** 3, -ra * lb + 2 * la ** 2 * lb,
+                  -rb * la + 2 * la * lb ** 2, sb - 3 * rb * lb + 2 * lb ** 3]
+    return terms
+
+
+def _eta_terms(design, theta, eta):
+    """log P(y) and its first two derivatives in eta, per row."""
+    logp, la, lb, laa, lab, lbb = _cut_terms(design, theta, eta)
+    return logp, -(la + lb), laa + 2 * lab + lbb
+
+
+class _Laplace:
+    """Negative Laplace log-likelihood and its gradient in the parameters.
+
+    The random-effect modes are kept between calls, so each evaluation
+    starts Newton from the previous optimum. The gradient accounts for the
+    dependence of the modes on the parameters (implicit differentiation).
+    """
+
+    def __init__(self, design, weights, modes=None, fixed=True):
+        self.design = design
+        self.w = weights
+        self.fixed = fixed
+        self.n_fixed = design.X.shape[1] if fixed else 0
+        self.modes = np.zeros(design.n_group + design.n_rater) if modes is None else modes.copy()
+
+    def _hessian_blocks(self, h, sd):
+        d = self.design
+        # -d2 log P / d eta2 >= 0 (the cumulative logit is log-concave); rounding at
+        # the probability floor could break this far from the optimum
+        h = np.maximum(h, 0)
+        dq = np.bincount(d.group, h, d.n_group) + 1 / sd[0] ** 2
+        dr = np.bincount(d.rater, h, d.n_rater) + 1 / sd[1] ** 2
+        cross = np.bincount(d.cell, h, d.n_group * d.n_rater).reshape(d.n_group, d.n_rater)
+        # Schur complement of the (diagonal) Request block
+        schur = np.diag(dr) - cross.T @ (cross / dq[:, None])
+        return dq, cross, schur
+
+    def _solve(self, blocks, rhs):
+        dq, cross, schur = blocks
+        n_group = self.design.n_group
+        top, bottom = rhs[:n_group], rhs[n_group:]
+        lower = np.linalg.solve(schur, bottom - cross.T @ (top / dq))
+        return np.concatenate([(top - cross @ lower) / dq, lower])
+
+    def _penalized(self, b, theta, fixed_eta, sd):
+        d = self.design
+        u, v = b[:d.n_group], b[d.n_group:]
+        logp, g1, g2 = _eta_terms(d, theta, fixed_eta + u[d.group] + v[d.rater])
+        value = np.sum(self.w * logp) - 0.5 * (u @ u) / sd[0] ** 2 - 0.5 * (v @ v) / sd[1] ** 2
+        return value, g1, g2
+
+    def _modes(self, theta, fixed_eta, sd):
+        """Damped Newton on the (concave) penalized log-likelihood of the random effects."""
+        d = self.design
+        b = self.modes
+        value, g1, g2 = self._penalized(b, theta, fixed_eta, sd)
+        for _ in range(MAX_NEWTON):
+            wg1 = self.w * g1
+            grad = np.concatenate([np.bincount(d.group, wg1, d.n_group) - b[:d.n_group] / sd[0] ** 2,
+                                   np.bincount(d.rater, wg1, d.n_rater) - b[d.n_group:] / sd[1] ** 2])
+            step = self._solve(self._hessian_blocks(-self.w * g2, sd), grad)
+            while True:
+                new_value, new_g1, new_g2 = self._penalized(b + step, theta, fixed_eta, sd)
+                if new_value >= value - 1e-12 * abs(value) or np.max(np.abs(step)) < MODE_TOL:
+                    break
+                step = step / 2
+            b, value, g1, g2 = b + step, new_value, new_g1, new_g2
+            if np.max(np.abs(step)) < MODE_TOL:
+                break
+        self.modes = b
+        return b, value, g2
+
+    def __call__(self, params):
+        d = self.design
+        theta, beta, sd = _unpack(params, d.n_thresholds, self.n_fixed)
+        X = d.X[:, :self.n_fixed]
+        b, value, g2 = self._modes(theta, X @ beta, sd)
+        u, v = b[:d.n_group], b[d.n_group:]
+        w = self.w
+        blocks = self._hessian_blocks(-w * g2, sd)
+        dq, cross, schur = blocks
+        logdet = np.sum(np.log(dq)) + np.linalg.slogdet(schur)[1]
+        loglik = value - d.n_group * np.log(sd[0]) - d.n_rater * np.log(sd[1]) - 0.5 * logdet
+
+        # --- gradient ---
+        eta = X @ beta + u[d.group] + v[d.rater]
+        logp, la, lb, laa, lab, lbb, laaa, laab, labb, lbbb = _cut_terms(d, theta, eta, third=True)
+        g1 = -(la + lb)
+        g3 = -(laaa + 3 * laab + 3 * labb + lbbb)
+        # diagonal of H^-1 and z_i' H^-1 z_i for every row, from the block inverse
+        schur_inv = np.linalg.inv(schur)
+        scaled = cross / dq[:, None]
+        inv_qr = -scaled @ schur_inv
+        inv_qq = 1 / dq - np.sum(inv_qr * scaled, axis=1)
+        leverage = inv_qq[d.group] + np.diag(schur_inv)[d.rater] + 2 * inv_qr[d.group, d.rater]
+        # the modes move with the parameters: d logdet picks up c' db/dphi = a' G
+        a = self._solve(blocks, np.concatenate([np.bincount(d.group, -w * g3 * leverage, d.n_group),
+                                                np.bincount(d.rater, -w * g3 * leverage, d.n_rater)]))
+        za = a[:d.n_group][d.group] + a[d.n_group:][d.rater]
+
+        # thresholds: row i moves theta_y through A and theta_(y-1) through B
+        on_a = w * (la - 0.5 * (-leverage * (laaa + 2 * laab + labb) - za * (laa + lab)))
+        on_b = w * (lb - 0.5 * (-leverage * (laab + 2 * labb + lbbb) - za * (lab + lbb)))
+        k = d.n_thresholds
+        grad_theta = (np.bincount(d.y, on_a, k + 1)[:k] + np.bincount(d.y, on_b, k + 1)[1:])
+        # theta = cumsum([t0, exp(t1), ...])
+        gaps = np.exp(params[1:k])
+        grad_t = np.concatenate([[grad_theta.sum()], gaps * np.cumsum(grad_theta[::-1])[::-1][1:]])
+        grad_beta = X.T @ (w * (g1 - 0.5 * (-leverage * g3 + za * g2)))
+        grad_sd = []
+        for block, effect, n, s in ((slice(0, d.n_group), u, d.n_group, sd[0]),
+                                    (slice(d.n_group, None), v, d.n_rater, sd[1])):
+            diag_inv = inv_qq if block.start == 0 else np.diag(schur_inv)
+            trace = -2 / s ** 2 * diag_inv.sum() + 2 / s ** 2 * (a[block] @ effect)
+            grad_sd.append((effect @ effect) / s ** 2 - n - 0.5 * trace)
+        return -loglik, -np.concatenate([grad_t, grad_beta, grad_sd])
+
+
+class OrdinalFit:
+    """Result of fit_clmm; passed back as `start`, its params, modes and
+    Hessian warm-start the next fit.
+    """
+
+    def __init__(self, design, params, modes, loglik, fixed, result):
+        n_fixed = design.X.shape[1] if fixed else 0
+        self.params = params
+        self.modes = modes
+        self.loglik = loglik
+        self.fixed = fixed
+        self.converged = bool(result.success)
+        self.evaluations = int(result.nfev)
+        self.theta, self.beta, sd = _unpack(params, design.n_thresholds, n_fixed)
+        self.sd_group, self.sd_rater = sd
+        self.names = design.fixed_names[:n_fixed]
+        self.se = None
+        self.hessian = None
+
+    def coefficients(self):
+        """Fixed effects with Wald z, p and odds-ratio 95% CI (needs se=True)."""
+        table = pd.DataFrame({"Term": self.names, "Estimate": self.beta})
+        if self.se is not None:
+            z = self.beta / self.se
+            table["SE"] = self.se
+            table["z"] = z
+            table["p-value"] = 2 * norm_sf(np.abs(z))
+            table["OR"] = np.exp(self.beta)
+            table["OR CI Lower"] = np.exp(self.beta - 1.96 * self.se)
+            table["OR CI Upper"] = np.exp(self.beta + 1.96 * self.se)
+        return table
+
+
+def _numeric_hessian(gradient, params, step=1e-5):
+    """Central differences of the analytic gradient, symmetrized."""
+    columns = []
+    for i in range(len(params)):
+        shift = np.zeros(len(params))
+        shift[i] = step
+        columns.append((gradient(params + shift) - gradient(params - shift)) / (2 * step))
+    hess = np.column_stack(columns)
+    return (hess + hess.T) / 2
+
+
+def _bounded(design, fixed):
+    n_fixed = design.X.shape[1] if fixed else 0
+    bounds = (THRESHOLD_BOUNDS[:1] + THRESHOLD_BOUNDS[1:] * (design.n_thresholds - 1)
+              + [(-np.inf, np.inf)] * n_fixed + [LOG_SD_BOUNDS] * 2)
+    return np.array(bounds)
+
+
+def _preconditioned(objective, params, hessian, bounds):
+    """Minimize in z with params = x0 + C z, C C' = H^-1 (H from a nearby fit).
+
+    Near the previous optimum the problem is then close to the identity
+    quadratic and L-BFGS needs a handful of evaluations. Returns None when
+    the Hessian cannot be used or the optimum leaves the bounds.
+    """
+    try:
+        factor = np.linalg.cholesky(np.linalg.inv(hessian))
+    except np.linalg.LinAlgError:
+        return None
+
+    def scaled(z):
+        value, grad = objective(params + factor @ z)
+        return value, factor.T @ grad
+
+    result = minimize(scaled, np.zeros(len(params)), jac=True, method="L-BFGS-B")
+    result.x = params + factor @ result.x
+    if not result.success or np.any(result.x < bounds[:, 0]) or np.any(result.x > bounds[:, 1]):
+        return None
+    return result
+
+
+def fit_clmm(design, weights=None, start=None, fixed=True, se=False):
+    """Fit the model on the rows with positive weight.
+
+    start: an OrdinalFit (or its params) to warm-start from; a full-model fit
+    can start a null fit (fixed=False), its fixed effects are dropped. The
+    Hessian of the start fit, when it has one, preconditions the optimizer
+    and is handed on to the new fit.
+    se: standard errors of the fixed effects from the Hessian (differences
+    of the gradient).
+    """
+    weights = np.ones(len(design)) if weights is None else weights
+    n_fixed = design.X.shape[1]
+    fixed_block = np.s_[design.n_thresholds:design.n_thresholds + n_fixed]
+    modes = hessian = None
+    if start is None:
+        params = design.start(weights)
+    elif isinstance(start, OrdinalFit):
+        params, modes, hessian = start.params, start.modes, start.hessian
+    else:
+        params = np.asarray(start, dtype=float)
+    if not fixed and len(params) == design.n_thresholds + n_fixed + 2:
+        params = np.delete(params, fixed_block)
+        if hessian is not None:
+            hessian = np.delete(np.delete(hessian, fixed_block, axis=0), fixed_block, axis=1)
+    elif fixed and len(params) == design.n_thresholds + 2:
+        params = np.insert(params, design.n_thresholds, np.zeros(n_fixed))
+        hessian = None
+
+    objective = _Laplace(design, weights, modes, fixed)
+    bounds = _bounded(design, fixed)
+    params = np.clip(params, bounds[:, 0], bounds[:, 1])
+    result = _preconditioned(objective, params, hessian, bounds) if hessian is not None else None
+    if result is None:
+        if modes is not None:
+            objective.modes = modes.copy()
+        result = minimize(objective, params, jac=True, method="L-BFGS-B",
+                          bounds=[(None if np.isinf(low) else low, None if np.isinf(high) else high)
+                                  for low, high in bounds])
+    objective(result.x)
+    fit = OrdinalFit(design, result.x, objective.modes, -result.fun, fixed, result)
+    fit.hessian = hessian
+    if se and fixed and n_fixed:
+        fit.hessian = _numeric_hessian(lambda x: objective(x)[1], result.x)
+        # SD parameters sitting on their bound are held fixed
+        free = [i for i in range(len(result.x))
+                if i < len(result.x) - 2 or LOG_SD_BOUNDS[0] + 1e-3 < result.x[i] < LOG_SD_BOUNDS[1] - 1e-3]
+        cov = np.linalg.pinv(fit.hessian[np.ix_(free, free)])
+        index = [free.index(i) for i in range(design.n_thresholds, design.n_thresholds + n_fixed)]
+        fit.se = np.sqrt(np.diag(cov)[index])
+        objective(result.x)
+        fit.modes = objective.modes
+    return fit
+
+
+def lr_test(full, null, df):
+    stat = max(2 * (full.loglik - null.loglik), 0.0)
+    return stat, chi2_sf(stat, df)
+
+
+# ------------------------------
+# Leave-one-out subsets, warm-started chains in a process pool
+# ------------------------------
+
+def _fit_chain(task):
+    design, start, subsets = task
+    rows = []
+    previous = start
+    for kind, name in subsets:
+        weights = design.weights({kind: [name]})
+        full = fit_clmm(design, weights, start=previous)
+        null = fit_clmm(design, weights, start=full, fixed=False)
+        stat, p = lr_test(full, null, design.X.shape[1])
+        rows.append((kind, name, full, stat, p))
+        previous = full
+    return rows
+
+
+def _map(func, tasks, workers):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(tasks) <= 1:
+        return list(map(func, tasks))
+    with ProcessPoolExecutor(min(workers, len(tasks))) as pool:
+        return list(pool.map(func, tasks))
+
+
+def _chains(subsets, n_chains):
+    # interleaved, so every chain gets a share of reviewers and of requests
+    return [subsets[i::n_chains] for i in range(n_chains) if subsets[i::n_chains]]
+
+
+def _full_fit(task):
+    crit, df, fixed = task
+    design = OrdinalDesign(df, fixed=fixed)
+    full = fit_clmm(design, se=True)
+    null = fit_clmm(design, start=full, fixed=False)
+    return crit, design, full, lr_test(full, null, design.X.shape[1])
+
+
+@profiled()
+def ordinal_models(df_long, criteria=None, fixed=("Model",), loo=True, workers=None):
+    """Mixed-model fits per criterion and, with loo, for every leave-one-reviewer/request-out subset.
+
+    Returns (model table, subset table). The criteria are fitted in
+    parallel, then the subsets of every criterion, in warm-started chains
+    starting from the criterion's full-data fit.
+    """
+    criteria = criteria or list(pd.unique(df_long['Criterion']))
+    if workers is None:
+        workers = os.cpu_count() or 1
+    fits = _map(_full_fit, [(crit, df_long[df_long['Criterion'] == crit], fixed) for crit in criteria], workers)
+
+    chains, owners = [], []
+    if loo:
+        per_criterion = max(1, workers // len(fits))
+        for crit, design, full, _ in fits:
+            subsets = ([("rater", name) for name in design.rater_levels]
+                       + [("group", name) for name in design.group_levels])
+            for chain in _chains(subsets, per_criterion):
+                chains.append((design, full, chain))
+                owners.append(crit)
+    chain_rows = _map(_fit_chain, chains, workers)
+
+    model_rows, subset_rows = [], []
+    for crit, design, full, (stat, p) in fits:
+        for row in full.coefficients().to_dict("records"):
+            model_rows.append({"Criterion": crit, **row, "SD Request": full.sd_group,
+                               "SD Reviewer": full.sd_rater, "LR chi2 (model)": stat,
+                               "LR p-value": p, "Converged": full.converged})
+    for crit, rows in zip(owners, chain_rows):
+        for kind, name, fit, stat, p in rows:
+            subset_rows.append({
+                "Criterion": crit,
+                "Excluded": "Reviewer" if kind == "rater" else "Request",
+                "Name": name,
+                **dict(zip(fit.names, fit.beta)),
+                "SD Request": fit.sd_group,
+                "SD Reviewer": fit.sd_rater,
+                "LR chi2 (model)": stat,
+                "LR p-value": p,
+                "Significant (p < 0.05)": p < 0.05,
+                "Converged": fit.converged,
+            })
+    subset_table = pd.DataFrame(subset_rows)
+    if len(subset_table):
+        # chains interleave the subsets; report them criterion by criterion, reviewers first
+        order = {crit: i for i, crit in enumerate(criteria)}
+        subset_table = subset_table.sort_values(
+            ["Criterion", "Excluded"], key=lambda c: c.map(order) if c.name == "Criterion" else c != "Reviewer",
+            kind="stable").reset_index(drop=True)
+    return pd.DataFrame(model_rows), subset_table
@@ -0,0 +1,155 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Permutation tests for model comparisons
+# Michele Danilo Pierri MD PhD
+# Purpose: Kruskal-Wallis, Mann-Whitney and pairwise Dunn p-values by
+#          permuting the model labels within each Request (every request
+#          is answered by every model).
+#          Pooled mid-ranks do not change under relabelling, so each
+#          permutation only re-sums per-response rank sums; permutations
+#          are evaluated in vectorized batches and sampling stops as soon
+#          as every p-value is clearly above or below alpha.
+#          Small strata are enumerated exactly.
+# ------------------------------------------------------------
+
+from itertools import combinations, islice, permutations, product
+from math import factorial
+
+import numpy as np
+import pandas as pd
+
+from llm_eval.profiling import profiled
+from llm_eval.rankstats import midranks
+
+
+class BlockedRanks:
+    """Per-response rank sums arranged as blocks (Requests) x models."""
+
+    def __init__(self, data, models, block_col='Request', group_col='Model', val_col='Score'):
+        data = data[data[group_col].isin(models)].dropna(subset=[val_col])
+        # keep only blocks answered by every model, so labels can be exchanged
+        complete = data.groupby(block_col)[group_col].nunique() == len(models)
+        data = data[data[block_col].isin(complete.index[complete])]
+        values = data[val_col].to_numpy()
+        _, inverse, ties = np.unique(values, return_inverse=True, return_counts=True)
+        ranks = midranks(ties)[inverse]
+        ties = ties.astype(float)
+        self.tie_sum = np.sum(ties ** 3 - ties)
+        frame = pd.DataFrame({
+            'block': data[block_col].to_numpy(),
+            'group': data[group_col].to_numpy(),
+            'rank': ranks,
+        })
+        agg = frame.groupby(['block', 'group'])['rank'].agg(['sum', 'count'])
+        self.rank_sum = agg['sum'].unstack('group')[models].to_numpy()
+        self.count = agg['count'].unstack('group')[models].to_numpy().astype(float)
+        self.models = list(models)
+        self.n_blocks = len(self.rank_sum)
+        self.n = self.count.sum()
+        self.dropped_blocks = int((~complete).sum())
+
+    def group_sums(self, perm):
+        """Rank sums and sizes per model for permutations perm[batch, block, model]."""
+        rank_sum = np.take_along_axis(self.rank_sum[None], perm, axis=2).sum(axis=1)
+        count = np.take_along_axis(self.count[None], perm, axis=2).sum(axis=1)
+        return rank_sum, count
+
+    def identity(self):
+        return np.broadcast_to(np.arange(len(self.models)), (1, self.n_blocks, len(self.models)))
+
+
+def _statistics(ranks, perm, pairs):
+    # the tie correction and N are fixed under relabelling, so the
+    # Kruskal-Wallis H is monotone in sum(R_g^2 / n_g) and Dunn's |z| in
+    # |mean rank difference| / sqrt(1/n_i + 1/n_j)
+    rank_sum, count = ranks.group_sums(perm)
+    kw = (rank_sum ** 2 / count).sum(axis=1)
+    mean_rank = rank_sum / count
+    i, j = np.array(pairs).T
+    dunn = np.abs(mean_rank[:, i] - mean_rank[:, j]) / np.sqrt(1 / count[:, i] + 1 / count[:, j])
+    return np.column_stack([kw, dunn])
+
+
+def _decided(hits, n, alpha, confidence):
+    # Clopper-Pearson interval for the running p-value estimate
+    from scipy.stats import beta
+
+    tail = (1 - confidence) / 2
+    lower = np.where(hits > 0, beta.ppf(tail, hits, n - hits + 1), 0.0)
+    upper = np.where(hits < n, beta.ppf(1 - tail, hits + 1, n - hits), 1.0)
+    return (upper < alpha) | (lower > alpha)
+
+
+@profiled()
+def permutation_test(data, models, alpha=0.05, max_permutations=100_000, batch_size=2_000,
+                     confidence=0.999, exact_limit=50_000, seed=None,
+                     block_col='Request', group_col='Model', val_col='Score'):
+    """Within-block permutation p-values for Kruskal-Wallis and every Dunn pair.
+
+    Returns a list of dicts (one for the global test, one per model pair)
+    with the observed statistic, the permutation p-value and the number of
+    permutations evaluated. With two models the global test is the
+    two-sided Mann-Whitney test.
+    """
+    ranks = BlockedRanks(data, models, block_col, group_col, val_col)
+    k = len(models)
+    pairs = list(combinations(range(k), 2))
+    observed = _statistics(ranks, ranks.identity(), pairs)[0]
+    # tolerance against floating point noise in equal statistics
+    observed = observed - 1e-9 * np.abs(observed)
+
+    n_exact = factorial(k) ** ranks.n_blocks
+    exact = n_exact <= exact_limit
+    hits = np.zeros(len(observed))
+    done = 0
+    if exact:
+        all_perms = np.array(list(permutations(range(k))))
+        choices = product(range(len(all_perms)), repeat=ranks.n_blocks)
+        while True:
+            idx = np.array(list(islice(choices, batch_size)), dtype=int).reshape(-1, ranks.n_blocks)
+            if not len(idx):
+                break
+            stats = _statistics(ranks, all_perms[idx], pairs)
+            hits += (stats >= observed).sum(axis=0)
+            done += len(idx)
+        p_values = hits / done
+    else:
+        rng = seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+        while done < max_permutations:
+            size = min(batch_size, max_permutations - done)
+            perm = np.argsort(rng.random((size, ranks.n_blocks, k)), axis=2)
+            stats = _statistics(ranks, perm, pairs)
+            hits += (stats >= observed).sum(axis=0)
+            done += size
+            if _decided(hits, done, alpha, confidence).all():
+                break
+        # the observed labelling counts as one permutation
+        p_values = (hits + 1) / (done + 1)
+
+    # report the statistics on their usual scale
+    n = ranks.n
+    rank_sum, count = ranks.group_sums(ranks.identity())
+    h = 12 / (n * (n + 1)) * (rank_sum[0] ** 2 / count[0]).sum() - 3 * (n + 1)
+    h /= 1 - ranks.tie_sum / (n ** 3 - n)
+    results = [{
+        'Test': 'Mann-Whitney' if k == 2 else 'Kruskal-Wallis',
+        'Model A': models[0] if k == 2 else '',
+        'Model B': models[1] if k == 2 else '',
+        'Statistic': rank_sum[0, 0] - count[0, 0] * (count[0, 0] + 1) / 2 if k == 2 else h,
+        'Permutation p': p_values[0],
+    }]
+    if k > 2:
+        mean_rank = rank_sum[0] / count[0]
+        variance = n * (n + 1) / 12 - ranks.tie_sum / (12 * (n - 1))
+        for col, (i, j) in enumerate(pairs, start=1):
+            z = (mean_rank[i] - mean_rank[j]) / np.sqrt(variance * (1 / count[0, i] + 1 / count[0, j]))
+            results.append({
+                'Test': 'Dunn',
+                'Model A': models[i],
+                'Model B': models[j],
+                'Statistic': z,
+                'Permutation p': p_values[col],
+            })
+    for row in results:
+        row.update({'Permutations': done, 'Exact': exact, 'Blocks': ranks.n_blocks})
+    return results
+
@@ -0,0 +1,272 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Pipeline runner
+# Michele Danilo Pierri MD PhD
+# Purpose: Run the whole analysis (scripts 1-8) as a dependency graph of
+#          stages with declared inputs and outputs. Independent stages
+#          (reliability, sensitivity, descriptive, each figure) run
+#          concurrently in one process pool, and DataFrames are passed
+#          between stages in memory instead of through CSV files.
+# ------------------------------------------------------------
+
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+from llm_eval import multiplicity, profiling, stages
+from llm_eval.data import load_ratings
+from llm_eval.store import STORE_DIR
+
+
+class Stage:
+    """A pipeline node: func(**inputs, **params) -> {output name: value}.
+
+    With save=True, DataFrame outputs are written to <tables dir>/<name>.csv.
+    """
+
+    def __init__(self, name, func, inputs=(), outputs=(), save=True, **params):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.save = save
+        self.params = params
+
+
+# ------------------------------
+# Stage functions (module level, so they can be sent to worker processes)
+# ------------------------------
+
+def load_stage(data_dir):
+    return {"ratings": load_ratings(os.path.join(data_dir, "2_Data.xlsx"), sheets=stages.criteria)}
+
+
+def pilot_stage(data_dir):
+    return {"pilot": pd.read_excel(os.path.join(data_dir, "1_Pilot.xlsx"), sheet_name="Sheet1")}
+
+
+def power_stage(pilot):
+    # the simulation grid runs serially: the stage already runs inside the pipeline's pool
+    return {**stages.power_analysis(pilot), **stages.simulated_power(pilot, workers=1)}
+
+
+def reliability_stage(ratings, cache_dir):
+    return stages.reliability(ratings, cache_dir=cache_dir)
+
+
+def descriptive_stage(ratings, cache_dir):
+    return stages.descriptive(ratings, cache_dir=cache_dir)
+
+
+def statistics_stage(ratings, cache_dir):
+    return stages.statistics(ratings, cache_dir=cache_dir)
+
+
+def subgroups_stage(ratings):
+    return stages.subgroups(ratings)
+
+
+def sensitivity_stage(ratings):
+    # the stage already runs inside the pipeline's pool
+    return stages.sensitivity(ratings, workers=1)
+
+
+def ordinal_stage(ratings, cache_dir):
+    # the stage already runs inside the pipeline's pool
+    return stages.ordinal(ratings, cache_dir=cache_dir, workers=1)
+
+
+def summary_stage(ratings):
+    from llm_eval.figures import row_summary
+
+    return {"row_summary": row_summary(ratings)}
+
+
+def figure_from_summary(row_summary, figure, figures_dir, cache_dir):
+    from llm_eval import figures
+
+    data = figures.summary_data(figure, row_summary)
+    return {figure: figures.render_figure(figure, data, figures_dir, cache_dir)}
+
+
+def figure_from_dunn(stat_analysis_posthoc_dunn, figure, figures_dir, cache_dir):
+    from llm_eval import figures
+
+    data = figures.figure_2_data(stat_analysis_posthoc_dunn)
+    return {figure: figures.render_figure(figure, data, figures_dir, cache_dir)}
+
+
+def build_stages(data_dir, figures_dir, cache_dir):
+    statistics_tables = ["stat_analysis_kruskal", "stat_analysis_posthoc_dunn", "stat_analysis_permutation",
+                         "stat_analysis_diagnostic_phase", "stat_analysis_user_type"]
+    figure_args = dict(figures_dir=figures_dir, cache_dir=cache_dir)
+    return [
+        Stage("load", load_stage, [], ["ratings"], save=False, data_dir=data_dir),
+        Stage("pilot", pilot_stage, [], ["pilot"], save=False, data_dir=data_dir),
+        Stage("power", power_stage, ["pilot"], ["stat_analysis_power", "stat_analysis_power_simulation"]),
+        Stage("reliability", reliability_stage, ["ratings"],
+              ["reliability_kappa", "reliability_kendall", "reliability_kendall_friedman", "reliability_icc"],
+              cache_dir=cache_dir),
+        Stage("descriptive", descriptive_stage, ["ratings"],
+              ["stat_analysis_descriptive", "stat_analysis_shapiro"], cache_dir=cache_dir),
+        Stage("statistics", statistics_stage, ["ratings"], statistics_tables, cache_dir=cache_dir),
+        Stage("subgroups", subgroups_stage, ["ratings"], ["stat_analysis_subgroups", "stat_analysis_subgroups_kruskal"]),
+        Stage("sensitivity", sensitivity_stage, ["ratings"], ["sensitivity_analysis", "sensitivity_jackknife"]),
+        Stage("ordinal", ordinal_stage, ["ratings"], ["stat_analysis_ordinal", "sensitivity_ordinal"],
+              cache_dir=cache_dir),
+        # Figures 1, 3 and 4 share one per-response reviewer summary
+        Stage("figure_summary", summary_stage, ["ratings"], ["row_summary"], save=False),
+        Stage("figure_1", figure_from_summary, ["row_summary"], ["figure_1"], figure="figure_1", **figure_args),
+        Stage("figure_2", figure_from_dunn, ["stat_analysis_posthoc_dunn"], ["figure_2"],
+              figure="figure_2", **figure_args),
+        Stage("figure_3", figure_from_summary, ["row_summary"], ["figure_3"], figure="figure_3", **figure_args),
+        Stage("figure_4", figure_from_summary, ["row_summary"], ["figure_4"], figure="figure_4", **figure_args),
+    ]
+
+
+# ------------------------------
+# Graph execution
+# ------------------------------
+
+def _run_stage(stage, inputs):
+    # spans and p-values inherited from the parent by a forked worker are not this stage's
+    profiling.drain()
+    multiplicity.drain()
+    start = time.perf_counter()
+    with profiling.span(stage.name):
+        outputs = stage.func(**inputs, **stage.params)
+    missing = set(stage.outputs) - set(outputs)
+    if missing:
+        raise RuntimeError(f"stage {stage.name!r} did not produce {sorted(missing)}")
+    return outputs, time.perf_counter() - start, profiling.drain(), multiplicity.drain()
+
+
+class _InProcess:
+    """Executor stand-in that runs each submitted stage at once, in this process."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, func, *args):
+        # _run_stage drops the spans and p-values it finds on entry, which here are this process's own
+        earlier = profiling.drain()
+        earlier_tests = multiplicity.drain()
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as exc:
+            future.set_exception(exc)
+        profiling.merge(earlier)
+        multiplicity.merge(earlier_tests)
+        return future
+
+
+def select(stage_list, targets):
+    """The target stages plus everything they depend on."""
+    producer = {out: stage for stage in stage_list for out in stage.outputs}
+    by_name = {stage.name: stage for stage in stage_list}
+    unknown = set(targets) - set(by_name)
+    if unknown:
+        raise ValueError(f"unknown stages {sorted(unknown)}; available: {sorted(by_name)}")
+    needed = set()
+    todo = list(targets)
+    while todo:
+        stage = by_name[todo.pop()]
+        if stage.name not in needed:
+            needed.add(stage.name)
+            todo.extend(producer[name].name for name in stage.inputs)
+    return [stage for stage in stage_list if stage.name in needed]
+
+
+def run(stage_list, tables_dir, workers=None, p_adjust=multiplicity.DEFAULT_METHOD):
+    """Execute the stages in dependency order; DataFrame outputs are written to tables_dir.
+
+    workers=0 runs the stages one at a time in this process (for debugging
+    and for benchmarks timing each stage alone). Once all stages are done,
+    the p-values they registered are corrected as one family with the
+    p_adjust method (None or 'none' to skip) and their tables rewritten.
+    """
+    producer = {}
+    for stage in stage_list:
+        for out in stage.outputs:
+            if out in producer:
+                raise ValueError(f"{out!r} is produced by both {producer[out]!r} and {stage.name!r}")
+            producer[out] = stage.name
+    for stage in stage_list:
+        for name in stage.inputs:
+            if name not in producer:
+                raise ValueError(f"stage {stage.name!r} needs {name!r}, which no stage produces")
+
+    os.makedirs(tables_dir, exist_ok=True)
+    multiplicity.drain()
+    artifacts = {}
+    pending = list(stage_list)
+    running = {}
+    timings = {}
+    with (_InProcess() if workers == 0 else ProcessPoolExecutor(workers)) as pool:
+        while pending or running:
+            for stage in [s for s in pending if all(name in artifacts for name in s.inputs)]:
+                pending.remove(stage)
+                inputs = {name: artifacts[name] for name in stage.inputs}
+                running[pool.submit(_run_stage, stage, inputs)] = stage
+            if not running:
+                raise RuntimeError(f"dependency cycle among {[s.name for s in pending]}")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                outputs, timings[stage.name], spans, tests = future.result()
+                profiling.merge(spans)
+                multiplicity.merge(tests)
+                artifacts.update(outputs)
+                for name, value in outputs.items():
+                    if stage.save and isinstance(value, pd.DataFrame):
+                        value.to_csv(os.path.join(tables_dir, f"{name}.csv"), index=False)
+                print(f"[{stage.name}] done in {timings[stage.name]:.2f} s")
+
+    # corrected within the families of llm_eval/multiplicity.py; each family
+    # comes from one stage, so --only does not change it (stage order, not completion order)
+    registered = multiplicity.registered()
+    family = {name: artifacts[name] for stage in stage_list for name in stage.outputs if name in registered}
+    if family and p_adjust not in (None, "none"):
+        for name, table in multiplicity.adjust_tables(family, method=p_adjust).items():
+            artifacts[name] = table
+            table.to_csv(os.path.join(tables_dir, f"{name}.csv"), index=False)
+    return artifacts, timings
+
+
+def main(argv=None):
+    import argparse
+
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    parser = argparse.ArgumentParser(description="Run the LLM cardiology evaluation pipeline.")
+    parser.add_argument("--data-dir", default=os.path.join(root, "data"))
+    parser.add_argument("--tables-dir", default=os.path.join(root, "tables"))
+    parser.add_argument("--figures-dir", default=os.path.join(root, "figures"))
+    parser.add_argument("--cache-dir", default=os.path.join(root, STORE_DIR))
+    parser.add_argument("--workers", type=int, default=None, help="process pool size (default: CPU count; 0 runs the stages in this process)")
+    parser.add_argument("--p-adjust", default=multiplicity.DEFAULT_METHOD,
+                        choices=list(multiplicity.METHODS) + ["none"],
+                        help="correction applied within each test family (default %(default)s)")
+    parser.add_argument("--only", nargs="+", metavar="STAGE",
+                        help="run only these stages (and the stages they depend on)")
+    parser.add_argument("--profile", nargs="?", const=profiling.DEFAULT_TRACE, metavar="TRACE",
+                        help=f"record profiling spans and write a JSON trace (default {profiling.DEFAULT_TRACE}); "
+                             f"same as setting {profiling.ENV_VAR}")
+    args = parser.parse_args(argv)
+    if args.profile:
+        profiling.enable(args.profile)
+
+    stage_list = build_stages(args.data_dir, args.figures_dir, args.cache_dir)
+    if args.only:
+        stage_list = select(stage_list, args.only)
+    start = time.perf_counter()
+    run(stage_list, args.tables_dir, args.workers, args.p_adjust)
+    print(f"Pipeline completed in {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
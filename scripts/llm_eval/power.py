@@ -0,0 +1,221 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Simulation-based power analysis
+# Michele Danilo Pierri MD PhD
+# Purpose: Power of the Friedman test for 1-5 ratings by Monte Carlo
+#          instead of the one-way ANOVA approximation, with the rejection
+#          rates of the rating-level Kruskal-Wallis test for comparison.
+#          That Kruskal-Wallis test treats the ratings as independent,
+#          ignoring their clustering by reviewer and question, so it is
+#          anticonservative (about 10% rejections at alpha 0.05 with no
+#          effect) and is not used for sample sizes.
+#          Ratings are generated from the pilot study: per-model score
+#          distributions and the correlations between reviewers of the same
+#          response and between models on the same question, through a
+#          latent Gaussian model cut at the pilot's score thresholds.
+#          Whole batches of studies are simulated as arrays, and the grid
+#          of sample sizes x effect sizes is spread over a process pool.
+# ------------------------------------------------------------
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from llm_eval.data import criteria, score_range
+from llm_eval.distributions import chi2_sf, norm_ppf
+from llm_eval.profiling import profiled
+
+# simulated studies per array operation
+BATCH_SIZE = 500
+
+
+# ------------------------------
+# Generative model fitted on the pilot
+# ------------------------------
+
+def _pair_covariance(residual, keys):
+    """Mean product of residuals over distinct pairs of ratings sharing `keys` -> (sum, count)."""
+    grouped = residual.groupby(keys)
+    sums = grouped.sum()
+    squares = (residual ** 2).groupby(keys).sum()
+    sizes = grouped.size()
+    return (sums ** 2 - squares).sum(), (sizes * (sizes - 1)).sum()
+
+
+class PilotModel:
+    """Latent Gaussian model of 1-5 ratings estimated from the pilot study.
+
+    The latent score of reviewer r on the response of model m to question q is
+        sqrt(rho_q) a_q + sqrt(rho - rho_q) b_qm + sqrt(1 - rho) e_qmr + effect * mu_m
+    cut at the pooled score thresholds. rho is the correlation between two
+    reviewers of the same response, rho_q between responses of different
+    models to the same question, mu_m the latent location of model m.
+    effect = 1 reproduces the pilot's model differences, effect = 0 is the
+    null hypothesis.
+    """
+
+    def __init__(self, pilot, criteria=criteria, model_col='Model', question_col='Question',
+                 reviewer_col='Valutatore'):
+        long = pilot.melt(id_vars=[question_col, model_col, reviewer_col], value_vars=list(criteria),
+                          var_name='Criterion', value_name='Score').dropna(subset=['Score'])
+        self.models = list(pd.unique(long[model_col]))
+        self.n_reviewers = long[reviewer_col].nunique()
+        self.levels = np.arange(score_range[0], score_range[1] + 1)
+
+        # pooled thresholds on the latent scale, and each model's location
+        pooled = self._cumulative(long['Score'])
+        self.thresholds = norm_ppf(pooled)
+        locations = []
+        for model in self.models:
+            cumulative = np.clip(self._cumulative(long.loc[long[model_col] == model, 'Score']), 1e-3, 1 - 1e-3)
+            inside = (pooled > 0) & (pooled < 1)
+            locations.append(np.mean(self.thresholds[inside] - norm_ppf(cumulative[inside])))
+        self.locations = np.array(locations) - np.mean(locations)
+
+        # correlations, estimated on the score scale after removing model means
+        residual = long['Score'] - long.groupby([model_col, 'Criterion'])['Score'].transform('mean')
+        variance = (residual ** 2).mean()
+        same_sum, same_n = _pair_covariance(residual, [long[question_col], long[model_col], long['Criterion']])
+        question_sum, question_n = _pair_covariance(residual, [long[question_col], long['Criterion']])
+        self.rho = float(np.clip(same_sum / same_n / variance, 0, 1))
+        cross = (question_sum - same_sum) / (question_n - same_n) / variance
+        self.rho_question = float(np.clip(cross, 0, self.rho))
+
+    def _cumulative(self, scores):
+        # P(score <= level) for every level but the last
+        counts = pd.Series(scores).value_counts().reindex(self.levels, fill_value=0).to_numpy()
+        return np.cumsum(counts)[:-1] / counts.sum()
+
+    def simulate(self, rng, n_sim, n_questions, effect=1.0, n_reviewers=None):
+        """Ratings of n_sim studies -> int array [n_sim, questions, models, reviewers]."""
+        n_reviewers = n_reviewers or self.n_reviewers
+        n_models = len(self.models)
+        # single precision is plenty for a latent variable cut into 5 levels
+        latent = np.sqrt(1 - self.rho, dtype=np.float32) * rng.standard_normal(
+            (n_sim, n_questions, n_models, n_reviewers), dtype=np.float32)
+        latent += np.sqrt(self.rho - self.rho_question, dtype=np.float32) * rng.standard_normal(
+            (n_sim, n_questions, n_models, 1), dtype=np.float32)
+        latent += np.sqrt(self.rho_question, dtype=np.float32) * rng.standard_normal(
+            (n_sim, n_questions, 1, 1), dtype=np.float32)
+        latent += (effect * self.locations[:, None]).astype(np.float32)
+        index = np.zeros(latent.shape, dtype=np.int8)
+        for threshold in self.thresholds:
+            index += latent > threshold
+        return self.levels[0] + index
+
+    def summary(self):
+        return {
+            "Models": " / ".join(self.models),
+            "Latent locations": " / ".join(f"{mu:.3f}" for mu in self.locations),
+            "Inter-reviewer correlation": round(self.rho, 3),
+            "Within-question correlation": round(self.rho_question, 3),
+        }
+
+
+# ------------------------------
+# Batched tests (one statistic per simulated study)
+# ------------------------------
+
+def friedman_batch(blocks):
+    """Tie-corrected Friedman chi-square over [B, n blocks, k treatments] -> (Q, p)."""
+    n, k = blocks.shape[1], blocks.shape[2]
+    less = (blocks[..., None, :] < blocks[..., :, None]).sum(axis=-1)
+    equal = (blocks[..., None, :] == blocks[..., :, None]).sum(axis=-1)
+    ranks = less + (equal + 1) / 2
+    rank_sums = ranks.sum(axis=1)
+    q = 12 / (n * k * (k + 1)) * (rank_sums ** 2).sum(axis=1) - 3 * n * (k + 1)
+    # each member of a tie group of size t adds t^2 - 1, the group t^3 - t
+    ties = (equal ** 2 - 1).sum(axis=(1, 2))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        q = q / (1 - ties / (n * k * (k ** 2 - 1)))
+    return q, chi2_sf(q, k - 1)
+
+
+def kruskal_batch(counts):
+    """Tie-corrected Kruskal-Wallis H over count tables [B, groups, levels] -> (H, p)."""
+    counts = counts.astype(float)
+    totals = counts.sum(axis=1)
+    n = totals.sum(axis=1)
+    sizes = counts.sum(axis=2)
+    ranks = np.cumsum(totals, axis=1) - totals + (totals + 1) / 2
+    rank_sums = (counts * ranks[:, None, :]).sum(axis=2)
+    h = 12 / (n * (n + 1)) * (rank_sums ** 2 / sizes).sum(axis=1) - 3 * (n + 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        h = h / (1 - (totals ** 3 - totals).sum(axis=1) / (n ** 3 - n))
+    return h, chi2_sf(h, counts.shape[1] - 1)
+
+
+def _rejections(model, seed, n_sim, n_questions, effect, n_reviewers, alpha):
+    rng = np.random.default_rng(seed)
+    ratings = model.simulate(rng, n_sim, n_questions, effect, n_reviewers)
+    # Friedman: questions as blocks, reviewer-mean score per model (as in the
+    # pilot analysis); the reviewer sum ranks the same and stays integer
+    _, p_friedman = friedman_batch(ratings.sum(axis=3, dtype=np.int16))
+    # Kruskal-Wallis: every rating, grouped by model (as in the main analysis)
+    n_models, n_levels = ratings.shape[2], len(model.levels)
+    cell = (np.arange(n_sim)[:, None, None, None] * n_models + np.arange(n_models)[:, None]) * n_levels
+    counts = np.bincount((cell + ratings - model.levels[0]).ravel(), minlength=n_sim * n_models * n_levels)
+    counts = counts.reshape(n_sim, n_models, n_levels)
+    _, p_kruskal = kruskal_batch(counts)
+    return int(np.sum(p_friedman < alpha)), int(np.sum(p_kruskal < alpha))
+
+
+def _run_cell(task):
+    model, cell, seeds, sizes, args = task
+    friedman = kruskal = 0
+    for seed, size in zip(seeds, sizes):
+        f, k = _rejections(model, seed, size, *args)
+        friedman += f
+        kruskal += k
+    return cell, friedman, kruskal
+
+
+# ------------------------------
+# Power grid
+# ------------------------------
+
+@profiled()
+def power_grid(model, sample_sizes=range(10, 101, 10), effects=(0.0, 0.5, 1.0, 1.5, 2.0),
+               n_sim=2000, alpha=0.05, n_reviewers=None, seed=None, workers=None):
+    """Monte Carlo rejection rates of Friedman and Kruskal-Wallis for every (questions, effect) cell.
+
+    `model` is a PilotModel; sample sizes are questions per model (each
+    answered by every model and rated by every reviewer). Every cell gets its
+    own child seed, so results do not depend on the number of workers.
+    Rows with effect 0 estimate the type I error, the others the power.
+    """
+    cells = [(n, effect) for n in sample_sizes for effect in effects]
+    children = np.random.SeedSequence(seed).spawn(len(cells))
+    sizes = [min(BATCH_SIZE, n_sim - start) for start in range(0, n_sim, BATCH_SIZE)]
+    tasks = [
+        (model, (n, effect), child.spawn(len(sizes)), sizes, (n, effect, n_reviewers, alpha))
+        for (n, effect), child in zip(cells, children)
+    ]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(tasks) == 1:
+        results = list(map(_run_cell, tasks))
+    else:
+        with ProcessPoolExecutor(min(workers, len(tasks))) as pool:
+            results = list(pool.map(_run_cell, tasks))
+
+    rows = []
+    for (n, effect), friedman, kruskal in results:
+        rows.append({
+            "Questions": n,
+            "Effect scale": effect,
+            "Estimate": "Type I error" if effect == 0 else "Power",
+            "Friedman": friedman / n_sim,
+            # ignores the clustering of ratings by reviewer and question
+            "Kruskal-Wallis (anticonservative)": kruskal / n_sim,
+            "Simulations": n_sim,
+        })
+    return pd.DataFrame(rows)
+
+
+def required_size(grid, test="Friedman", target=0.8):
+    """Smallest simulated number of questions reaching `target` power, per (non-zero) effect scale."""
+    power = grid[grid["Estimate"] == "Power"]
+    reached = power[power[test] >= target]
+    return reached.groupby("Effect scale")["Questions"].min().reindex(pd.unique(power["Effect scale"]))
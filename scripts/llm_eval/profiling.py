@@ -0,0 +1,255 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Profiling spans
+# Michele Danilo Pierri MD PhD
+# Purpose: Named, nestable spans around the analysis steps recording wall
+#          time, CPU time, peak traced memory and row counts. Off by
+#          default (a span is then a shared no-op); switched on by the
+#          LLM_EVAL_PROFILE environment variable (1 or the trace path) or
+#          by the pipeline's --profile flag. At exit a JSON trace
+#          (Chrome/Perfetto trace-event format, plus a per-span summary)
+#          is written and the summary table is printed.
+# Usage:   LLM_EVAL_PROFILE=trace.json python 3_Statistical_Analysis.py
+#          python -m llm_eval.profiling old_trace.json new_trace.json
+# ------------------------------------------------------------
+
+import atexit
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from functools import wraps
+
+import numpy
+import pandas as pd
+
+ENV_VAR = "LLM_EVAL_PROFILE"
+DEFAULT_TRACE = "profile_trace.json"
+
+
+class _NullSpan:
+    """What span() returns when profiling is off."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **fields):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """Collects finished spans of this process."""
+
+    def __init__(self):
+        self.records = []
+        self.stack = []
+
+    def drain(self):
+        """Return and forget the finished spans (used to ship worker spans to the parent)."""
+        records, self.records = self.records, []
+        return records
+
+
+class Span:
+    def __init__(self, tracer, name, rows=None, **fields):
+        self.tracer = tracer
+        self.name = name
+        self.fields = dict(fields)
+        if rows is not None:
+            self.fields["rows"] = int(rows)
+
+    def set(self, **fields):
+        """Attach values known only inside the span, e.g. span.set(rows=len(df))."""
+        self.fields.update({k: int(v) if k == "rows" else v for k, v in fields.items()})
+
+    def __enter__(self):
+        stack = self.tracer.stack
+        self.path = "/".join([frame.name for frame in stack] + [self.name])
+        if stack:
+            # fold the peak measured so far into the enclosing span before resetting it
+            stack[-1].peak = max(stack[-1].peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        self.peak = 0
+        stack.append(self)
+        self.epoch = time.time()  # comparable across worker processes
+        self.start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.start
+        cpu = time.process_time() - self.cpu_start
+        self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+        stack = self.tracer.stack
+        stack.pop()
+        if stack:
+            stack[-1].peak = max(stack[-1].peak, self.peak)
+        tracemalloc.reset_peak()
+        self.tracer.records.append({
+            "name": self.name,
+            "path": self.path,
+            "pid": os.getpid(),
+            "start": self.epoch,
+            "wall": wall,
+            "cpu": cpu,
+            "peak_mb": self.peak / 2 ** 20,
+            **self.fields,
+        })
+        return False
+
+
+_tracer = None
+_trace_path = None
+_exit_hook = False
+
+
+def enabled():
+    return _tracer is not None
+
+
+def enable(path=DEFAULT_TRACE, write_at_exit=True):
+    """Turn profiling on for this process (and, through the environment, its workers)."""
+    global _tracer, _trace_path, _exit_hook
+    if _tracer is None:
+        _tracer = Tracer()
+        tracemalloc.start()
+    _trace_path = path
+    os.environ[ENV_VAR] = path
+    if write_at_exit and not _exit_hook:
+        atexit.register(_write_at_exit)
+        _exit_hook = True
+
+
+def span(name, rows=None, **fields):
+    """Context manager timing a named step: `with span("melt") as s: ...; s.set(rows=n)`."""
+    if _tracer is None:
+        return _NULL_SPAN
+    return Span(_tracer, name, rows, **fields)
+
+
+def profiled(name=None):
+    """Decorator wrapping every call of a function in a span.
+
+    The row count recorded is the length of the first argument (the ratings
+    table for the stages, the sample for the tests), when it has one.
+    """
+    def decorate(func):
+        label = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            rows = len(args[0]) if args and hasattr(args[0], "__len__") else None
+            with span(label, rows=rows):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def drain():
+    return _tracer.drain() if _tracer is not None else []
+
+
+def merge(records):
+    """Add spans recorded in a worker process to this process's trace."""
+    if _tracer is not None:
+        _tracer.records.extend(records)
+
+
+# ------------------------------
+# Output
+# ------------------------------
+
+def summary(records=None):
+    """Per-span-path totals: calls, wall and CPU seconds, peak MB, rows."""
+    records = _tracer.records if records is None else records
+    if not records:
+        return pd.DataFrame(columns=["Span", "Calls", "Wall (s)", "CPU (s)", "Peak MB", "Rows"])
+    df = pd.DataFrame(records)
+    if "rows" not in df:
+        df["rows"] = pd.NA
+    table = df.groupby("path", sort=False).agg(
+        Calls=("wall", "size"), Wall=("wall", "sum"), CPU=("cpu", "sum"),
+        Peak=("peak_mb", "max"), Rows=("rows", "sum"),
+    ).reset_index()
+    table.columns = ["Span", "Calls", "Wall (s)", "CPU (s)", "Peak MB", "Rows"]
+    return table.sort_values("Wall (s)", ascending=False).round(4).reset_index(drop=True)
+
+
+def write_trace(path, records=None):
+    """JSON trace: Chrome trace events (open in Perfetto / chrome://tracing) + summary + metadata."""
+    records = _tracer.records if records is None else records
+    origin = min((rec["start"] for rec in records), default=0)
+    events = [{
+        "name": rec["name"], "ph": "X", "pid": rec["pid"], "tid": rec["pid"],
+        "ts": round((rec["start"] - origin) * 1e6, 1), "dur": round(rec["wall"] * 1e6, 1),
+        "args": {k: v for k, v in rec.items() if k not in ("name", "pid", "start")},
+    } for rec in records]
+    trace = {
+        "traceEvents": events,
+        "summary": summary(records).to_dict("records"),
+        "metadata": {
+            "argv": sys.argv,
+            "python": platform.python_version(),
+            "numpy": numpy.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "written": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+    }
+    with open(path, "w") as fh:
+        json.dump(trace, fh, indent=1, default=str)
+    return path
+
+
+def report(path=None):
+    """Print the summary table and write the trace; returns the summary."""
+    table = summary()
+    print(table.to_string(index=False))
+    write_trace(path or _trace_path)
+    print(f"Profile trace written to {path or _trace_path}")
+    return table
+
+
+def _write_at_exit():
+    if _tracer is not None and _tracer.records:
+        report()
+
+
+def compare(old_path, new_path):
+    """Wall time per span of two traces, e.g. before and after a change."""
+    def load(path):
+        with open(path) as fh:
+            return pd.DataFrame(json.load(fh)["summary"]).set_index("Span")["Wall (s)"]
+    table = pd.concat([load(old_path).rename("Old (s)"), load(new_path).rename("New (s)")], axis=1)
+    table["Ratio"] = table["New (s)"] / table["Old (s)"]
+    return table.sort_values("Old (s)", ascending=False).round(4)
+
+
+# worker processes inherit the variable but hand their spans back to the
+# parent (see pipeline._run_stage), so only the main process writes a trace
+if os.environ.get(ENV_VAR) and _tracer is None:
+    _value = os.environ[ENV_VAR]
+    enable(DEFAULT_TRACE if _value == "1" else _value,
+           write_at_exit=multiprocessing.parent_process() is None)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        sys.exit("usage: python -m llm_eval.profiling OLD_TRACE.json NEW_TRACE.json")
+    print(compare(argv[0], argv[1]).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Rank statistics from count tables
+# Michele Danilo Pierri MD PhD
+# Purpose: Tie-aware Kruskal-Wallis H, Mann-Whitney U and Dunn z-scores
+#          computed from per-group counts over the discrete score levels
+#          (1-5 Likert, or reviewer means) instead of ranking full vectors.
+#          Each test costs O(groups x levels); results match
+#          scipy.stats.kruskal, scipy.stats.mannwhitneyu (asymptotic) and
+#          scikit_posthocs.posthoc_dunn. The Jonckheere-Terpstra trend
+#          test across ordered groups matches the p-value of
+#          scipy.stats.kendalltau between group index and score.
+# ------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+
+from llm_eval.distributions import chi2_sf, norm_sf
+from llm_eval.multiplicity import adjust
+from llm_eval.profiling import profiled
+
+
+def count_table(values, groups, group_order=None, levels=None):
+    """Counts of each score level per group -> (counts[G, L], levels, group names).
+
+    NaN scores are dropped, as in the SciPy tests with nan_policy='omit'.
+    """
+    values = np.asarray(values, dtype=float)
+    groups = np.asarray(groups)
+    keep = ~np.isnan(values)
+    values, groups = values[keep], groups[keep]
+    if group_order is None:
+        group_order = pd.unique(groups)
+    if levels is None:
+        levels = np.unique(values)
+    group_idx = pd.Index(group_order).get_indexer(groups)
+    level_idx = np.searchsorted(levels, values)
+    inside = group_idx >= 0
+    counts = np.zeros((len(group_order), len(levels)), dtype=np.int64)
+    np.add.at(counts, (group_idx[inside], level_idx[inside]), 1)
+    return counts, np.asarray(levels), list(group_order)
+
+
+def counts_of(*samples, levels=None):
+    """Count table for a list of samples, one row per sample."""
+    values = np.concatenate([np.asarray(s, dtype=float) for s in samples])
+    groups = np.repeat(np.arange(len(samples)), [len(s) for s in samples])
+    counts, levels, _ = count_table(values, groups, list(range(len(samples))), levels)
+    return counts, levels
+
+
+def midranks(totals):
+    """Average rank of each level given the pooled count per level."""
+    totals = np.asarray(totals, dtype=float)
+    before = np.cumsum(totals) - totals
+    return before + (totals + 1) / 2
+
+
+def tie_sum(totals):
+    totals = np.asarray(totals, dtype=float)
+    return np.sum(totals ** 3 - totals)
+
+
+def kruskal_counts(counts):
+    """Kruskal-Wallis H (tie corrected) and p-value from a groups x levels count table.
+
+    Groups without scores are left out of the test.
+    """
+    counts = np.asarray(counts, dtype=float)
+    counts = counts[counts.sum(axis=1) > 0]
+    totals = counts.sum(axis=0)
+    n = totals.sum()
+    sizes = counts.sum(axis=1)
+    rank_sums = counts @ midranks(totals)
+    h = 12.0 / (n * (n + 1)) * np.sum(rank_sums ** 2 / sizes) - 3 * (n + 1)
+    ties = 1 - tie_sum(totals) / (n ** 3 - n)
+    h = h / ties if ties > 0 else np.nan
+    return h, chi2_sf(h, len(sizes) - 1)
+
+
+def mannwhitney_counts(counts1, counts2, use_continuity=True):
+    """Two-sided Mann-Whitney U of sample 1 and asymptotic p-value (tie corrected)."""
+    c1 = np.asarray(counts1, dtype=float)
+    c2 = np.asarray(counts2, dtype=float)
+    totals = c1 + c2
+    n1, n2 = c1.sum(), c2.sum()
+    n = n1 + n2
+    u1 = c1 @ midranks(totals) - n1 * (n1 + 1) / 2
+    u = max(u1, n1 * n2 - u1)
+    mu = n1 * n2 / 2
+    sigma = np.sqrt(n1 * n2 / 12 * ((n + 1) - tie_sum(totals) / (n * (n - 1))))
+    z = (u - mu - (0.5 if use_continuity else 0)) / sigma
+    return u1, min(1.0, 2 * norm_sf(z))
+
+
+def dunn_counts(counts, groups=None, p_adjust='bonferroni'):
+    """Dunn's pairwise z-test p-values (square DataFrame, like posthoc_dunn)."""
+    counts = np.asarray(counts, dtype=float)
+    g = len(counts)
+    groups = list(range(g)) if groups is None else list(groups)
+    totals = counts.sum(axis=0)
+    n = totals.sum()
+    sizes = counts.sum(axis=1)
+    mean_ranks = counts @ midranks(totals) / sizes
+
+    i, j = np.triu_indices(g, 1)
+    variance = n * (n + 1) / 12 - tie_sum(totals) / (12 * (n - 1))
+    z = np.abs(mean_ranks[i] - mean_ranks[j]) / np.sqrt(variance * (1 / sizes[i] + 1 / sizes[j]))
+    p = 2 * norm_sf(z)
+    if p_adjust:
+        p = adjust(p, p_adjust)
+
+    out = np.ones((g, g))
+    out[i, j] = p
+    out[j, i] = p
+    return pd.DataFrame(out, index=groups, columns=groups)
+
+
+def jonckheere_counts(counts):
+    """Jonckheere-Terpstra statistic, z and two-sided p-value (tie corrected) for groups in increasing order.
+
+    The statistic counts the pairs of an earlier and a later group in
+    which the later score is higher (ties count one half).
+    """
+    counts = np.asarray(counts, dtype=float)
+    below = np.cumsum(counts, axis=1) - counts
+    # pairs[j, i]: scores of group j above those of group i
+    pairs = counts @ (below + counts / 2).T
+    jt = np.tril(pairs, -1).sum()
+
+    sizes = counts.sum(axis=1)
+    totals = counts.sum(axis=0)
+    n = sizes.sum()
+    mean = (n ** 2 - np.sum(sizes ** 2)) / 4
+    variance = ((n * (n - 1) * (2 * n + 5)
+                 - np.sum(sizes * (sizes - 1) * (2 * sizes + 5))
+                 - np.sum(totals * (totals - 1) * (2 * totals + 5))) / 72
+                + np.sum(sizes * (sizes - 1) * (sizes - 2)) * np.sum(totals * (totals - 1) * (totals - 2))
+                / (36 * n * (n - 1) * (n - 2))
+                + np.sum(sizes * (sizes - 1)) * np.sum(totals * (totals - 1)) / (8 * n * (n - 1)))
+    if variance <= 0:
+        return jt, np.nan, np.nan
+    z = (jt - mean) / np.sqrt(variance)
+    return jt, z, min(1.0, 2 * norm_sf(abs(z)))
+
+
+# drop-in replacements taking raw samples, for callers that have score vectors
+
+def kruskal(*samples):
+    counts, _ = counts_of(*samples)
+    return kruskal_counts(counts)
+
+
+def mannwhitneyu(x, y, alternative='two-sided'):
+    if alternative != 'two-sided':
+        raise ValueError("only alternative='two-sided' is supported")
+    counts, _ = counts_of(x, y)
+    return mannwhitney_counts(counts[0], counts[1])
+
+
+@profiled()
+def posthoc_dunn(data, val_col, group_col, group_order=None, p_adjust='bonferroni'):
+    counts, _, groups = count_table(data[val_col], data[group_col], group_order)
+    return dunn_counts(counts, groups, p_adjust)
@@ -0,0 +1,157 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Compact ratings table
+# Michele Danilo Pierri MD PhD
+# Purpose: Hold the long ratings table as small-integer category codes
+#          (one lookup table per dimension) and int8 scores with a
+#          missing-value sentinel, with the rows sorted by Criterion and
+#          Model so that every (Criterion, Model) group is a contiguous
+#          slice: group selections are views, not filtered copies.
+#          The table converts back to the pandas long table, in the
+#          original row order, for the code that works on DataFrames.
+# ------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+
+from llm_eval.data import long_columns
+from llm_eval.profiling import span
+
+MISSING = np.int8(-1)
+rating_dims = ["Request", "Model", "Origin", "Diagnosis", "Criterion", "Reviewer"]
+
+
+def code_dtype(n_categories):
+    """Smallest signed integer type holding the codes of n categories."""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+class RatingTable:
+    """Long ratings as category codes and int8 scores, grouped by (Criterion, Model).
+
+    codes[dim] are indices into categories[dim]; scores are the 1-5 ratings
+    with MISSING for empty cells; position is each row's index in the
+    source DataFrame. Build it with RatingTable.from_long(df_long).
+    """
+
+    def __init__(self, codes, categories, scores, position, dtypes, bounds):
+        self.codes = codes
+        self.categories = categories
+        self.scores = scores
+        self.position = position
+        self.dtypes = dtypes
+        # (criterion code, model code) -> (start, stop) in this table's rows
+        self.bounds = bounds
+
+    @classmethod
+    def from_long(cls, df_long, order=None):
+        """Encode a long ratings DataFrame.
+
+        `order` maps a dimension to the labels to place first (e.g. the
+        study's criteria and models); other labels follow in order of
+        appearance.
+        """
+        order = order or {}
+        with span("RatingTable", rows=len(df_long)):
+            categories, raw = {}, {}
+            for dim in rating_dims:
+                code, cats = pd.factorize(df_long[dim], sort=False)
+                first = [label for label in order.get(dim, []) if label in cats]
+                if first:
+                    # re-number the codes so that the given labels come first
+                    new = pd.Index(first + [label for label in cats if label not in first])
+                    code = new.get_indexer(cats)[code]
+                    cats = new
+                categories[dim] = pd.Index(cats)
+                raw[dim] = code
+
+            values = df_long["Score"].to_numpy(dtype=float)
+            missing = np.isnan(values)
+            if (values[~missing] != np.round(values[~missing])).any():
+                raise ValueError("scores must be whole numbers to be stored as int8")
+            scores = np.where(missing, MISSING, values).astype(np.int8)
+
+            # stable sort by (Criterion, Model); rows of a group keep their source order
+            position = np.lexsort((raw["Model"], raw["Criterion"])).astype(code_dtype(len(df_long)))
+            codes = {dim: raw[dim][position].astype(code_dtype(len(categories[dim]))) for dim in rating_dims}
+            scores = scores[position]
+
+            n_models = len(categories["Model"])
+            key = codes["Criterion"].astype(np.int64) * n_models + codes["Model"]
+            starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]]) if len(key) else np.array([], dtype=int)
+            stops = np.r_[starts[1:], len(key)]
+            bounds = {divmod(int(key[start]), n_models): (int(start), int(stop))
+                      for start, stop in zip(starts, stops)}
+            dtypes = {dim: df_long[dim].dtype for dim in rating_dims + ["Score"]}
+        return cls(codes, categories, scores, position, dtypes, bounds)
+
+    def __len__(self):
+        return len(self.scores)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the row arrays (the lookup tables are negligible)."""
+        return sum(code.nbytes for code in self.codes.values()) + self.scores.nbytes + self.position.nbytes
+
+    # ------------------------------
+    # Group views
+    # ------------------------------
+
+    def _span(self, criterion, model=None):
+        c = self.categories["Criterion"].get_loc(criterion)
+        if model is not None:
+            return self.bounds.get((c, self.categories["Model"].get_loc(model)), (0, 0))
+        # the models of a criterion are adjacent
+        rows = [rows for (crit, _), rows in self.bounds.items() if crit == c]
+        return (min(r[0] for r in rows), max(r[1] for r in rows)) if rows else (0, 0)
+
+    def group(self, criterion, model=None):
+        """The rows of one Criterion (and Model) as a RatingTable of views on this one."""
+        start, stop = self._span(criterion, model)
+        window = slice(start, stop)
+        bounds = {key: (a - start, b - start) for key, (a, b) in self.bounds.items() if start <= a and b <= stop}
+        return RatingTable({dim: code[window] for dim, code in self.codes.items()}, self.categories,
+                           self.scores[window], self.position[window], self.dtypes, bounds)
+
+    def group_scores(self, criterion, model=None):
+        """int8 scores of a group, a view including MISSING entries."""
+        start, stop = self._span(criterion, model)
+        return self.scores[start:stop]
+
+    def _decode(self, scores):
+        # back to the source dtype (int64 when no score is missing), NaN for MISSING
+        missing = scores == MISSING
+        if missing.any() or not np.issubdtype(self.dtypes["Score"], np.integer):
+            return np.where(missing, np.nan, scores)
+        return scores.astype(self.dtypes["Score"])
+
+    def values(self, criterion, model=None):
+        """Scores of a group as a Series named Score, with the source dtype (as in the long table)."""
+        return pd.Series(self._decode(self.group_scores(criterion, model)), name="Score")
+
+    # ------------------------------
+    # Back to pandas
+    # ------------------------------
+
+    def labels(self, dim):
+        """Label of every row for one dimension."""
+        return self.categories[dim].take(self.codes[dim])
+
+    def to_pandas(self, categorical=False):
+        """The long ratings DataFrame, rows in source order.
+
+        With categorical=True the dimensions are pandas Categoricals over
+        the same codes instead of the source dtypes.
+        """
+        order = np.argsort(self.position, kind="stable")
+        columns = {}
+        for dim in rating_dims:
+            codes = self.codes[dim][order]
+            if categorical:
+                columns[dim] = pd.Categorical.from_codes(codes, self.categories[dim])
+            else:
+                columns[dim] = pd.Series(self.categories[dim].take(codes), dtype=self.dtypes[dim])
+        columns["Score"] = self._decode(self.scores[order])
+        return pd.DataFrame(columns)[long_columns]
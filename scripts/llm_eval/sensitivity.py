@@ -0,0 +1,177 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Sensitivity engine
+# Michele Danilo Pierri MD PhD
+# Purpose: Leave-k-reviewers-out and leave-one-request-out (jackknife)
+#          re-analysis of the Kruskal-Wallis test between models.
+#          Per-reviewer score matrices are built once per criterion; each
+#          reduced mean is obtained by subtracting the excluded reviewers
+#          from running totals, and combinations are spread over a
+#          process pool.
+# ------------------------------------------------------------
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from llm_eval.profiling import profiled
+from llm_eval.rankstats import count_table, kruskal_counts
+from llm_eval.ratings import MISSING
+
+# below this many reanalyses a process pool costs more than it saves
+MIN_PARALLEL_TASKS = 64
+
+
+class ScoreMatrices:
+    """Per-criterion response x reviewer score matrices with running totals."""
+
+    def __init__(self, df_long, criteria=None, reviewers=None):
+        criteria = criteria or list(pd.unique(df_long['Criterion']))
+        reviewers = reviewers or list(pd.unique(df_long['Reviewer']))
+        self.criteria = criteria
+        self.reviewers = reviewers
+        self.sums = {}
+        self.present = {}
+        self.models = {}
+        self.requests = {}
+        for crit in criteria:
+            wide = (df_long[df_long['Criterion'] == crit]
+                    .pivot_table(index=['Request', 'Model'], columns='Reviewer',
+                                 values='Score', aggfunc='mean')
+                    .reindex(columns=reviewers))
+            scores = wide.to_numpy(dtype=float)
+            self.present[crit] = ~np.isnan(scores)
+            self.sums[crit] = np.nan_to_num(scores)
+            self.models[crit] = wide.index.get_level_values('Model').to_numpy()
+            self.requests[crit] = wide.index.get_level_values('Request').to_numpy()
+        self.model_order = list(pd.unique(df_long['Model']))
+        self.tensor = None
+
+    @classmethod
+    def from_tensor(cls, tensor, criteria=None, reviewers=None):
+        """Same matrices from a ScoreTensor, rows in the order of the pivot of __init__."""
+        self = cls.__new__(cls)
+        self.tensor = tensor
+        self.criteria = criteria or list(tensor.criteria)
+        self.reviewers = reviewers or list(tensor.reviewers)
+        self.sums, self.present, self.models, self.requests = {}, {}, {}, {}
+        requests = tensor.responses['Request'].to_numpy()
+        models = tensor.responses['Model'].to_numpy()
+        order = np.lexsort((models, requests))
+        columns = [tensor.reviewers.index(reviewer) for reviewer in self.reviewers]
+        for crit in self.criteria:
+            scores = np.asarray(tensor.slice(crit))[order][:, columns]
+            present = scores != MISSING
+            # like pivot_table, responses without any score are left out
+            rated = present.any(axis=1)
+            self.present[crit] = present[rated]
+            self.sums[crit] = np.where(present, scores, 0).astype(float)[rated]
+            self.models[crit] = models[order][rated]
+            self.requests[crit] = requests[order][rated]
+        self.model_order = list(tensor.models)
+        return self
+
+    def __reduce__(self):
+        if self.tensor is not None and self.tensor.path is not None:
+            # pool workers rebuild the matrices from the memory-mapped tensor
+            return (ScoreMatrices.from_tensor, (self.tensor, self.criteria, self.reviewers))
+        return object.__reduce__(self)
+
+    def kruskal(self, crit, excluded_reviewers=(), excluded_requests=()):
+        """Kruskal-Wallis H and p on reviewer means with the given exclusions."""
+        sums, present = self.sums[crit], self.present[crit]
+        total = sums.sum(axis=1)
+        count = present.sum(axis=1)
+        if excluded_reviewers:
+            cols = [self.reviewers.index(r) for r in excluded_reviewers]
+            total = total - sums[:, cols].sum(axis=1)
+            count = count - present[:, cols].sum(axis=1)
+        keep = count > 0
+        if excluded_requests:
+            keep &= ~np.isin(self.requests[crit], list(excluded_requests))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = total / count
+        counts, _, _ = count_table(means[keep], self.models[crit][keep], self.model_order)
+        return kruskal_counts(counts)
+
+
+# process-pool plumbing: the matrices are shipped once per worker
+
+_worker_matrices = None
+
+
+def _init_worker(matrices):
+    global _worker_matrices
+    _worker_matrices = matrices
+
+
+def _run_batch(batch):
+    rows = []
+    for kind, excluded in batch:
+        for crit in _worker_matrices.criteria:
+            if kind == 'reviewers':
+                stat, p = _worker_matrices.kruskal(crit, excluded_reviewers=excluded)
+            else:
+                stat, p = _worker_matrices.kruskal(crit, excluded_requests=excluded)
+            rows.append((kind, excluded, crit, stat, p))
+    return rows
+
+
+def _execute(matrices, tasks, workers):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(tasks) < MIN_PARALLEL_TASKS:
+        _init_worker(matrices)
+        return _run_batch(tasks)
+    size = max(1, len(tasks) // (workers * 4))
+    batches = [tasks[i:i + size] for i in range(0, len(tasks), size)]
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(matrices,)) as pool:
+        return [row for rows in pool.map(_run_batch, batches) for row in rows]
+
+
+def _result_row(label, key, k, crit, stat, p):
+    return {
+        label: key,
+        'Criterion': crit,
+        'Kruskal-Wallis H': round(stat, 3),
+        # unrounded, so the stage can register it with the test family before rounding
+        'p-value': p,
+        'Significant (p < 0.05)': p < 0.05,
+        'k': k,
+    }
+
+
+@profiled()
+def leave_k_out(df_long, k_values=(1,), criteria=None, reviewers=None, workers=None, matrices=None):
+    """Kruskal-Wallis between models for every set of k excluded reviewers.
+
+    Same columns as sensitivity_analysis.csv plus 'k'; 'Excluded Reviewer'
+    lists the excluded set joined with ' + '.
+    """
+    matrices = matrices or ScoreMatrices(df_long, criteria, reviewers)
+    tasks = [('reviewers', excluded)
+             for k in k_values
+             for excluded in combinations(matrices.reviewers, k)]
+    rows = _execute(matrices, tasks, workers)
+    return pd.DataFrame([
+        _result_row('Excluded Reviewer', ' + '.join(excluded), len(excluded), crit, stat, p)
+        for _, excluded, crit, stat, p in rows
+    ])
+
+
+@profiled()
+def jackknife_requests(df_long, criteria=None, reviewers=None, workers=None, matrices=None):
+    """Kruskal-Wallis between models leaving out one Request (all its model answers) at a time."""
+    matrices = matrices or ScoreMatrices(df_long, criteria, reviewers)
+    requests = pd.unique(np.concatenate([matrices.requests[c] for c in matrices.criteria]))
+    tasks = [('requests', (request,)) for request in requests]
+    rows = _execute(matrices, tasks, workers)
+    # requests only present in other criteria leave this one unchanged
+    rated = {crit: set(matrices.requests[crit]) for crit in matrices.criteria}
+    return pd.DataFrame([
+        _result_row('Excluded Request', excluded[0], 1, crit, stat, p)
+        for _, excluded, crit, stat, p in rows
+        if excluded[0] in rated[crit]
+    ])
@@ -0,0 +1,288 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Local query service
+# Michele Danilo Pierri MD PhD
+# Purpose: A small HTTP service for exploring the results without
+#          editing scripts. The ratings are loaded once at startup into an
+#          aggregation cube (see llm_eval/cube.py) and per-criterion
+#          reviewer panels; each request is answered in a worker thread of
+#          an asyncio server, and results are memoized in an LRU cache
+#          keyed by the normalized query, so repeated dashboard refreshes
+#          are served without recomputing. Concurrent identical requests
+#          share one computation.
+# Usage:   python -m llm_eval.service [2_Data.xlsx] [--port 8050]
+#          GET /describe?model=Claude&criterion=Accuracy&origin=Patient
+#          GET /kruskal?criterion=Clarity[&between=Model&diagnosis=Pre]
+#          GET /kappa?criterion=Accuracy&a=Reviewer1&b=Reviewer2[&weights=linear]
+#          GET /figure_1.png[?origin=Doctor&diagnosis=Post]
+#          GET /cache (hits, misses, size)
+# ------------------------------------------------------------
+
+import asyncio
+import io
+import json
+import math
+import threading
+from collections import OrderedDict
+from itertools import combinations
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+from llm_eval.agreement import weighted_kappa
+from llm_eval.cube import ScoreCube, cube_dims
+from llm_eval.data import load_ratings, to_wide
+from llm_eval.rankstats import dunn_counts, kruskal_counts
+from llm_eval.stages import criteria, describe
+
+DEFAULT_PORT = 8050
+DEFAULT_CACHE_SIZE = 256
+
+# query parameter -> cube dimension
+filter_params = {dim.lower(): dim for dim in cube_dims}
+
+
+class QueryCache:
+    """LRU cache of query results; computations run in the event loop's thread pool."""
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._results)
+
+    async def get(self, key, compute):
+        if key in self._results:
+            self.hits += 1
+            self._results.move_to_end(key)
+            return self._results[key]
+        if key in self._pending:
+            # the same query is already being computed: wait for it
+            self.hits += 1
+            return await asyncio.shield(self._pending[key])
+        self.misses += 1
+        future = asyncio.get_running_loop().run_in_executor(None, compute)
+        self._pending[key] = future
+        try:
+            result = await future
+        finally:
+            del self._pending[key]
+        # failed queries raise above and are not cached
+        self._results[key] = result
+        if len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+        return result
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self), "maxsize": self.maxsize}
+
+
+def _jsonable(value):
+    if isinstance(value, dict):
+        return {str(key): _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    if isinstance(value, (np.integer, np.bool_)):
+        return value.item()
+    if isinstance(value, (float, np.floating)):
+        return None if math.isnan(value) else float(value)
+    return value
+
+
+class AnalysisService:
+    """The queries of the service, answered from data loaded once."""
+
+    def __init__(self, df_long, cache_size=DEFAULT_CACHE_SIZE):
+        self.df_long = df_long
+        self.cube = ScoreCube(df_long)
+        # responses x reviewers score table of each criterion, for kappa
+        wide = to_wide(df_long)
+        self.panels = {crit: group.drop(columns="Criterion").reset_index(drop=True)
+                       for crit, group in wide.groupby("Criterion", sort=False)}
+        self.cache = QueryCache(cache_size)
+        self.routes = {
+            "/describe": self.describe,
+            "/kruskal": self.kruskal,
+            "/kappa": self.kappa,
+            "/figure_1.png": self.figure_1,
+        }
+        # matplotlib's pyplot state is global: one figure is drawn at a time
+        self._figure_lock = threading.Lock()
+
+    def _where(self, params, allowed=cube_dims):
+        where = {}
+        for name, value in params.items():
+            dim = filter_params.get(name)
+            if dim is None or dim not in allowed:
+                continue
+            if value not in self.cube.labels[dim]:
+                raise ValueError(f"unknown {dim} {value!r}; available: {self.cube.labels[dim]}")
+            where[dim] = value
+        return where
+
+    # ------------------------------
+    # Queries (run in worker threads)
+    # ------------------------------
+
+    def describe(self, params):
+        """N, Mean, Median, SD and IQR of a slice (as in stat_analysis_descriptive)."""
+        where = self._where(params)
+        return {**where, **describe(self.cube.values(**where))}
+
+    def kruskal(self, params):
+        """Kruskal-Wallis across the levels of `between` (default Model), with Dunn's pairwise tests."""
+        between = params.get("between", "Model").capitalize()
+        if between not in cube_dims:
+            raise ValueError(f"between must be one of {cube_dims}")
+        where = self._where(params, [dim for dim in cube_dims if dim != between])
+        counts, (groups,) = self.cube.histogram([between], **where)
+        rated = counts.sum(axis=1) > 0
+        counts, groups = counts[rated], [group for group, keep in zip(groups, rated) if keep]
+        if len(groups) < 2:
+            raise ValueError(f"fewer than two {between} levels are rated in this slice")
+        h, p = kruskal_counts(counts)
+        dunn = dunn_counts(counts, groups, p_adjust="bonferroni")
+        return {**where, "between": between, "N": int(counts.sum()), "H-statistic": h, "p-value": p,
+                "dunn": [{"A": a, "B": b, "p-value (Bonferroni)": dunn.loc[a, b]}
+                         for a, b in combinations(groups, 2)]}
+
+    def kappa(self, params):
+        """Weighted kappa of two reviewers on the responses both rated in a criterion."""
+        crit = params.get("criterion")
+        if crit not in self.panels:
+            raise ValueError(f"criterion must be one of {list(self.panels)}")
+        panel = self.panels[crit]
+        pair = [params.get("a"), params.get("b")]
+        for reviewer in pair:
+            if reviewer not in panel.columns or not str(reviewer).startswith("Reviewer"):
+                raise ValueError(f"unknown reviewer {reviewer!r}; available: {self.cube.labels['Reviewer']}")
+        weights = params.get("weights", "quadratic")
+        if weights not in ("linear", "quadratic"):
+            raise ValueError("weights must be 'linear' or 'quadratic'")
+        where = self._where(params, ["Model", "Origin", "Diagnosis"])
+        keep = panel[pair].notna().all(axis=1)
+        for dim, value in where.items():
+            keep &= panel[dim] == value
+        rows = panel.loc[keep, pair].to_numpy()
+        return {"Criterion": crit, **where, "Reviewer Pair": f"{pair[0]} vs {pair[1]}", "Weights": weights,
+                "N": len(rows), "Weighted Kappa": weighted_kappa(rows[:, 0], rows[:, 1], weights)}
+
+    def figure_1(self, params):
+        """Figure 1 (mean score per model and criterion, ± SD) of a slice, as PNG bytes."""
+        import matplotlib.pyplot as plt
+
+        from llm_eval.figures import draw_figure_1, figure_1_data, row_summary
+
+        where = self._where(params, ["Origin", "Diagnosis"])
+        subset = self.df_long
+        for dim, value in where.items():
+            subset = subset[subset[dim] == value]
+        data = figure_1_data(row_summary(subset))
+        buffer = io.BytesIO()
+        with self._figure_lock, plt.rc_context():
+            draw_figure_1(data)
+            if where:
+                plt.title(", ".join(where.values()))
+            plt.gcf().savefig(buffer, format="png", dpi=int(params.get("dpi", 100)))
+            plt.close(plt.gcf())
+        return buffer.getvalue()
+
+    # ------------------------------
+    # Dispatch
+    # ------------------------------
+
+    async def query(self, path, params):
+        """Result of one request (dict, or bytes for figures), from the cache when possible."""
+        if path == "/cache":
+            return self.cache.stats()
+        if path not in self.routes:
+            raise LookupError(path)
+        key = (path, tuple(sorted(params.items())))
+        return await self.cache.get(key, lambda: self.routes[path](params))
+
+
+# ------------------------------
+# HTTP
+# ------------------------------
+
+STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+async def _respond(writer, status, body, content_type="application/json"):
+    if not isinstance(body, bytes):
+        body = json.dumps(_jsonable(body), ensure_ascii=False).encode("utf-8")
+    head = (f"HTTP/1.1 {status} {STATUS[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n")
+    writer.write(head.encode("ascii") + body)
+    await writer.drain()
+
+
+def make_handler(service):
+    async def handle(reader, writer):
+        try:
+            request = await reader.readline()
+            # skip the headers: only GET requests without a body are served
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request.decode("latin-1").split()
+            if len(parts) < 2:
+                return
+            method, target = parts[0], parts[1]
+            if method != "GET":
+                await _respond(writer, 405, {"error": "only GET is supported"})
+                return
+            url = urlsplit(target)
+            params = {name.lower(): value for name, value in parse_qsl(url.query)}
+            try:
+                result = await service.query(url.path.rstrip("/") or "/", params)
+            except LookupError:
+                await _respond(writer, 404, {"error": f"unknown query {url.path!r}",
+                                             "queries": sorted(service.routes) + ["/cache"]})
+            except ValueError as exc:
+                await _respond(writer, 400, {"error": str(exc)})
+            except Exception as exc:
+                await _respond(writer, 500, {"error": f"{type(exc).__name__}: {exc}"})
+            else:
+                await _respond(writer, 200, result, "image/png" if isinstance(result, bytes) else "application/json")
+        finally:
+            writer.close()
+    return handle
+
+
+async def serve(service, host="127.0.0.1", port=DEFAULT_PORT):
+    """Start the server (port 0 picks a free port); returns the asyncio Server."""
+    return await asyncio.start_server(make_handler(service), host, port)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve descriptive statistics, tests, kappa and figures over HTTP.")
+    parser.add_argument("file_path", nargs="?", default="2_Data.xlsx")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE, help="results kept in the LRU cache")
+    args = parser.parse_args(argv)
+
+    service = AnalysisService(load_ratings(args.file_path, sheets=criteria), args.cache_size)
+
+    async def run():
+        server = await serve(service, args.host, args.port)
+        print(f"Serving {args.file_path} on http://{args.host}:{server.sockets[0].getsockname()[1]}/ "
+              f"(queries: {', '.join(sorted(service.routes))}, /cache)")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Analysis stages
+# Michele Danilo Pierri MD PhD
+# Purpose: The analyses of scripts 1-4 as functions that take and return
+#          DataFrames, so they can be run standalone by the numbered
+#          scripts or chained in memory by the pipeline runner.
+#          Each stage returns a dict {table name: DataFrame}; the table
+#          name is the CSV file name without extension.
+# ------------------------------------------------------------
+
+import os
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from llm_eval.agreement import ICC_TYPES, RatingPanel, sparse_kendall_w
+from llm_eval.bootstrap import bootstrap_ci
+from llm_eval.cube import ScoreCube
+from llm_eval.data import criteria, study_models as models
+from llm_eval.multiplicity import register
+from llm_eval.permutation import permutation_test
+from llm_eval.profiling import profiled
+from llm_eval.rankstats import kruskal, mannwhitneyu, posthoc_dunn
+from llm_eval.ratings import MISSING, RatingTable
+from llm_eval.sensitivity import ScoreMatrices, jackknife_requests, leave_k_out
+from llm_eval.store import ResultStore, STORE_DIR
+from llm_eval.streaming import hist_summary, levels
+
+reviewers = ['Reviewer1', 'Reviewer2', 'Reviewer3']
+random_seed = 20240330
+
+
+# ------------------------------
+# Pilot study and power analysis (script 1)
+# ------------------------------
+
+@profiled()
+def power_analysis(df):
+    import statsmodels.stats.power as smp
+    from scipy.stats import friedmanchisquare
+
+    # Mean ratings for each row
+    df = df.copy()
+    df['Rating_Mean'] = df[criteria].mean(axis=1)
+
+    # Mean by model and question
+    mean_scores = df.groupby(['Model', 'Question'])['Rating_Mean'].mean().reset_index()
+
+    # Wide table for Friedman
+    wide_df = mean_scores.pivot(index='Question', columns='Model', values='Rating_Mean')
+
+    # Friedman test
+    friedman_stat, p_value = friedmanchisquare(
+        wide_df['ChatGPT'], wide_df['Claude'], wide_df['Gemini']
+    )
+
+    # Calculate Kendall's W
+    k = 3  # models
+    n = wide_df.shape[0]  # questions
+    kendalls_w = friedman_stat / (n * (k - 1))
+
+    # Cohen's f from W (approximation)
+    f_effect_size = np.sqrt(kendalls_w / (1 - kendalls_w))
+
+    # Power analysis for observed effect
+    analysis = smp.FTestAnovaPower()
+    sample_size_needed = analysis.solve_power(effect_size=f_effect_size, alpha=0.05, power=0.8, k_groups=3)
+    sample_size_needed = int(np.ceil(sample_size_needed))
+
+    # Calculate theoretical f for delta = 0.5
+    std_within = wide_df.std(axis=1).mean()
+    delta = 0.5
+    sigma_effect = delta / np.sqrt(2)
+    f_from_delta = sigma_effect / std_within
+
+    results = {
+        "friedman_stat": friedman_stat,
+        "p_value": p_value,
+        "kendalls_w": kendalls_w,
+        "f_effect_size_observed": f_effect_size,
+        "sample_size_needed_for_observed_effect": sample_size_needed,
+        "std_within_models": std_within,
+        "cohens_f_for_delta_0.5": f_from_delta
+    }
+    return {"stat_analysis_power": pd.DataFrame(results, index=[0])}
+
+
+@profiled()
+def simulated_power(df, workers=None, **grid):
+    """Monte Carlo power of Friedman (and Kruskal-Wallis for comparison) from the pilot (see llm_eval/power.py)."""
+    from llm_eval.power import PilotModel, power_grid
+
+    model = PilotModel(df, criteria=criteria)
+    grid.setdefault("seed", random_seed)
+    return {"stat_analysis_power_simulation": power_grid(model, workers=workers, **grid)}
+
+
+# ------------------------------
+# Reliability analysis (script 2)
+# ------------------------------
+
+def kappa_interpretation(kappa):
+    return (
+        'Poor (<0.20)' if kappa < 0.2 else
+        'Fair (0.21–0.40)' if kappa < 0.41 else
+        'Moderate (0.41–0.60)' if kappa < 0.61 else
+        'Substantial (0.61–0.80)' if kappa < 0.81 else
+        'Almost Perfect (>0.80)'
+    )
+
+
+def ci_label(row):
+    return f"[{row['CI Lower']:.3f} to {row['CI Upper']:.3f}]"
+
+
+@profiled()
+def reliability(df_long, cache_dir=STORE_DIR, n_boot=2000):
+    """Kendall's W, Friedman W, pairwise weighted kappa and ICC with bootstrap CIs.
+
+    Every metric of a criterion comes from one RatingPanel (see llm_eval/agreement.py).
+    """
+    store = ResultStore(cache_dir)
+    params = {"seed": random_seed, "n_boot": n_boot}
+    kappa_results = []
+    friedman_results = []
+    kendall_classic_results = []
+    icc_results = []
+
+    for crit in criteria:
+        # Long format per reviewer
+        long_df = df_long[df_long['Criterion'] == crit].copy()
+        long_df['Subject'] = long_df['Request'] + "_" + long_df['Model']
+
+        # Pivot to wide format (subjects x reviewers)
+        pivot_df = long_df.pivot_table(index="Subject", columns="Reviewer", values="Score")
+        pivot_df = pivot_df.dropna()
+        panel = RatingPanel(pivot_df)
+
+        def compute(seed):
+            q, p, friedman_w = panel.friedman()
+            return {
+                "friedman": (friedman_w[0], p[0]),
+                "linear": panel.kappa("linear")[0],
+                "ci": panel.bootstrap(n_boot=n_boot, seed=seed).set_index("Metric"),
+            }
+
+        result = store.get_or_compute("agreement", [pivot_df], compute, params)
+        ci = result["ci"]
+
+        # --- Kendall's W, classical and tie corrected ---
+        # computed on every rating, so subjects missing a reviewer still count;
+        # the CI comes from the complete subjects of the panel
+        classical, corrected = store.get_or_compute(
+            "kendall", [long_df[['Subject', 'Reviewer', 'Score']]],
+            lambda seed: (sparse_kendall_w(long_df, tie_correction=False), sparse_kendall_w(long_df))
+        )
+        kendall_classic_results.append({
+            "Criterion": crit,
+            "Kendall's W (classical)": round(classical, 3),
+            "Kendall's W (tie-corrected)": round(corrected, 3),
+            "95% CI": ci_label(ci.loc["Kendall's W (tie-corrected)"])
+        })
+
+        # --- Friedman-based Kendall's W ---
+        friedman_w, p = result["friedman"]
+        friedman_results.append({
+            'Criterion': crit,
+            "Kendall's W (friedman)": round(friedman_w, 3),
+            "p-value": round(p, 4)
+            })
+
+        # --- Pairwise Quadratic Weighted Kappa ---
+        for label, linear in zip(panel.pair_labels(), result["linear"]):
+            row = ci.loc[f"Quadratic Kappa: {label}"]
+            kappa = row["Estimate"]
+            kappa_results.append({
+                'Criterion': crit,
+                'Reviewer Pair': label,
+                'Weighted Kappa': round(kappa, 3),
+                'Interpretation': kappa_interpretation(kappa),
+                '95% CI': ci_label(row),
+                'Linear Weighted Kappa': round(linear, 3)
+            })
+
+        # --- Intraclass correlation ---
+        for icc_type in ICC_TYPES:
+            row = ci.loc[icc_type]
+            icc_results.append({
+                'Criterion': crit,
+                'Type': icc_type,
+                'ICC': round(row["Estimate"], 3),
+                '95% CI': ci_label(row)
+            })
+
+    store.report()
+    return {
+        "reliability_kappa": pd.DataFrame(kappa_results),
+        "reliability_kendall": pd.DataFrame(kendall_classic_results),
+        "reliability_kendall_friedman": pd.DataFrame(friedman_results),
+        "reliability_icc": pd.DataFrame(icc_results),
+    }
+
+
+# ------------------------------
+# Statistical analysis (script 3)
+# ------------------------------
+
+def describe(scores):
+    if isinstance(scores, np.ndarray):
+        # an int8 ScoreTensor slice: summarized from its 1-5 histogram
+        counts = np.bincount(scores[scores != MISSING].ravel(), minlength=levels[-1] + 1)[levels]
+        summary = hist_summary(counts)
+        return {"N": summary["N"], **{key: round(summary[key], 3) for key in ["Mean", "Median", "SD", "IQR"]}}
+    return {
+        "N": scores.count(),
+        "Mean": round(scores.mean(), 3),
+        "Median": round(scores.median(), 3),
+        "SD": round(scores.std(), 3),
+        "IQR": round(scores.quantile(0.75) - scores.quantile(0.25), 3)
+    }
+
+
+@profiled()
+def descriptive(df_long, cache_dir=STORE_DIR):
+    """Descriptive statistics and Shapiro normality test per Model x Criterion."""
+    from scipy.stats import shapiro
+
+    store = ResultStore(cache_dir)
+    cube = ScoreCube(df_long)
+    desc_stats = []
+    norm_results = []
+    for crit in criteria:
+        for model in models:
+            scores = cube.values(Criterion=crit, Model=model)
+            desc_stats.append({
+                "Model": model,
+                "Criterion": crit,
+                **store.get_or_compute("descriptive", [scores], lambda seed: describe(scores))
+            })
+            stat, p = store.get_or_compute("shapiro", [scores], lambda seed: tuple(shapiro(scores)))
+            norm_results.append({
+                "Model": model,
+                "Criterion": crit,
+                "W-statistic": round(stat, 3),
+                "p-value": round(p, 4),
+                "Normality": 'Non-normal (p < 0.05)' if p < 0.05 else 'Normal (p ≥ 0.05)'
+            })
+    store.report()
+    return {
+        "stat_analysis_descriptive": pd.DataFrame(desc_stats),
+        "stat_analysis_shapiro": pd.DataFrame(norm_results),
+    }
+
+
+def compare(first, second, seed):
+    stat, p = mannwhitneyu(first.values, second.values, alternative='two-sided')
+    delta, ci_low, ci_high = bootstrap_ci(first.values, second.values, seed=seed)
+    return stat, p, delta, ci_low, ci_high
+
+
+@profiled()
+def statistics(df_long, cache_dir=STORE_DIR):
+    """Kruskal-Wallis, Dunn + bootstrap CI, permutation tests and subgroup comparisons."""
+    # every result is keyed by the rows it depends on; bootstrap and
+    # permutation seeds are derived from the same key (see llm_eval/store.py)
+    store = ResultStore(cache_dir)
+    params = {"seed": random_seed}
+    # Criterion and Criterion x Model groups are slices of one compact
+    # table instead of string filters over the long frame (see llm_eval/ratings.py)
+    table = RatingTable.from_long(df_long, order={"Criterion": criteria, "Model": models})
+    by_criterion = {crit: table.group(crit).to_pandas() for crit in criteria}
+
+    # raw p-values of every test, registered with the test family (see llm_eval/multiplicity.py)
+    raw_p = {"kruskal": [], "dunn": [], "permutation": [], "diagnostic_phase": [], "user_type": []}
+
+    # --- Kruskal-Wallis + Dunn + Bootstrap CI (post-hoc analysis) ---
+    pairs = list(combinations(models, 2))
+    kw_results = []
+    dunn_results = []
+    for crit in criteria:
+        data = by_criterion[crit]
+        model_data = data[data['Model'].isin(models)][['Request', 'Model', 'Reviewer', 'Score']]
+        groups = [table.values(crit, model) for model in models]
+        stat, p = store.get_or_compute("kruskal", [model_data], lambda seed: kruskal(*groups))
+        raw_p["kruskal"].append(p)
+        kw_results.append({
+            "Criterion": crit,
+            "H-statistic": round(stat, 3),
+            "p-value": round(p, 4),
+            "Significant": p < 0.05
+        })
+        # Dunn's mean ranks are pooled over all models, so the whole criterion is the slice
+        dunn = store.get_or_compute(
+            "dunn:raw", [model_data],
+            lambda seed: posthoc_dunn(data, val_col='Score', group_col='Model', group_order=models, p_adjust=None)
+        )
+        for m1, m2 in pairs:
+            data1 = table.values(crit, m1)
+            data2 = table.values(crit, m2)
+            delta, ci_low, ci_high = store.get_or_compute(
+                "bootstrap", [data1, data2],
+                lambda seed: bootstrap_ci(data1.values, data2.values, seed=seed), params
+            )
+            raw_p["dunn"].append(dunn.loc[m1, m2])
+            dunn_results.append({
+                "Criterion": crit,
+                "Model A": m1,
+                "Model B": m2,
+                "Δ Mean": round(delta, 3),
+                "95% CI": f"[{ci_low:.3f} to {ci_high:.3f}]",
+                # raw Dunn p (the family correction is inserted after it) and
+                # Bonferroni over the pairs of this criterion, drawn in Figure 2
+                "p-value": np.round(dunn.loc[m1, m2], 4),
+                "p-Bonferroni (within criterion)": np.round(min(1.0, dunn.loc[m1, m2] * len(pairs)), 4)
+            })
+
+    # --- Permutation p-values (model labels permuted within each Request)
+    # for the whole sample and for each Origin x Diagnosis stratum ---
+    strata = [("All", None, None)] + [
+        (f"{origin} x {diagnosis}", origin, diagnosis)
+        for origin in ["Patient", "Doctor"] for diagnosis in ["Pre", "Post"]
+    ]
+    perm_results = []
+    for crit in criteria:
+        data = by_criterion[crit]
+        for label, origin, diagnosis in strata:
+            subset = data if origin is None else data[(data["Origin"] == origin) & (data["Diagnosis"] == diagnosis)]
+            subset = subset[subset['Model'].isin(models)][['Request', 'Model', 'Reviewer', 'Score']]
+            rows = store.get_or_compute("permutation", [subset],
+                                        lambda seed: permutation_test(subset, models, seed=seed), params)
+            for row in rows:
+                raw_p["permutation"].append(row["Permutation p"])
+                perm_results.append({
+                    "Criterion": crit,
+                    "Stratum": label,
+                    **row,
+                    "Statistic": round(row["Statistic"], 3),
+                    "Permutation p": round(row["Permutation p"], 4),
+                    "Significant": row["Permutation p"] < 0.05
+                })
+
+    # --- Diagnostic phase and user type (Mann-Whitney + bootstrap CI) ---
+    # subgroup scores come from the histograms of the aggregation cube
+    cube = ScoreCube(df_long)
+    diag_results = []
+    user_results = []
+    for crit in criteria:
+        pre = cube.values(Criterion=crit, Diagnosis="Pre")
+        post = cube.values(Criterion=crit, Diagnosis="Post")
+        stat, p, delta, ci_low, ci_high = store.get_or_compute(
+            "diagnostic_phase", [post, pre], lambda seed: compare(post, pre, seed), params
+        )
+        raw_p["diagnostic_phase"].append(p)
+        diag_results.append({
+            "Criterion": crit,
+            "Mean Pre": round(np.mean(pre), 3),
+            "Mean Post": round(np.mean(post), 3),
+            "Δ Post - Pre": round(delta, 3),
+            "95% CI": f"[{ci_low:.3f} to {ci_high:.3f}]",
+            "U statistic": stat,
+            "p-value": round(p, 4),
+            "Significant": p < 0.05
+        })
+
+        pat = cube.values(Criterion=crit, Origin="Patient")
+        doc = cube.values(Criterion=crit, Origin="Doctor")
+        stat, p, delta, ci_low, ci_high = store.get_or_compute(
+            "user_type", [pat, doc], lambda seed: compare(pat, doc, seed), params
+        )
+        raw_p["user_type"].append(p)
+        user_results.append({
+            "Criterion": crit,
+            "Mean Patient": round(np.mean(pat), 3),
+            "Mean Doctor": round(np.mean(doc), 3),
+            "Δ Patient - Doctor": round(delta, 3),
+            "95% CI": f"[{ci_low:.3f} to {ci_high:.3f}]",
+            "U statistic": stat,
+            "p-value": round(p, 4),
+            "Significant": p < 0.05
+        })
+
+    store.report()
+    register("stat_analysis_kruskal", raw_p["kruskal"])
+    register("stat_analysis_posthoc_dunn", raw_p["dunn"])
+    register("stat_analysis_permutation", raw_p["permutation"], column="Permutation p")
+    register("stat_analysis_diagnostic_phase", raw_p["diagnostic_phase"])
+    register("stat_analysis_user_type", raw_p["user_type"])
+    return {
+        "stat_analysis_kruskal": pd.DataFrame(kw_results),
+        "stat_analysis_posthoc_dunn": pd.DataFrame(dunn_results),
+        "stat_analysis_permutation": pd.DataFrame(perm_results),
+        "stat_analysis_diagnostic_phase": pd.DataFrame(diag_results),
+        "stat_analysis_user_type": pd.DataFrame(user_results),
+    }
+
+
+@profiled()
+def subgroups(df_long):
+    """Drill-down tables over every Model x Criterion x Origin x Diagnosis x Reviewer grouping.
+
+    Rolled-up dimensions are labelled 'All' (see llm_eval/cube.py).
+    """
+    cube = ScoreCube(df_long)
+    summary = cube.rollup().round({"Mean": 3, "Median": 3, "SD": 3, "IQR": 3})
+    tests = cube.kruskal_rollup(between="Model")
+    register("stat_analysis_subgroups_kruskal", tests["p-value"])
+    tests = tests.round({"H-statistic": 3, "p-value": 4})
+    return {
+        "stat_analysis_subgroups": summary,
+        "stat_analysis_subgroups_kruskal": tests,
+    }
+
+
+# ------------------------------
+# Sensitivity analysis (script 4)
+# ------------------------------
+
+@profiled()
+def sensitivity(df_long, workers=None, tensor=None):
+    # per-reviewer score matrices are built once and shared by every rerun;
+    # from a memory-mapped ScoreTensor, pool workers attach to the file instead
+    if tensor is not None:
+        matrices = ScoreMatrices.from_tensor(tensor, criteria, reviewers)
+    else:
+        matrices = ScoreMatrices(df_long, criteria, reviewers)
+    tables = {
+        # k = 1 is the classical leave-one-reviewer-out analysis
+        "sensitivity_analysis": leave_k_out(df_long, k_values=range(1, len(reviewers)),
+                                            matrices=matrices, workers=workers),
+        "sensitivity_jackknife": jackknife_requests(df_long, matrices=matrices, workers=workers),
+    }
+    for name, table in tables.items():
+        register(name, table["p-value"])
+    return {name: table.round({"p-value": 4}) for name, table in tables.items()}
+
+
+@profiled()
+def ordinal(df_long, loo=True, cache_dir=STORE_DIR, workers=None):
+    """Ordinal mixed model (random Request and Reviewer intercepts) per criterion.
+
+    With loo, the model is refitted leaving out each reviewer and each
+    request in turn (see llm_eval/ordinal.py).
+    """
+    from llm_eval.ordinal import ordinal_models
+
+    store = ResultStore(cache_dir)
+    ratings = df_long[['Request', 'Model', 'Criterion', 'Reviewer', 'Score']]
+    model_table, subset_table = store.get_or_compute(
+        "ordinal", [ratings],
+        lambda seed: ordinal_models(df_long, criteria, loo=loo, workers=workers), {"loo": loo}
+    )
+    store.report()
+    register("stat_analysis_ordinal", model_table["p-value"])
+    tables = {"stat_analysis_ordinal": model_table.round(4)}
+    if loo:
+        register("sensitivity_ordinal", subset_table["LR p-value"], column="LR p-value")
+        tables["sensitivity_ordinal"] = subset_table.round(4)
+    return tables
+
+
+def save_tables(tables, out_dir="."):
+    """Write every table of a stage result as <out_dir>/<name>.csv."""
+    os.makedirs(out_dir, exist_ok=True)
+    for name, table in tables.items():
+        table.to_csv(os.path.join(out_dir, f"{name}.csv"), index=False)
@@ -0,0 +1,128 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Incremental result store
+# Michele Danilo Pierri MD PhD
+# Purpose: Cache every result under a hash of the data slice it depends
+#          on (e.g. the Dunn pair ChatGPT vs Claude on Accuracy depends
+#          only on those rows), so adding a model or a batch of reviewer
+#          ratings recomputes only the affected rows, pairs and figures.
+#          Stored results are also filed under a hash of the llm_eval
+#          sources, so results computed by an earlier version of the code
+#          are never reused; seeds depend on the data slice only.
+# ------------------------------------------------------------
+
+import hashlib
+import json
+import os
+import pickle
+from collections import Counter
+
+import pandas as pd
+
+STORE_DIR = ".results_cache"
+
+_code_version = None
+
+
+def slice_hash(df):
+    """Content hash of a DataFrame slice, independent of row order and index."""
+    if isinstance(df, pd.Series):
+        df = df.to_frame()
+    df = df.reset_index(drop=True)
+    df = df.sort_values(list(df.columns), kind="stable").reset_index(drop=True)
+    digest = hashlib.sha256(",".join(map(str, df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def code_version():
+    """Hash of the llm_eval package sources (computed once per process)."""
+    global _code_version
+    if _code_version is None:
+        package = os.path.dirname(os.path.abspath(__file__))
+        digest = hashlib.sha256()
+        for name in sorted(os.listdir(package)):
+            if name.endswith(".py"):
+                with open(os.path.join(package, name), 'rb') as fh:
+                    digest.update(name.encode())
+                    digest.update(fh.read())
+        _code_version = digest.hexdigest()
+    return _code_version
+
+
+class ResultStore:
+    """On-disk cache of analysis results keyed by (code version, name, params, input slices)."""
+
+    def __init__(self, directory=STORE_DIR):
+        self.directory = directory
+        self.reused = Counter()
+        self.computed = Counter()
+
+    def key(self, name, slices, params=None):
+        """Hash of the result's name, parameters and input slices (also the source of its seed)."""
+        digest = hashlib.sha256(name.encode())
+        digest.update(json.dumps(params or {}, sort_keys=True, default=str).encode())
+        for part in slices:
+            digest.update(slice_hash(part).encode())
+        return digest.hexdigest()
+
+    def _path(self, name, key):
+        # the code version is part of the file name, not of the key, so
+        # seeds stay the same when the code changes but results are recomputed
+        group = name.split(":")[0]
+        stored = hashlib.sha256((code_version() + key).encode()).hexdigest()
+        return os.path.join(self.directory, group, stored[:32] + ".pkl")
+
+    def get_or_compute(self, name, slices, compute, params=None):
+        """Return the stored result for these inputs, computing and storing it if missing.
+
+        `compute` receives an integer seed derived from the key, so that
+        stochastic results (bootstrap CIs, permutations) are a function of
+        their input slice only and stay stable when other data changes.
+        """
+        key = self.key(name, slices, params)
+        path = self._path(name, key)
+        group = name.split(":")[0]
+        if os.path.exists(path):
+            with open(path, 'rb') as fh:
+                self.reused[group] += 1
+                return pickle.load(fh)
+        result = compute(int(key[:8], 16))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as fh:
+            pickle.dump(result, fh)
+        self.computed[group] += 1
+        return result
+
+    def render(self, name, data, outputs, draw):
+        """Call draw() only if the outputs were last written from other data or one is missing.
+
+        One marker per set of output paths records the key of the data
+        that last wrote them, so going back to earlier data (A -> B -> A)
+        in the same directory redraws the figures.
+        """
+        key = self.key(name, [data])
+        paths = [os.path.abspath(out) for out in outputs]
+        marker = self._path(name, hashlib.sha256("\n".join(paths).encode()).hexdigest())
+        if os.path.exists(marker) and all(os.path.exists(out) for out in paths):
+            with open(marker, 'rb') as fh:
+                if pickle.load(fh) == key:
+                    self.reused[name] += 1
+                    return False
+        draw()
+        os.makedirs(os.path.dirname(marker), exist_ok=True)
+        with open(marker, 'wb') as fh:
+            pickle.dump(key, fh)
+        self.computed[name] += 1
+        return True
+
+    def report(self):
+        """Table of reused vs recomputed results per result group; also printed."""
+        groups = sorted(set(self.reused) | set(self.computed))
+        summary = pd.DataFrame({
+            "Result": groups,
+            "Reused": [self.reused[g] for g in groups],
+            "Recomputed": [self.computed[g] for g in groups],
+        })
+        if len(summary):
+            print(summary.to_string(index=False))
+        return summary
@@ -0,0 +1,254 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Streaming ingestion
+# Michele Danilo Pierri MD PhD
+# Purpose: Read long-format ratings (CSV, Parquet or JSONL) in chunks and
+#          keep running sufficient statistics, so the descriptive table
+#          and the figure inputs can be produced without materializing
+#          the full long table.
+# Usage:   python -m llm_eval.streaming ratings.parquet [chunksize]
+# ------------------------------------------------------------
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+levels = np.arange(1, 6)  # 5-point Likert scale
+group_keys = ["Model", "Criterion", "Origin", "Diagnosis"]
+response_keys = ["Criterion", "Request", "Model", "Origin", "Diagnosis"]
+
+# bits of each column's code in the packed group and response keys
+KEY_BITS = {"Criterion": 6, "Model": 6, "Origin": 6, "Diagnosis": 6, "Request": 36}
+
+
+def iter_chunks(path, chunksize=100_000):
+    """Yield DataFrame chunks of a long ratings file (CSV, Parquet or JSONL)."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        yield from pd.read_csv(path, chunksize=chunksize, dtype={"Request": str})
+    elif ext in (".parquet", ".pq"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    elif ext in (".jsonl", ".json"):
+        yield from pd.read_json(path, lines=True, chunksize=chunksize, dtype={"Request": str})
+    else:
+        raise ValueError(f"unsupported ratings file type: {path!r}")
+
+
+def hist_quantile(counts, q):
+    """Quantile (pandas' linear interpolation) of the scores summarized by a 1-5 histogram."""
+    n = counts.sum()
+    if n == 0:
+        return np.nan
+    pos = (n - 1) * q
+    cum = np.cumsum(counts)
+    lo = levels[np.searchsorted(cum, np.floor(pos), side='right')]
+    hi = levels[np.searchsorted(cum, np.ceil(pos), side='right')]
+    return lo + (hi - lo) * (pos - np.floor(pos))
+
+
+def hist_summary(counts):
+    """N, Mean, Median, SD (ddof=1) and IQR of a 1-5 score histogram."""
+    n = counts.sum()
+    total = counts @ levels
+    mean = total / n if n else np.nan
+    var = (counts @ levels ** 2 - total * mean) / (n - 1) if n > 1 else np.nan
+    return {
+        "N": int(n),
+        "Mean": mean,
+        "Median": hist_quantile(counts, 0.5),
+        "SD": np.sqrt(var),
+        "IQR": hist_quantile(counts, 0.75) - hist_quantile(counts, 0.25),
+    }
+
+
+def _pack(codes, columns):
+    key = np.zeros(len(codes[columns[0]]), dtype=np.int64)
+    for col in columns:
+        key = (key << KEY_BITS[col]) | codes[col]
+    return key
+
+
+def _unpack(keys, col, columns):
+    shift = sum(KEY_BITS[c] for c in columns[columns.index(col) + 1:])
+    return (keys >> shift) & ((1 << KEY_BITS[col]) - 1)
+
+
+class _SortedCounts:
+    """Integer statistics per int64 key, added to in place.
+
+    Keys are kept in a few sorted runs whose sizes at least double from
+    the newest to the oldest: keys seen for the first time form a new run,
+    and a run is merged into the previous one once it reaches half its
+    size, so an update costs O(keys of the chunk x number of runs),
+    amortized, however many keys are already held.
+    """
+
+    def __init__(self, width):
+        self.width = width
+        self.runs = []
+
+    def add(self, keys, values):
+        """Add `values` (one row per key, keys unique and sorted) to the running totals."""
+        pending = np.arange(len(keys))
+        for run_keys, run_values in self.runs:
+            pos = np.searchsorted(run_keys, keys[pending])
+            found = pos < len(run_keys)
+            found[found] = run_keys[pos[found]] == keys[pending[found]]
+            run_values[pos[found]] += values[pending[found]]
+            pending = pending[~found]
+        if len(pending):
+            self.runs.append((keys[pending], values[pending]))
+        while len(self.runs) > 1 and 2 * len(self.runs[-1][0]) >= len(self.runs[-2][0]):
+            self.runs[-2:] = [self._merge(self.runs[-2:])]
+
+    @staticmethod
+    def _merge(runs):
+        keys = np.concatenate([run[0] for run in runs])
+        order = np.argsort(keys, kind="stable")
+        return keys[order], np.concatenate([run[1] for run in runs])[order]
+
+    def totals(self):
+        """All keys (sorted) and their statistics."""
+        if not self.runs:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.width), dtype=np.int64)
+        return self._merge(self.runs)
+
+
+class RatingAccumulator:
+    """Running sufficient statistics over chunks of long-format ratings.
+
+    Per (Model, Criterion, Origin, Diagnosis) group: a 1-5 score histogram,
+    from which counts, sums and sums of squares follow exactly.
+    Per rated response: reviewer count, sum and sum of squares, which the
+    figures need for the per-row reviewer Mean and SD. State grows with the
+    number of groups and responses, never with the number of ratings.
+
+    Key values are coded as integers (one vocabulary per column) and each
+    group or response is one int64 packing its codes. A chunk is
+    aggregated on its own and added in place to arrays sorted by that key
+    (see _SortedCounts), so an update costs O(rows of the chunk).
+    """
+
+    def __init__(self):
+        self._vocab = {col: {} for col in response_keys}
+        self._groups = _SortedCounts(len(levels))
+        self._responses = _SortedCounts(3)
+        self.rows = 0
+
+    def _codes(self, chunk):
+        codes = {}
+        for col in response_keys:
+            vocab = self._vocab[col]
+            labels, uniques = pd.factorize(chunk[col])
+            known = np.array([vocab.setdefault(value, len(vocab)) for value in uniques] + [-1], dtype=np.int64)
+            if len(vocab) > 1 << KEY_BITS[col]:
+                raise ValueError(f"more than {1 << KEY_BITS[col]} distinct values of {col}")
+            # missing keys get -1, like the rows groupby leaves out
+            codes[col] = known[labels]
+        return codes
+
+    def update(self, chunk):
+        chunk = chunk[response_keys + ["Score"]]
+        scores = pd.to_numeric(chunk["Score"], errors='coerce')
+        chunk = chunk.assign(Score=scores, Request=chunk["Request"].astype(str))[scores.notna()]
+        bad = ~chunk["Score"].isin(levels)
+        if bad.any():
+            raise ValueError(f"non-Likert scores in chunk: {chunk.loc[bad, 'Score'].unique()[:5]}")
+        self.rows += len(chunk)
+        if not len(chunk):
+            return self
+
+        codes = self._codes(chunk)
+        keep = np.logical_and.reduce([codes[col] >= 0 for col in response_keys])
+        codes = {col: code[keep] for col, code in codes.items()}
+        score = chunk["Score"].to_numpy()[keep].astype(np.int64)
+        groups, inverse = np.unique(_pack(codes, group_keys), return_inverse=True)
+        hist = np.zeros((len(groups), len(levels)), dtype=np.int64)
+        np.add.at(hist, (inverse, score - levels[0]), 1)
+        self._groups.add(groups, hist)
+
+        responses, inverse = np.unique(_pack(codes, response_keys), return_inverse=True)
+        stats = np.stack([np.bincount(inverse, weights=w, minlength=len(responses))
+                          for w in (np.ones(len(score)), score, score ** 2)], axis=1)
+        self._responses.add(responses, stats.astype(np.int64))
+        return self
+
+    def _frame(self, keys, columns):
+        """Key columns decoded from packed keys."""
+        frame = {}
+        for col in columns:
+            values = np.empty(len(self._vocab[col]), dtype=object)
+            values[:] = list(self._vocab[col])
+            frame[col] = values[_unpack(keys, col, columns)]
+        return pd.DataFrame(frame)
+
+    def histograms(self):
+        """Group x score-level count table (columns 1..5)."""
+        keys, counts = self._groups.totals()
+        index = pd.MultiIndex.from_frame(self._frame(keys, group_keys))
+        return pd.DataFrame(counts, index=index, columns=levels)
+
+    def responses(self):
+        """Per-response reviewer Mean and SD, the inputs of Figures 1, 3 and 4."""
+        keys, stats = self._responses.totals()
+        resp = self._frame(keys, response_keys)
+        resp["Count"], resp["Sum"], resp["SumSq"] = stats.T
+        n = resp["Count"]
+        resp["Mean"] = resp["Sum"] / n
+        var = (resp["SumSq"] - resp["Sum"] * resp["Mean"]) / (n - 1)
+        resp["SD"] = np.sqrt(var.where(n > 1).clip(lower=0))
+        return resp
+
+    def descriptive(self, models=None, criteria=None):
+        """Same table as stat_analysis_descriptive.csv (Model x Criterion)."""
+        hist = self.histograms().groupby(level=["Model", "Criterion"]).sum()
+        models = models or list(hist.index.unique("Model"))
+        criteria = criteria or list(hist.index.unique("Criterion"))
+        desc_stats = []
+        for crit in criteria:
+            for model in models:
+                counts = hist.loc[(model, crit)].to_numpy() if (model, crit) in hist.index else np.zeros(5)
+                summary = hist_summary(counts)
+                desc_stats.append({
+                    "Model": model,
+                    "Criterion": crit,
+                    "N": summary["N"],
+                    **{k: round(summary[k], 3) for k in ["Mean", "Median", "SD", "IQR"]},
+                })
+        return pd.DataFrame(desc_stats)
+
+    def figure_inputs(self):
+        """Summary frames plotted by Figure 1 (by Model), Figure 3 (by Diagnosis) and Figure 4 (by Origin)."""
+        resp = self.responses()
+        figure1 = (resp.groupby(["Criterion", "Model"], sort=False)
+                       .agg(Mean=("Mean", "mean"), SD=("SD", "mean"))
+                       .reset_index()[["Model", "Mean", "SD", "Criterion"]])
+        inputs = {"figure1": figure1}
+        for name, key in [("diagnosis", "Diagnosis"), ("origin", "Origin")]:
+            summary = resp.groupby([key, "Criterion"])["Mean"].agg(["mean", "std"]).reset_index()
+            summary.columns = [key, "Criterion", "Mean", "SD"]
+            inputs[name] = summary
+        return inputs
+
+
+def accumulate(path, chunksize=100_000):
+    acc = RatingAccumulator()
+    for chunk in iter_chunks(path, chunksize):
+        acc.update(chunk)
+    return acc
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        sys.exit("usage: python -m llm_eval.streaming RATINGS_FILE [CHUNKSIZE]")
+    acc = accumulate(argv[0], int(argv[1]) if len(argv) > 1 else 100_000)
+    acc.descriptive().to_csv("stat_analysis_descriptive.csv", index=False)
+    print(f"Streamed {acc.rows} ratings; descriptive statistics saved to CSV.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Synthetic rating sets
+# Michele Danilo Pierri MD PhD
+# Purpose: Generate rating sets in the schema of 2_Data.xlsx (one sheet
+#          per criterion with Request, Model, Origin, Diagnosis and
+#          Reviewer1..N columns) at any size, for benchmarks and for
+#          checking the analysis on larger panels. Scores come from a
+#          latent Gaussian model (model, request and reviewer effects)
+#          cut at thresholds matching the study's 1-5 score distribution;
+#          a fraction of ratings can be left missing.
+# ------------------------------------------------------------
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from llm_eval.data import criteria, id_columns, score_range, study_models
+
+# latent cut points giving the pooled score frequencies of 2_Data.xlsx
+# (about 2% / 10% / 27% / 42% / 19% for scores 1-5)
+THRESHOLDS = np.array([-2.08, -1.19, -0.29, 0.88])
+
+
+def _labels(study, n, prefix):
+    # the study's own labels first, so the default sizes reproduce its layout
+    return list(study[:n]) + [f"{prefix}{i}" for i in range(len(study) + 1, n + 1)]
+
+
+def generate(n_prompts=70, n_models=3, n_reviewers=3, n_criteria=4, missing=0.0, seed=None,
+             model_spread=0.3, request_sd=0.5, reviewer_sd=0.3):
+    """Synthetic ratings workbook -> {criterion: sheet DataFrame}.
+
+    Every prompt is answered by every model and rated by every reviewer on
+    every criterion; `missing` is the fraction of ratings left empty.
+    Origin and Diagnosis are drawn per prompt with the study's proportions.
+    """
+    rng = np.random.default_rng(seed)
+    models = _labels(study_models, n_models, "Model")
+    crits = _labels(criteria, n_criteria, "Criterion")
+    reviewers = [f"Reviewer{i}" for i in range(1, n_reviewers + 1)]
+
+    # Request ids as in the study: integers, with the later batch as '1_<n>'
+    requests = np.array([str(i + 1) if i < 50 else f"1_{i - 49}" for i in range(n_prompts)], dtype=object)
+    origin = np.where(rng.random(n_prompts) < 4 / 7, "Patient", "Doctor")
+    diagnosis = np.where(rng.random(n_prompts) < 0.5, "Post", "Pre")
+    ids = pd.DataFrame({
+        "Request": np.tile(requests, n_models),
+        "Model": np.repeat(models, n_prompts),
+        "Origin": np.tile(origin, n_models),
+        "Diagnosis": np.tile(diagnosis, n_models),
+    })[id_columns]
+
+    model_loc = np.linspace(-model_spread, model_spread, n_models)
+    request_eff = rng.normal(0, request_sd, n_prompts)
+    # unit total variance, so the thresholds keep the study's score frequencies
+    scale = np.sqrt(1 + request_sd ** 2 + reviewer_sd ** 2 + np.var(model_loc))
+    book = {}
+    for crit in crits:
+        reviewer_bias = rng.normal(0, reviewer_sd, n_reviewers)
+        latent = (model_loc[:, None, None] + request_eff[None, :, None] + reviewer_bias
+                  + rng.standard_normal((n_models, n_prompts, n_reviewers)))
+        scores = score_range[0] + np.searchsorted(THRESHOLDS, latent / scale)
+        scores = scores.reshape(n_models * n_prompts, n_reviewers)
+        if missing:
+            scores = scores.astype(float)
+            scores[rng.random(scores.shape) < missing] = np.nan
+        book[crit] = pd.concat([ids, pd.DataFrame(scores, columns=reviewers)], axis=1)
+    return book
+
+
+def to_long(book):
+    """Long Request/Model/Origin/Diagnosis/Criterion/Reviewer/Score table of a generated workbook."""
+    frames = []
+    for crit, sheet in book.items():
+        frames.append(sheet.assign(Criterion=crit).melt(
+            id_vars=id_columns + ["Criterion"], var_name="Reviewer", value_name="Score"))
+    return pd.concat(frames, ignore_index=True)
+
+
+def write_workbook(book, path):
+    """Write the sheets as an .xlsx in the layout read by data.load_ratings."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with pd.ExcelWriter(path) as writer:
+        for crit, sheet in book.items():
+            sheet.to_excel(writer, sheet_name=crit, index=False)
+    return path
+
+
+def write_columnar(book, path):
+    """Write the long table as Parquet (or CSV for a .csv path)."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    df_long = to_long(book)
+    if path.endswith(".csv"):
+        df_long.to_csv(path, index=False)
+    else:
+        df_long.to_parquet(path, index=False)
+    return path
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write a synthetic ratings workbook in the 2_Data.xlsx schema.")
+    parser.add_argument("out", help="output .xlsx path (a .parquet of the long table is written next to it)")
+    parser.add_argument("--prompts", type=int, default=70)
+    parser.add_argument("--models", type=int, default=3)
+    parser.add_argument("--reviewers", type=int, default=3)
+    parser.add_argument("--criteria", type=int, default=4)
+    parser.add_argument("--missing", type=float, default=0.0, help="fraction of ratings left empty")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    book = generate(args.prompts, args.models, args.reviewers, args.criteria, args.missing, args.seed)
+    write_workbook(book, args.out)
+    write_columnar(book, os.path.splitext(args.out)[0] + ".parquet")
+    print(f"{args.out}: {sum(len(sheet) for sheet in book.values())} rows over {len(book)} sheets")
+
+
+if __name__ == "__main__":
+    main()
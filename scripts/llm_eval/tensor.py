@@ -0,0 +1,150 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Memory-mapped score tensor
+# Michele Danilo Pierri MD PhD
+# Purpose: Every criterion sheet has the same Request x Model rows and
+#          Reviewer columns, so the ratings form one dense int8 tensor
+#          (criteria, responses, reviewers) with -1 for a missing score.
+#          The tensor is stored on disk as a .npy file opened with
+#          memory mapping, next to a JSON file with its axes (criteria,
+#          reviewers, and the Request, Model, Origin and Diagnosis of each
+#          response). A memory-mapped tensor pickles as its path, so pool
+#          workers attach to the same pages instead of receiving copies.
+#          Responses are grouped by Model, so a Criterion x Model slice is
+#          a view.
+# ------------------------------------------------------------
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from llm_eval.data import cache_path, file_hash, id_columns, load_ratings, remove_stale
+from llm_eval.profiling import span
+from llm_eval.ratings import MISSING
+
+SCORES_FILE = "scores.npy"
+AXES_FILE = "axes.json"
+
+
+class ScoreTensor:
+    """Scores[criterion, response, reviewer] as int8 (MISSING when not rated), with named axes.
+
+    `responses` is a DataFrame with the id columns (Request, Model,
+    Origin, Diagnosis) of each response row; `path` is the directory the
+    tensor is mapped from, or None for an in-memory tensor.
+    """
+
+    def __init__(self, scores, criteria, responses, reviewers, path=None):
+        self.scores = scores
+        self.criteria = list(criteria)
+        self.responses = responses.reset_index(drop=True)
+        self.reviewers = list(reviewers)
+        self.path = path
+        self.models = list(pd.unique(self.responses["Model"]))
+        model_col = self.responses["Model"].to_numpy()
+        # responses are grouped by model: (start, stop) rows of each model
+        starts = [int(np.argmax(model_col == model)) for model in self.models]
+        self.model_rows = {model: (start, start + int((model_col == model).sum()))
+                           for model, start in zip(self.models, starts)}
+
+    @classmethod
+    def from_long(cls, df_long, criteria=None, reviewers=None):
+        """Build the tensor from the long ratings table (in memory)."""
+        with span("ScoreTensor", rows=len(df_long)):
+            criteria = criteria or list(pd.unique(df_long["Criterion"]))
+            reviewers = reviewers or list(pd.unique(df_long["Reviewer"]))
+            responses = df_long[id_columns].drop_duplicates(["Request", "Model"])
+            # group the responses by model, in order of first appearance
+            model_order = {model: i for i, model in enumerate(pd.unique(responses["Model"]))}
+            responses = responses.sort_values("Model", key=lambda m: m.map(model_order), kind="stable")
+            responses = responses.reset_index(drop=True)
+
+            row = pd.MultiIndex.from_frame(responses[["Request", "Model"]]).get_indexer(
+                pd.MultiIndex.from_frame(df_long[["Request", "Model"]]))
+            crit = pd.Index(criteria).get_indexer(df_long["Criterion"])
+            reviewer = pd.Index(reviewers).get_indexer(df_long["Reviewer"])
+            values = df_long["Score"].to_numpy(dtype=float)
+            keep = (crit >= 0) & (reviewer >= 0) & ~np.isnan(values)
+            scores = np.full((len(criteria), len(responses), len(reviewers)), MISSING, dtype=np.int8)
+            scores[crit[keep], row[keep], reviewer[keep]] = values[keep]
+        return cls(scores, criteria, responses, reviewers)
+
+    # ------------------------------
+    # On disk
+    # ------------------------------
+
+    def save(self, directory):
+        """Write the tensor and its axes to `directory` and return it memory-mapped from there."""
+        if self.path == os.path.abspath(directory):
+            return self
+        os.makedirs(directory, exist_ok=True)
+        out = np.lib.format.open_memmap(os.path.join(directory, SCORES_FILE), mode="w+",
+                                        dtype=np.int8, shape=self.scores.shape)
+        out[:] = self.scores
+        out.flush()
+        del out
+        axes = {
+            "criteria": self.criteria,
+            "reviewers": self.reviewers,
+            "responses": {col: self.responses[col].astype(str).tolist() for col in id_columns},
+        }
+        with open(os.path.join(directory, AXES_FILE), "w", encoding="utf-8") as fh:
+            json.dump(axes, fh)
+        return ScoreTensor.open(directory)
+
+    @classmethod
+    def open(cls, directory, mode="r"):
+        """Memory-map a saved tensor (mode 'r' read-only, 'r+' writable)."""
+        with open(os.path.join(directory, AXES_FILE), encoding="utf-8") as fh:
+            axes = json.load(fh)
+        scores = np.load(os.path.join(directory, SCORES_FILE), mmap_mode=mode)
+        responses = pd.DataFrame(axes["responses"])[id_columns]
+        return cls(scores, axes["criteria"], responses, axes["reviewers"], path=os.path.abspath(directory))
+
+    def __reduce__(self):
+        if self.path is not None:
+            # workers re-open the mapping: no score or DataFrame is pickled
+            return (ScoreTensor.open, (self.path,))
+        return (ScoreTensor, (np.asarray(self.scores), self.criteria, self.responses, self.reviewers))
+
+    # ------------------------------
+    # Slices
+    # ------------------------------
+
+    @property
+    def shape(self):
+        return self.scores.shape
+
+    def slice(self, criterion, model=None):
+        """responses x reviewers int8 scores of one criterion (and model), a view on the tensor."""
+        c = criterion if isinstance(criterion, int) else self.criteria.index(criterion)
+        if model is None:
+            return self.scores[c]
+        start, stop = self.model_rows[model]
+        return self.scores[c, start:stop]
+
+    def to_long(self):
+        """Long ratings table (id columns, Criterion, Reviewer, Score) of the rated cells."""
+        c, r, v = np.nonzero(np.asarray(self.scores) != MISSING)
+        df_long = self.responses.iloc[r].reset_index(drop=True)
+        df_long["Criterion"] = np.asarray(self.criteria, dtype=object)[c]
+        df_long["Reviewer"] = np.asarray(self.reviewers, dtype=object)[v]
+        df_long["Score"] = np.asarray(self.scores[c, r, v], dtype=float)
+        return df_long
+
+
+def complete_rows(scores):
+    """Rows of a responses x reviewers slice scored by every reviewer (for RatingPanel)."""
+    return scores[(scores != MISSING).all(axis=1)]
+
+
+def load_tensor(file_path="2_Data.xlsx", sheets=None):
+    """Score tensor of the workbook, memory-mapped from a cache next to it (rebuilt when the workbook changes)."""
+    directory = cache_path(file_path, file_hash(file_path), sheets, ext="tensor")
+    if os.path.exists(os.path.join(directory, AXES_FILE)):
+        return ScoreTensor.open(directory)
+    # drop tensors of earlier versions of the same workbook and sheet set
+    if os.path.isdir(os.path.dirname(directory)):
+        remove_stale(directory)
+    return ScoreTensor.from_long(load_ratings(file_path, sheets=sheets), criteria=sheets).save(directory)
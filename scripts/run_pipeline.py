@@ -0,0 +1,13 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Full pipeline
+# Michele Danilo Pierri MD PhD
+# Purpose: Single entry point running scripts 1-8 as one dependency graph
+#          (see llm_eval/pipeline.py). By default data are read from data/,
+#          tables are written to tables/ and figures to figures/.
+# Usage:   python scripts/run_pipeline.py [--workers N] [--only STAGE ...]
+# ------------------------------------------------------------
+
+from llm_eval.pipeline import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Test configuration
+# Michele Danilo Pierri MD PhD
+# Purpose: Make the llm_eval package (in scripts/) importable from the tests
+#          Run from the repository root: python -m pytest tests
+# ------------------------------------------------------------
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
@@ -0,0 +1,73 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Import tests
+# Michele Danilo Pierri MD PhD
+# Purpose: Import the package, the library modules and the command line in
+#          fresh interpreters and check that the heavy statistics and
+#          plotting packages are not loaded at import time (they are only
+#          imported by the functions that need them). Timings are in
+#          benchmarks/bench_import.py
+# ------------------------------------------------------------
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+
+HEAVY = ['scipy.stats', 'scipy.optimize', 'statsmodels', 'sklearn', 'pingouin', 'scikit_posthocs',
+         'matplotlib', 'seaborn']
+# what is imported -> heavy packages it is allowed to load
+TARGETS = {
+    'llm_eval': [],
+    'llm_eval.data': [],
+    'llm_eval.stages': [],
+    'llm_eval.rankstats': [],
+    'llm_eval.agreement': [],
+    'llm_eval.pipeline': [],
+    'llm_eval.service': [],
+    'llm_eval.longitudinal': [],
+    'llm_eval.calibration': [],
+    'llm_eval.monitor': [],
+    'llm_eval.streaming': [],
+    'llm_eval.ordinal': ['scipy.optimize'],
+}
+
+PROBE = """
+import json, sys
+__import__(sys.argv[1])
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+def loaded_modules(*args):
+    env = {**os.environ, 'PYTHONPATH': SCRIPTS}
+    env.pop('LLM_EVAL_PROFILE', None)
+    out = subprocess.run([sys.executable, *args], env=env, cwd=SCRIPTS,
+                         capture_output=True, text=True, check=True).stdout
+    return set(json.loads(out.strip().splitlines()[-1]))
+
+
+def test_package_import_is_light():
+    # the package itself loads no scientific package, not even scipy
+    modules = loaded_modules('-c', PROBE, 'llm_eval')
+    assert not {'scipy', 'matplotlib', 'statsmodels', 'sklearn'} & modules
+
+
+@pytest.mark.parametrize('target', TARGETS)
+def test_no_heavy_import(target):
+    modules = loaded_modules('-c', PROBE, target)
+    unexpected = [name for name in HEAVY if name in modules and name not in TARGETS[target]]
+    assert not unexpected, f"{target} imports {unexpected} at module level"
+
+
+def test_command_line_help_is_light():
+    probe = ("import io, contextlib, json, runpy, sys\n"
+             "sys.argv = ['llm_eval', '--help']\n"
+             "with contextlib.redirect_stdout(io.StringIO()):\n"
+             "    runpy.run_module('llm_eval', run_name='__main__')\n"
+             "print(json.dumps(sorted(sys.modules)))\n")
+    modules = loaded_modules('-c', probe)
+    assert not [name for name in HEAVY if name in modules]
@@ -0,0 +1,131 @@
+# ------------------------------------------------------------
+# LLMs Evaluation - Rank statistics tests
+# Michele Danilo Pierri MD PhD
+# Purpose: Check that the count-table Kruskal-Wallis, Mann-Whitney U and
+#          Dunn tests reproduce scipy.stats and scikit_posthocs on random
+#          Likert samples, heavily tied samples, samples with empty groups
+#          and the study data, and that Jonckheere-Terpstra matches the
+#          p-value of Kendall's tau between group index and score
+# ------------------------------------------------------------
+
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+import scikit_posthocs as sp
+from scipy import stats
+
+from llm_eval import rankstats
+from llm_eval.data import criteria, load_ratings, study_models
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+RTOL = 1e-10
+
+
+def random_groups(rng, n_groups, low=5, high=400):
+    sizes = rng.integers(low, high, size=n_groups)
+    probs = rng.dirichlet(np.ones(5), size=n_groups)
+    return [rng.choice(np.arange(1, 6), size=n, p=p).astype(float) for n, p in zip(sizes, probs)]
+
+
+def as_frame(groups, names=None):
+    names = names or [chr(ord('A') + i) for i in range(len(groups))]
+    return pd.DataFrame({'Score': np.concatenate(groups), 'Model': np.repeat(names, [len(g) for g in groups])})
+
+
+def assert_same_tests(groups):
+    """Kruskal-Wallis, Mann-Whitney (all pairs) and Dunn (all corrections) equal the reference."""
+    h, p = rankstats.kruskal(*groups)
+    h_ref, p_ref = stats.kruskal(*groups)
+    np.testing.assert_allclose([h, p], [h_ref, p_ref], rtol=RTOL)
+
+    for i in range(len(groups)):
+        for j in range(i + 1, len(groups)):
+            u, p = rankstats.mannwhitneyu(groups[i], groups[j])
+            u_ref, p_ref = stats.mannwhitneyu(groups[i], groups[j], alternative='two-sided', method='asymptotic')
+            np.testing.assert_allclose([u, p], [u_ref, p_ref], rtol=RTOL)
+
+    data = as_frame(groups)
+    for adjust in ('bonferroni', 'holm', None):
+        ref = sp.posthoc_dunn(data, val_col='Score', group_col='Model', p_adjust=adjust)
+        new = rankstats.posthoc_dunn(data, val_col='Score', group_col='Model', p_adjust=adjust)
+        np.testing.assert_allclose(new.loc[ref.index, ref.columns].to_numpy(), ref.to_numpy(), rtol=RTOL)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_likert_groups(seed):
+    rng = np.random.default_rng(seed)
+    assert_same_tests(random_groups(rng, rng.integers(2, 6)))
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_small_heavily_tied_groups(seed):
+    # few ratings on two or three levels: almost every score is tied
+    rng = np.random.default_rng(seed)
+    groups = [rng.choice([3.0, 4.0, 5.0][:rng.integers(2, 4)], size=rng.integers(3, 9)) for _ in range(3)]
+    assert_same_tests(groups)
+
+
+def test_reviewer_means_as_levels():
+    # per-response reviewer means take fractional values (e.g. 3.333)
+    rng = np.random.default_rng(0)
+    groups = [rng.integers(3, 16, size=70) / 3 for _ in range(3)]
+    assert_same_tests(groups)
+
+
+def test_all_scores_tied():
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        h, p = rankstats.kruskal([3.0, 3.0], [3.0, 3.0, 3.0])
+        u, p_u = rankstats.mannwhitneyu([3.0, 3.0], [3.0, 3.0, 3.0])
+    assert np.isnan(h) and np.isnan(p)
+    u_ref, p_ref = stats.mannwhitneyu([3.0, 3.0], [3.0, 3.0, 3.0], alternative='two-sided', method='asymptotic')
+    assert (u, p_u) == (u_ref, p_ref)
+
+
+def test_empty_groups_are_left_out():
+    rng = np.random.default_rng(1)
+    a, c = random_groups(rng, 2)
+    empty = np.array([])
+    np.testing.assert_allclose(rankstats.kruskal(a, empty, c), stats.kruskal(a, c), rtol=RTOL)
+
+    # a group named in group_order without scores gets NaN p-values; the others match the reference
+    data = as_frame([a, c], names=['A', 'C'])
+    ref = sp.posthoc_dunn(data, val_col='Score', group_col='Model', p_adjust=None)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        new = rankstats.posthoc_dunn(data, val_col='Score', group_col='Model', group_order=['A', 'B', 'C'],
+                                     p_adjust=None)
+    assert new.loc['B', ['A', 'C']].isna().all()
+    np.testing.assert_allclose(new.loc[['A', 'C'], ['A', 'C']].to_numpy(), ref.to_numpy(), rtol=RTOL)
+
+
+def test_missing_scores_are_dropped():
+    rng = np.random.default_rng(2)
+    groups = random_groups(rng, 3)
+    with_nan = [np.append(g, np.nan) for g in groups]
+    np.testing.assert_allclose(rankstats.kruskal(*with_nan),
+                               stats.kruskal(*with_nan, nan_policy='omit'), rtol=RTOL)
+
+
+@pytest.fixture(scope='module')
+def study():
+    return load_ratings(os.path.join(ROOT, 'data', '2_Data.xlsx'), sheets=criteria, use_cache=False)
+
+
+@pytest.mark.parametrize('crit', criteria)
+def test_study_data(study, crit):
+    data = study[study['Criterion'] == crit].dropna(subset=['Score'])
+    assert_same_tests([data.loc[data['Model'] == model, 'Score'].to_numpy() for model in study_models])
+
+
+def test_jonckheere_matches_kendall_tau():
+    rng = np.random.default_rng(3)
+    for _ in range(10):
+        groups = random_groups(rng, rng.integers(3, 6))
+        counts, _ = rankstats.counts_of(*groups)
+        _, _, p = rankstats.jonckheere_counts(counts)
+        index = np.repeat(np.arange(len(groups)), [len(g) for g in groups])
+        np.testing.assert_allclose(p, stats.kendalltau(index, np.concatenate(groups)).pvalue, rtol=1e-8)